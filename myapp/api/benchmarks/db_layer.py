@@ -0,0 +1,225 @@
+"""
+Throughput of the sync (threadpool) and async database layers at high concurrency.
+
+Serves the same queries two ways from one app booted under uvicorn:
+`/sync/...` handlers are plain `def` with a `SessionLocal` session, so each
+request holds one of the threadpool's threads (40 by default) while it waits
+on the database; `/async/...` handlers are `async def` with an
+`AsyncSessionLocal` session, as the API's CRUD handlers are. Each endpoint of
+each layer is then driven by `--concurrency` clients; the report gives
+requests/sec and latency percentiles.
+
+`--db-latency-ms` makes every query wait that long in the database driver (a
+SQLite function that sleeps), standing in for the network round trip and query
+time of a remote PostgreSQL. Against a real server pass `--database-url` and
+leave it at 0. The client runs on the same host: give the server cores of its
+own, or the client's CPU use caps both layers alike. Failed requests (e.g. pool
+timeouts) are counted in `errors`, not timed.
+
+Usage (from the `api/` directory):
+    $ python -m benchmarks.fixtures
+    $ python -m benchmarks.db_layer --concurrency 16,128,512 --db-latency-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.fixtures import DEFAULT_WORKDIR
+
+ENDPOINTS = {
+    "property": lambda ids: f"/properties/{random.choice(ids)}",
+    "property_full": lambda ids: f"/properties/{random.choice(ids)}/full",
+    "listing_page": lambda ids: "/properties?deal_type=Sale&limit=20",
+}
+
+
+def create_app():
+    """
+    The benchmark app; built only in the server process (it needs DATABASE_URL).
+    """
+    from fastapi import Depends, FastAPI, HTTPException
+    from sqlalchemy import event, func, select
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+
+    import listing
+    from database.database import get_async_db, get_db
+    from database.engine import async_engine, engine
+    from database.models import Property
+    from main import FULL_PROPERTY_OPTIONS, _full_property
+
+    latency = float(os.getenv("BENCH_DB_LATENCY_MS", "0")) / 1000
+
+    def bench_wait() -> int:
+        time.sleep(latency)
+        return 0
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        if latency and sync_engine.dialect.name == "sqlite":
+            event.listen(
+                sync_engine, "connect",
+                lambda dbapi_connection, _: dbapi_connection.create_function("bench_wait", 0, bench_wait),
+            )
+            # connections opened at import (create_all) lack the function
+            sync_engine.dispose(close=False)
+
+    def waited(statement):
+        return statement.where(func.bench_wait() == 0) if latency else statement
+
+    def by_id(property_id: int):
+        return waited(select(Property).where(Property.property_id == property_id))
+
+    app = FastAPI()
+
+    @app.get("/sync/properties/{property_id}")
+    def sync_property(property_id: int, db: Session = Depends(get_db)):
+        prop = db.scalars(by_id(property_id)).first()
+        if prop is None:
+            raise HTTPException(status_code=404)
+        return {"property_id": prop.property_id}
+
+    @app.get("/async/properties/{property_id}")
+    async def async_property(property_id: int, db: AsyncSession = Depends(get_async_db)):
+        prop = (await db.scalars(by_id(property_id))).first()
+        if prop is None:
+            raise HTTPException(status_code=404)
+        return {"property_id": prop.property_id}
+
+    @app.get("/sync/properties/{property_id}/full")
+    def sync_property_full(property_id: int, db: Session = Depends(get_db)):
+        prop = db.scalars(by_id(property_id).options(*FULL_PROPERTY_OPTIONS)).first()
+        if prop is None:
+            raise HTTPException(status_code=404)
+        return _full_property(prop)
+
+    @app.get("/async/properties/{property_id}/full")
+    async def async_property_full(property_id: int, db: AsyncSession = Depends(get_async_db)):
+        prop = (await db.scalars(by_id(property_id).options(*FULL_PROPERTY_OPTIONS))).first()
+        if prop is None:
+            raise HTTPException(status_code=404)
+        return _full_property(prop)
+
+    @app.get("/sync/properties")
+    def sync_listing(deal_type: str, limit: int, db: Session = Depends(get_db)):
+        rows = db.scalars(waited(listing.listing_statement(limit, deal_type=deal_type))).all()
+        return {"count": len(listing.page(list(rows), limit)[0])}
+
+    @app.get("/async/properties")
+    async def async_listing(deal_type: str, limit: int, db: AsyncSession = Depends(get_async_db)):
+        rows = (await db.scalars(waited(listing.listing_statement(limit, deal_type=deal_type)))).all()
+        return {"count": len(listing.page(list(rows), limit)[0])}
+
+    return app
+
+
+async def drive(base_url: str, path, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker(client):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path())
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    samples = np.asarray(latencies)
+    return {
+        "errors": errors,
+        "requests_per_second": len(samples) / elapsed,
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def start(database_url: str, model_dir: str, port: int, latency_ms: float, pool_size: int) -> subprocess.Popen:
+    import httpx
+
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "MODEL_DIR": model_dir,  # `main` (imported for its eager-loading options) loads the models
+        "BENCH_DB_LATENCY_MS": str(latency_ms),
+        "DB_POOL_SIZE": str(pool_size),
+        "DB_MAX_OVERFLOW": "0",
+        "METRICS_ENABLED": "false",
+        "MODEL_POLL_SECONDS": "0",
+    }
+    command = [sys.executable, "-m", "uvicorn", "benchmarks.db_layer:create_app", "--factory",
+               "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(command, cwd=Path(__file__).resolve().parents[1], env=env)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Benchmark server did not start")
+
+
+def main():
+    from benchmarks.endpoints import _free_port
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="output of `benchmarks.fixtures`")
+    parser.add_argument("--database-url", help="default: the SQLite database in --workdir")
+    parser.add_argument("--concurrency", default="16,128,512", help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint, layer and concurrency")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--pool-size", type=int, default=64, help="connections per engine")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{Path(args.workdir) / 'bench.db'}"
+    from sqlalchemy import create_engine, text
+    with create_engine(database_url).connect() as conn:
+        ids = [pid for (pid,) in conn.execute(text("SELECT property_id FROM properties"))]
+
+    port = _free_port()
+    server = start(database_url, str(Path(args.workdir) / "models"), port, args.db_latency_ms, args.pool_size)
+    report = {"db_latency_ms": args.db_latency_ms, "pool_size": args.pool_size, "results": {}}
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            for name in args.endpoints.split(","):
+                for layer in ("sync", "async"):
+                    path = lambda: f"/{layer}{ENDPOINTS[name](ids)}"
+                    # warm the pool and the code paths
+                    asyncio.run(drive(base_url, path, concurrency, concurrency))
+                    report["results"][f"{name}/{layer}/c{concurrency}"] = asyncio.run(
+                        drive(base_url, path, args.requests, concurrency)
+                    )
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Throughput and latency benchmark of the HTTP endpoints.
+
+Boots `main:app` under uvicorn in a subprocess against the SQLite stand-in
+from `benchmarks.fixtures` (or targets an already running server with
+`--url`), drives each scenario with a fixed number of concurrent clients
+and prints p50/p95/p99 latency and requests/sec as JSON.
+
+Server settings (COX_ENGINE, INFERENCE_MODE, ...) are taken from the
+environment, so configurations can be compared run by run:
+
+    $ python -m benchmarks.endpoints --concurrency 16 --requests 2000 --out base.json
+    $ COX_ENGINE=numpy PRICE_ENGINE=flat python -m benchmarks.endpoints --out fast.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from benchmarks import fixtures
+from benchmarks.fixtures import DEFAULT_WORKDIR
+
+API_DIR = Path(__file__).resolve().parents[1]
+
+# Server settings recorded in the report
+SETTINGS = [
+    "COX_ENGINE", "PRICE_ENGINE", "INFERENCE_MODE", "INFERENCE_WORKERS", "MICRO_BATCH_ENABLED",
+    "PREDICTION_CACHE_SIZE", "METRICS_ENABLED", "MODEL_FORMAT", "WEB_CONCURRENCY",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(database_url: str, model_dir: str, port: int, launcher: bool = False,
+                 timeout: float = 120.0) -> subprocess.Popen:
+    """
+    Launch the app (uvicorn, or the pre-fork `launcher.py`) and wait until it is ready.
+    """
+    env = {**os.environ, "DATABASE_URL": database_url, "MODEL_DIR": model_dir, "MODEL_POLL_SECONDS": "0"}
+    if launcher:
+        env.update(HOST="127.0.0.1", PORT=str(port))
+        command = [sys.executable, "launcher.py"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(command, cwd=API_DIR, env=env)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=1.0).status_code == 200:
+                return proc
+        except httpx.TransportError:
+            pass
+        time.sleep(0.25)
+    proc.terminate()
+    raise TimeoutError("Server did not become ready")
+
+
+class Payloads:
+    """
+    Request bodies and IDs drawn from the seeded `properties` table.
+    """
+
+    def __init__(self, database_url: str, distinct: int, batch_size: int, seed: int):
+        from sqlalchemy import create_engine
+
+        self.rng = random.Random(seed)
+        engine = create_engine(database_url)
+        props = pd.read_sql_table("properties", engine)
+        engine.dispose()
+
+        self.property_ids = props["property_id"].tolist()
+        rows = props.sample(n=min(distinct, len(props)), random_state=seed)
+        # JSON-ready PropertyBase bodies: dates as ISO strings, NaN/NaT as null
+        rows = rows.astype(object).where(rows.notna(), None)
+        self.properties = [
+            {k: (v.isoformat()[:10] if hasattr(v, "isoformat") else v) for k, v in row.items()}
+            for row in rows.to_dict(orient="records")
+        ]
+        self.batch_size = batch_size
+
+    def prop(self) -> dict:
+        return self.rng.choice(self.properties)
+
+    def batch(self) -> List[dict]:
+        return [self.prop() for _ in range(self.batch_size)]
+
+    def property_id(self) -> int:
+        return self.rng.choice(self.property_ids)
+
+
+def scenarios(p: Payloads) -> Dict[str, Callable[[], tuple]]:
+    """
+    name -> factory of (method, path, json body) for one request.
+    """
+    return {
+        "predict_rent_cox": lambda: ("POST", "/predict/rent-cox", p.prop()),
+        "predict_sale_cox": lambda: ("POST", "/predict/sale-cox", p.prop()),
+        "predict_batch": lambda: ("POST", "/predict/batch", p.batch()),
+        "get_property": lambda: ("GET", f"/properties/{p.property_id()}", None),
+        "get_prediction": lambda: ("GET", f"/prediction/?property_id={p.property_id()}", None),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, make_request: Callable[[], tuple],
+                       n_requests: int, concurrency: int, warmup: int) -> dict:
+    """
+    Send `n_requests` requests from `concurrency` concurrent clients after a warm-up.
+    """
+    for _ in range(warmup):
+        method, path, body = make_request()
+        await client.request(method, path, json=body)
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = n_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, path, body = make_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    samples = np.asarray(latencies)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_second": len(samples) / elapsed,
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "max_ms": float(samples.max()),
+    }
+
+
+async def run_all(base_url: str, payloads: Payloads, selected: List[str], args) -> dict:
+    factories = scenarios(payloads)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        for name in selected:
+            results[name] = await run_scenario(client, factories[name], args.requests, args.concurrency, args.warmup)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of booting one (it must serve the --workdir data)")
+    parser.add_argument("--launcher", action="store_true",
+                        help="boot through launcher.py (WEB_CONCURRENCY workers) instead of one uvicorn process")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="where the stand-in database and models are built")
+    parser.add_argument("--reuse", action="store_true", help="reuse the database and models already in --workdir")
+    parser.add_argument("--properties", type=int, default=3000)
+    parser.add_argument("--trees", type=int, default=20, help="trees per price forest")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per scenario")
+    parser.add_argument("--batch-size", type=int, default=50, help="properties per /predict/batch request")
+    parser.add_argument("--distinct", type=int, default=1000, help="distinct property payloads (controls cache hits)")
+    parser.add_argument("--scenario", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir).resolve()
+    if args.reuse and (workdir / "bench.db").exists():
+        paths = {"database_url": f"sqlite:///{workdir / 'bench.db'}", "model_dir": str(workdir / "models")}
+    else:
+        paths = fixtures.build(workdir, n_properties=args.properties, n_estimators=args.trees, seed=args.seed)
+    payloads = Payloads(paths["database_url"], args.distinct, args.batch_size, args.seed)
+
+    selected = args.scenario or list(scenarios(payloads))
+    unknown = set(selected) - set(scenarios(payloads))
+    if unknown:
+        parser.error(f"unknown scenario(s): {sorted(unknown)}")
+
+    server: Optional[subprocess.Popen] = None
+    base_url = args.url
+    if base_url is None:
+        port = _free_port()
+        server = start_server(paths["database_url"], paths["model_dir"], port, launcher=args.launcher)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        results = asyncio.run(run_all(base_url, payloads, selected, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "base_url": base_url,
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "launcher": args.launcher,
+        "concurrency": args.concurrency,
+        "requests_per_scenario": args.requests,
+        "batch_size": args.batch_size,
+        "distinct_payloads": args.distinct,
+        "settings": {name: os.environ[name] for name in SETTINGS if name in os.environ},
+        "scenarios": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text)
+
+
+if __name__ == "__main__":
+    main()
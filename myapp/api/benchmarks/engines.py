@@ -0,0 +1,122 @@
+"""
+Parity and latency check for the prediction engines.
+
+Compares the pandas/sklearn/lifelines path against the flattened-forest and
+closed-form Cox engines on synthetic properties, and prints a JSON report.
+
+Usage (from the `api/` directory):
+    $ python -m benchmarks.engines --rows 1000 --repeat 200
+"""
+
+import argparse
+import json
+import os
+import time
+
+# The router imports the DB layer; benchmarks do not touch the database.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+import pandas as pd
+
+import prediction_router as pr
+from benchmarks.fixtures import synthetic_records
+from cox_scorer import max_abs_difference
+
+
+def timed(fn, repeat: int) -> dict:
+    """
+    Call `fn` `repeat` times and summarise the wall-clock latency in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.asarray(samples)
+    return {
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+    }
+
+
+def decision_path_contributions(pipeline, frame: pd.DataFrame) -> np.ndarray:
+    """
+    Reference path-based contributions from sklearn, one tree and one row at a time.
+    """
+    X = pipeline.named_steps["preprocessor"].transform(frame)
+    estimators = pipeline.named_steps["regressor"].estimators_
+    out = np.zeros(X.shape)
+    for est in estimators:
+        tree = est.tree_
+        paths = est.decision_path(X)
+        for i in range(X.shape[0]):
+            nodes = paths.indices[paths.indptr[i]:paths.indptr[i + 1]]
+            for parent, child in zip(nodes[:-1], nodes[1:]):
+                out[i, tree.feature[parent]] += tree.value[child, 0, 0] - tree.value[parent, 0, 0]
+    return out / len(estimators)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="rows used for parity and batch timing")
+    parser.add_argument("--repeat", type=int, default=200, help="timed calls per measurement")
+    args = parser.parse_args()
+
+    bundle = pr.registry.current()
+    records = synthetic_records(bundle.rent_flat.encoder, args.rows)
+    frame = pd.DataFrame(records)
+    single = records[:1]
+    report = {"model_version": bundle.version, "rows": args.rows, "repeat": args.repeat, "parity": {}, "latency": {}}
+
+    # — parity —
+    for name, pipeline, flat in (
+        ("rent", bundle.rent_model, bundle.rent_flat),
+        ("sale", bundle.sales_model, bundle.sales_flat),
+    ):
+        expected = pipeline.predict(frame)
+        actual = flat.predict(records)
+        report["parity"][f"{name}_max_rel_diff"] = float(np.max(np.abs(actual - expected) / np.abs(expected)))
+
+    cox_columns = {col: frame[col] for col in pr.COX_INPUT_COLUMNS}
+    cox_columns["predicted_sell_price"] = bundle.sales_model.predict(frame)
+    cox_columns["predicted_rent_price"] = bundle.rent_model.predict(frame)
+    df_ready = pd.DataFrame(bundle.cox_scorer.design_matrix(cox_columns), columns=bundle.cox_features)
+    report["parity"]["cox_max_abs_diff"] = max_abs_difference(bundle.cox_scorer, bundle.cox_model, df_ready)
+
+    # survival curve and median of `/predict/survival-curve`
+    partial_hazard = bundle.cox_scorer.partial_hazard(df_ready.values)
+    curve = bundle.cox_scorer.prob_sold_at(partial_hazard, pr.DEFAULT_CURVE_HORIZONS)
+    expected_curve = 1 - bundle.cox_model.predict_survival_function(df_ready, times=pr.DEFAULT_CURVE_HORIZONS).values.T
+    report["parity"]["curve_max_abs_diff"] = float(np.max(np.abs(curve - expected_curve)))
+    median = bundle.cox_scorer.median_time(partial_hazard)
+    expected_median = np.asarray(bundle.cox_model.predict_median(df_ready), dtype=float).reshape(-1)
+    report["parity"]["median_mismatches"] = int(np.sum(median != expected_median))
+
+    # path-based contributions of `/predict/explain` vs sklearn's decision paths
+    report["parity"]["sale_explain_max_abs_diff"] = float(np.max(np.abs(
+        bundle.sales_flat.forest.contributions(bundle.sales_flat.encoder.encode(records[:20]))[1]
+        - decision_path_contributions(bundle.sales_model, frame.iloc[:20])
+    )))
+
+    # — latency —
+    report["latency"]["sale_pipeline_1_row"] = timed(lambda: bundle.sales_model.predict(pd.DataFrame(single)), args.repeat)
+    report["latency"]["sale_flat_1_row"] = timed(lambda: bundle.sales_flat.predict(single), args.repeat)
+    report["latency"][f"sale_pipeline_{args.rows}_rows"] = timed(lambda: bundle.sales_model.predict(pd.DataFrame(records)), max(1, args.repeat // 10))
+    report["latency"][f"sale_flat_{args.rows}_rows"] = timed(lambda: bundle.sales_flat.predict(records), max(1, args.repeat // 10))
+    report["latency"]["sale_explain_1_row"] = timed(lambda: bundle.sales_flat.explain(single), args.repeat)
+    report["latency"][f"sale_explain_{args.rows}_rows"] = timed(lambda: bundle.sales_flat.explain(records), max(1, args.repeat // 10))
+    report["latency"]["cox_lifelines_1_row"] = timed(
+        lambda: bundle.cox_model.predict_survival_function(df_ready.iloc[:1], times=[pr.SALE_HORIZON_DAYS]), args.repeat
+    )
+    report["latency"]["cox_numpy_1_row"] = timed(
+        lambda: bundle.cox_scorer.prob_sold(bundle.cox_scorer.design_matrix({k: v[:1] for k, v in cox_columns.items()})),
+        args.repeat,
+    )
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
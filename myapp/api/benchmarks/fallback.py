@@ -0,0 +1,180 @@
+"""
+Cost, accuracy and effect of the deadline fallback.
+
+Offline (default): checks the shallow forests against sklearn (the first trees,
+each stopped at the depth limit), then, per batch size, times `run_models`
+against `scoring.run_fallback` and reports how far the fallback's prices and
+sale probability are from the full models'.
+
+Online (`--online`): boots the API (see `benchmarks.endpoints`) and drives
+`/predict/batch` with `--concurrency` clients, once without a deadline and once
+with `?deadline_ms=`, and reports latency percentiles, the share of requests
+slower than the deadline and the share of rows the fallback scored.
+
+Usage (from the `api/` directory):
+    $ python -m benchmarks.fixtures
+    $ python -m benchmarks.fallback --rows 1,50,1000
+    $ python -m benchmarks.fallback --online --concurrency 32 --deadline-ms 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+# The router imports the DB layer; the offline part does not touch the database.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import DEFAULT_WORKDIR, synthetic_records
+
+
+def sklearn_shallow(pipeline, frame: pd.DataFrame, n_trees: int, max_depth: int) -> np.ndarray:
+    """
+    Reference for `FlatForest.shallow`: mean over the first `n_trees` estimators of
+    the value of the deepest node each row reaches within `max_depth` splits.
+    """
+    X = pipeline.named_steps["preprocessor"].transform(frame)
+    out = np.zeros(X.shape[0])
+    estimators = pipeline.named_steps["regressor"].estimators_[:n_trees]
+    for est in estimators:
+        paths = est.decision_path(X)
+        for i in range(X.shape[0]):
+            nodes = paths.indices[paths.indptr[i]:paths.indptr[i + 1]]
+            out[i] += est.tree_.value[nodes[min(max_depth, len(nodes) - 1)], 0, 0]
+    return out / len(estimators)
+
+
+def offline(args) -> dict:
+    import prediction_router as pr
+    import scoring
+    from benchmarks.engines import timed
+
+    bundle = pr.registry.current()
+    sizes = [int(n) for n in args.rows.split(",")]
+    records = synthetic_records(bundle.sales_flat.encoder, max(max(sizes), 500))
+    report = {
+        "model_version": bundle.version,
+        "trees": bundle.sales_flat.forest.n_trees,
+        "max_depth": bundle.sales_flat.forest.max_depth,
+        "fallback_trees": scoring.FALLBACK_TREES,
+        "fallback_max_depth": scoring.FALLBACK_MAX_DEPTH,
+        "parity": {},
+        "accuracy": {},
+        "latency": {},
+    }
+
+    # — parity —
+    if bundle.sales_model is not None:
+        probe = records[:200]
+        expected = sklearn_shallow(bundle.sales_model, pd.DataFrame(probe), scoring.FALLBACK_TREES,
+                                   scoring.FALLBACK_MAX_DEPTH)
+        actual = bundle.sales_flat.shallow(scoring.FALLBACK_TREES, scoring.FALLBACK_MAX_DEPTH).predict(probe)
+        report["parity"]["shallow_vs_sklearn_max_rel_diff"] = float(np.max(np.abs(actual - expected) / np.abs(expected)))
+        full = bundle.sales_flat.forest
+        unchanged = bundle.sales_flat.shallow(full.n_trees, full.max_depth).predict(probe)
+        report["parity"]["uncut_vs_full_max_abs_diff"] = float(np.max(np.abs(unchanged - bundle.sales_flat.predict(probe))))
+
+    # — accuracy against the full models —
+    rent, sale, prob = scoring.run_models(bundle, records)
+    f_rent, f_sale, f_prob, _, _ = scoring.run_fallback(bundle, records)
+    for name, full, cheap in (("rent", rent, f_rent), ("sale", sale, f_sale)):
+        rel = np.abs(cheap - full) / np.abs(full)
+        report["accuracy"][f"{name}_price_rel_error"] = {
+            "mean": float(rel.mean()), "p90": float(np.percentile(rel, 90)), "max": float(rel.max()),
+        }
+    diff = np.abs(f_prob - prob)
+    report["accuracy"]["prob_sold_abs_error"] = {"mean": float(diff.mean()), "max": float(diff.max())}
+
+    # — latency —
+    for n in sizes:
+        rows = records[:n]
+        full = timed(lambda: scoring.run_models(bundle, rows), args.repeat)
+        cheap = timed(lambda: scoring.run_fallback(bundle, rows), args.repeat)
+        report["latency"][f"{n}_rows"] = {
+            "run_models": full, "run_fallback": cheap, "speedup": full["p50_ms"] / cheap["p50_ms"],
+        }
+    return report
+
+
+async def drive(base_url: str, payloads, requests: int, concurrency: int, deadline_ms) -> dict:
+    import httpx
+
+    latencies, rows, fallback_rows = [], 0, 0
+    remaining = requests
+    params = {} if deadline_ms is None else {"deadline_ms": deadline_ms}
+
+    async def worker(client):
+        nonlocal remaining, rows, fallback_rows
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.post("/predict/batch", json=payloads.batch(), params=params)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+            scored_by = [item["scored_by"] for item in response.json()]
+            rows += len(scored_by)
+            fallback_rows += scored_by.count("fallback")
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+    samples = np.asarray(latencies)
+    result = {
+        "deadline_ms": deadline_ms,
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "fallback_row_share": fallback_rows / rows,
+    }
+    if deadline_ms is not None:
+        result["over_deadline_share"] = float(np.mean(samples > deadline_ms))
+    return result
+
+
+def online(args) -> dict:
+    from benchmarks.endpoints import Payloads, _free_port, start_server
+
+    workdir = Path(args.workdir)
+    database_url = f"sqlite:///{workdir / 'bench.db'}"
+    # distinct rows so the prediction cache does not hide the model cost
+    payloads = Payloads(database_url, distinct=10 ** 6, batch_size=args.batch_size, seed=0)
+    port = _free_port()
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    server = start_server(database_url, str(workdir / "models"), port)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        return {
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size,
+            "without_deadline": asyncio.run(drive(base_url, payloads, args.requests, args.concurrency, None)),
+            "with_deadline": asyncio.run(
+                drive(base_url, payloads, args.requests, args.concurrency, args.deadline_ms)
+            ),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1,50,1000", help="comma-separated batch sizes (offline)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per measurement (offline)")
+    parser.add_argument("--online", action="store_true", help="drive a booted server instead")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="output of `benchmarks.fixtures` (online)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="requests per run (online)")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--deadline-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    print(json.dumps(online(args) if args.online else offline(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Self-contained stand-in environment for the benchmarks.
+
+Builds a SQLite database seeded with the ETL generators
+(`etl/database/data_generate.py`) and trains small models with the same
+pipeline layout as `model/main_model.py`, so the API can be booted without
+Postgres or the production artifacts.
+
+Usage (from the `api/` directory):
+    $ python -m benchmarks.fixtures --properties 3000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+import joblib
+import pandas as pd
+
+# The ETL generators live next to the API in the repository, not in the API image.
+ETL_DATABASE_DIR = Path(__file__).resolve().parents[2] / "etl" / "database"
+
+DEFAULT_WORKDIR = str(Path(tempfile.gettempdir()) / "marketing-api-bench")
+
+# Same constants as `etl/etl_process.py`
+PROPERTY_TYPES = ["Apartment", "House"]
+DEAL_TYPES = ["Rent", "Sale"]
+USER_TYPES = ["Agent", "Owner", "Buyer"]
+DISTRICTS_YEREVAN = [
+    "Kentron", "Arabkir", "Avan", "Davtashen", "Erebuni", "Malatia-Sebastia",
+    "Nor Nork", "Nork-Marash", "Shengavit", "Kanaker-Zeytun", "Ajapnyak", "Nubarashen"
+]
+RENOVATION_STATUSES = ["Newly Renovated", "Partially Renovated", "Not Renovated"]
+
+# Same features as `model/main_model.py`
+NUMERICAL_FEATURES = ["size_sqm", "rooms", "floor", "year_built"]
+CATEGORICAL_FEATURES = ["district", "renovation_status"]
+ALL_FEATURES = NUMERICAL_FEATURES + CATEGORICAL_FEATURES
+
+
+def _data_generate():
+    if str(ETL_DATABASE_DIR) not in sys.path:
+        sys.path.insert(0, str(ETL_DATABASE_DIR))
+    import data_generate
+    return data_generate
+
+
+def generate_tables(n_users: int, n_locations: int, n_properties: int, seed: int) -> dict:
+    """
+    Generate every table the API reads, as DataFrames keyed by table name.
+    """
+    dg = _data_generate()
+    random.seed(seed)
+    dg.fake.seed_instance(seed)
+
+    users = pd.DataFrame([dg.generate_user(i, USER_TYPES) for i in range(1, n_users + 1)])
+    types = pd.DataFrame([{"type_id": i + 1, "type_name": name} for i, name in enumerate(PROPERTY_TYPES)])
+    locations = pd.DataFrame([dg.generate_location(i, DISTRICTS_YEREVAN) for i in range(1, n_locations + 1)])
+
+    properties = pd.DataFrame([
+        dg.generate_property(
+            property_id=i,
+            user_id=random.randint(1, n_users),
+            location_id=random.randint(1, n_locations),
+            property_types=PROPERTY_TYPES,
+            post_date=None,
+            deal_types=DEAL_TYPES,
+            renovation_statuses=RENOVATION_STATUSES,
+            districts=DISTRICTS_YEREVAN,
+        )
+        for i in range(1, n_properties + 1)
+    ])
+    properties["status"] = properties["sell_date"].map(lambda d: "Sold" if d is not None else "Available")
+    properties["estimated_saleprice"] = properties["estimated_saleprice"].round().astype(int)
+    properties["estimated_rentprice"] = properties["estimated_rentprice"].round().astype(int)
+
+    images = pd.DataFrame([dg.generate_image(i, i) for i in range(1, n_properties + 1)])
+
+    return {
+        "users": users,
+        "property_types": types,
+        "locations": locations,
+        "properties": properties,
+        "images": images,
+    }
+
+
+def synthetic_records(encoder, n: int, seed: int = 42):
+    """
+    Random model-input records drawn from the categories a price model was fitted on.
+
+    Args:
+        encoder: `RecordEncoder` of the model (e.g. `bundle.rent_flat.encoder`).
+        n (int): Number of records.
+    """
+    rng = random.Random(seed)
+    districts = encoder.categories["district"]
+    renovations = encoder.categories["renovation_status"]
+    return [
+        {
+            "size_sqm": round(rng.uniform(25, 200), 1),
+            "rooms": rng.randint(1, 6),
+            "floor": rng.randint(1, 12),
+            "year_built": rng.randint(1965, 2024),
+            "district": rng.choice(districts),
+            "renovation_status": rng.choice(renovations),
+        }
+        for _ in range(n)
+    ]
+
+
+def train_models(df: pd.DataFrame, model_dir: Path, n_estimators: int) -> pd.DataFrame:
+    """
+    Train rent, sale and Cox models on `df` (properties joined with district) and
+    save them as the three artifacts the API loads.
+
+    Returns:
+        pd.DataFrame: The `predictions` table for `df`.
+    """
+    from lifelines import CoxPHFitter
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    def pipeline():
+        preprocessor = ColumnTransformer([
+            ("num", "passthrough", NUMERICAL_FEATURES),
+            ("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL_FEATURES),
+        ])
+        return Pipeline([
+            ("preprocessor", preprocessor),
+            ("regressor", RandomForestRegressor(n_estimators=n_estimators, random_state=42)),
+        ])
+
+    sell_pipeline = pipeline().fit(df[ALL_FEATURES], df["estimated_saleprice"])
+    rent_pipeline = pipeline().fit(df[ALL_FEATURES], df["estimated_rentprice"])
+    joblib.dump(sell_pipeline, model_dir / "sell_price_model.pkl")
+    joblib.dump(rent_pipeline, model_dir / "rent_price_model.pkl")
+
+    post_date = pd.to_datetime(df["post_date"])
+    sell_date = pd.to_datetime(df["sell_date"])
+    cox_input = df[ALL_FEATURES].copy()
+    cox_input["predicted_sell_price"] = sell_pipeline.predict(df[ALL_FEATURES])
+    cox_input["predicted_rent_price"] = rent_pipeline.predict(df[ALL_FEATURES])
+    cox_input["duration"] = (sell_date.fillna(pd.Timestamp.today()) - post_date).dt.days
+    cox_input["event"] = sell_date.notna().astype(int)
+    cox_input_encoded = pd.get_dummies(cox_input, columns=CATEGORICAL_FEATURES, drop_first=True)
+
+    cph = CoxPHFitter().fit(cox_input_encoded, duration_col="duration", event_col="event")
+    joblib.dump(cph, model_dir / "cox_model.pkl")
+
+    surv = cph.predict_survival_function(cox_input_encoded, times=[150])
+    return pd.DataFrame({
+        "prediction_id": range(1, len(df) + 1),
+        "property_id": df["property_id"].values,
+        "predicted_sell_price": cox_input["predicted_sell_price"].round().astype(int).values,
+        "predicted_rent_price": cox_input["predicted_rent_price"].round().astype(int).values,
+        "prob_sold_within_5_months": (1 - surv.loc[150].values).round(2),
+    })
+
+
+def build(workdir: Path, n_users: int = 50, n_locations: int = 50, n_properties: int = 3000,
+          n_estimators: int = 20, seed: int = 0) -> dict:
+    """
+    Create `workdir/bench.db` and `workdir/models/`, replacing earlier ones.
+
+    Returns:
+        dict: `database_url` and `model_dir` to point the API at.
+    """
+    from sqlalchemy import create_engine
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from database.models import Base
+
+    workdir = Path(workdir).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    db_path = workdir / "bench.db"
+    if db_path.exists():
+        db_path.unlink()
+    database_url = f"sqlite:///{db_path}"
+
+    tables = generate_tables(n_users, n_locations, n_properties, seed)
+    joined = tables["properties"].merge(tables["locations"][["location_id", "district"]], on="location_id")
+    tables["predictions"] = train_models(joined, workdir / "models", n_estimators)
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    # parents before children, for the foreign keys
+    for name in ("users", "property_types", "locations", "properties", "images", "predictions"):
+        tables[name].to_sql(name, engine, if_exists="append", index=False)
+    engine.dispose()
+
+    return {"database_url": database_url, "model_dir": str(workdir / "models")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="where the database and models are written")
+    parser.add_argument("--properties", type=int, default=3000)
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--trees", type=int, default=20, help="trees per price forest")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = build(Path(args.workdir), n_locations=args.locations, n_properties=args.properties,
+                  n_estimators=args.trees, seed=args.seed)
+    print(f"DATABASE_URL={paths['database_url']}")
+    print(f"MODEL_DIR={paths['model_dir']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Overhead of forest prediction intervals over the plain mean prediction.
+
+For several batch sizes, times the flattened sale forest's mean prediction
+against the mean plus P10/P50/P90 of the per-tree outputs (one pass over all
+trees), and both against sklearn: `Pipeline.predict` and a Python loop over
+`estimators_`, the naive way to get per-tree outputs. Also checks that the
+quantiles match the ones computed from the sklearn trees, and times the full
+`run_models` vs `run_intervals` scoring path. Prints a JSON report.
+
+Usage (from the `api/` directory):
+    $ python -m benchmarks.intervals --rows 1,100,1000 --repeat 50
+"""
+
+import argparse
+import json
+import os
+
+# The router imports the DB layer; benchmarks do not touch the database.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+import pandas as pd
+
+import prediction_router as pr
+from benchmarks.engines import timed
+from benchmarks.fixtures import synthetic_records
+from scoring import run_intervals, run_models
+
+QUANTILES = [0.1, 0.5, 0.9]
+
+
+def sklearn_per_tree(pipeline, frame: pd.DataFrame) -> np.ndarray:
+    """
+    (n_rows, n_trees) outputs of a fitted pipeline's forest, one estimator at a time.
+    """
+    X = pipeline.named_steps["preprocessor"].transform(frame)
+    return np.stack([est.predict(X) for est in pipeline.named_steps["regressor"].estimators_], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1,100,1000", help="comma-separated batch sizes")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per measurement")
+    args = parser.parse_args()
+
+    bundle = pr.registry.current()
+    sizes = [int(n) for n in args.rows.split(",")]
+    report = {
+        "model_version": bundle.version,
+        "trees": bundle.sales_flat.forest.n_trees,
+        "quantiles": QUANTILES,
+        "repeat": args.repeat,
+        "parity": {},
+        "latency": {},
+    }
+
+    # — parity —
+    records = synthetic_records(bundle.sales_flat.encoder, max(sizes))
+    _, flat_q = bundle.sales_flat.predict_quantiles(records, QUANTILES)
+    if bundle.sales_model is not None:
+        expected = np.quantile(sklearn_per_tree(bundle.sales_model, pd.DataFrame(records)), QUANTILES, axis=1).T
+        report["parity"]["sale_quantiles_max_rel_diff"] = float(
+            np.max(np.abs(flat_q - expected) / np.maximum(np.abs(expected), 1e-12))
+        )
+
+    # — latency —
+    for n in sizes:
+        rows = records[:n]
+        entry = {
+            "flat_mean": timed(lambda: bundle.sales_flat.predict(rows), args.repeat),
+            "flat_mean_and_quantiles": timed(lambda: bundle.sales_flat.predict_quantiles(rows, QUANTILES), args.repeat),
+            "run_models": timed(lambda: run_models(bundle, rows), args.repeat),
+            "run_intervals": timed(lambda: run_intervals(bundle, rows, QUANTILES), args.repeat),
+        }
+        if bundle.sales_model is not None:
+            frame = pd.DataFrame(rows)
+            entry["pipeline_mean"] = timed(lambda: bundle.sales_model.predict(frame), args.repeat)
+            entry["pipeline_tree_loop_quantiles"] = timed(
+                lambda: np.quantile(sklearn_per_tree(bundle.sales_model, frame), QUANTILES, axis=1), args.repeat
+            )
+        entry["quantile_overhead"] = entry["flat_mean_and_quantiles"]["p50_ms"] / entry["flat_mean"]["p50_ms"]
+        report["latency"][f"{n}_rows"] = entry
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Page latency of `GET /properties` by page depth: keyset cursor vs OFFSET.
+
+Builds (once, then reuses) a SQLite `properties` table of `--rows` synthetic
+listings with the API's indexes, and for each depth times the page that starts
+there through `listing.listing_statement` (the cursor of the row just before it)
+and through the same query with `OFFSET depth`. Keyset pages should cost the
+same at every depth; OFFSET pages grow linearly with it. Prints a JSON report.
+
+Usage (from the `api/` directory):
+    $ python -m benchmarks.listing --rows 1000000 --depths 0,10000,100000,400000
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.fixtures import DEFAULT_WORKDIR, DEAL_TYPES, DISTRICTS_YEREVAN, RENOVATION_STATUSES
+
+N_LOCATIONS = 50
+
+
+def timed(fn, repeat: int) -> dict:
+    """
+    As `benchmarks.engines.timed`, which cannot be imported without loading the models.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": float(np.percentile(samples, 50)), "p95_ms": float(np.percentile(samples, 95))}
+
+
+def build(path: Path, rows: int, seed: int = 0, chunk: int = 100_000) -> None:
+    """
+    Create `path` with `rows` properties (posted over the last five years) and their locations.
+    """
+    from database.models import Base, Location, Property, PropertyType, User
+
+    path.unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    rng = np.random.default_rng(seed)
+    first_day = date.today() - timedelta(days=5 * 365)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"user_id": 1, "email": "bench@example.com"}])
+        conn.execute(PropertyType.__table__.insert(), [{"type_id": 1, "type_name": "Apartment"},
+                                                       {"type_id": 2, "type_name": "House"}])
+        conn.execute(Location.__table__.insert(), [
+            {"location_id": i, "city": "Yerevan", "district": DISTRICTS_YEREVAN[i % len(DISTRICTS_YEREVAN)]}
+            for i in range(1, N_LOCATIONS + 1)
+        ])
+        for start in range(0, rows, chunk):
+            n = min(chunk, rows - start)
+            size = rng.uniform(25, 200, n).round(1)
+            days = rng.integers(0, 5 * 365, n)
+            conn.execute(Property.__table__.insert(), [
+                {
+                    "property_id": start + i + 1,
+                    "type_id": int(rng.integers(1, 3)),
+                    "deal_type": DEAL_TYPES[i % 2],
+                    "status": "Available",
+                    "user_id": 1,
+                    "location_id": int(rng.integers(1, N_LOCATIONS + 1)),
+                    "post_date": first_day + timedelta(days=int(days[i])),
+                    "size_sqm": float(size[i]),
+                    "rooms": int(rng.integers(1, 7)),
+                    "floor": int(rng.integers(1, 13)),
+                    "year_built": int(rng.integers(1965, 2025)),
+                    "renovation_status": RENOVATION_STATUSES[int(rng.integers(0, 3))],
+                    "estimated_saleprice": int(size[i] * rng.uniform(900, 1500)),
+                    "estimated_rentprice": int(size[i] * rng.uniform(4, 8)),
+                }
+                for i in range(n)
+            ])
+        conn.exec_driver_sql("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--depths", default="0,10000,100000,400000", help="comma-separated page start rows")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--sort", default="-post_date")
+    parser.add_argument("--deal-type", default="Sale", help="filter of every page; '' for none")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    path = workdir / f"listing-{args.rows}.db"
+    # the DB layer reads DATABASE_URL at import
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    if not path.exists():
+        build(path, args.rows)
+
+    import listing
+    from database.models import Property
+
+    db = sessionmaker(bind=create_engine(f"sqlite:///{path}"))()
+    filters = {"deal_type": args.deal_type} if args.deal_type else {}
+    key, descending = listing.parse_sort(args.sort)
+    column = listing.SORT_COLUMNS[key]
+    order = (column.desc(), Property.property_id.desc()) if descending else (column.asc(), Property.property_id.asc())
+    offset_query = db.query(Property).filter(column.isnot(None)).filter_by(**filters).order_by(*order)
+
+    report = {
+        "rows": db.query(func.count(Property.property_id)).scalar(),
+        "sort": args.sort,
+        "filters": filters,
+        "limit": args.limit,
+        "pages": {},
+    }
+    for depth in (int(d) for d in args.depths.split(",")):
+        cursor = None
+        if depth:
+            before = offset_query.offset(depth - 1).limit(1).one()
+            cursor = listing.encode_cursor(args.sort, getattr(before, key), before.property_id)
+        statement = listing.listing_statement(args.limit, args.sort, cursor, **filters)
+        keyset_page, _ = listing.page(db.scalars(statement).all(), args.limit, args.sort)
+        offset_page = offset_query.offset(depth).limit(args.limit).all()
+        assert [p.property_id for p in keyset_page] == [p.property_id for p in offset_page]
+        report["pages"][f"depth_{depth}"] = {
+            "keyset": timed(lambda: listing.page(db.scalars(statement).all(), args.limit, args.sort), args.repeat),
+            "offset": timed(lambda: offset_query.offset(depth).limit(args.limit).all(), args.repeat),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
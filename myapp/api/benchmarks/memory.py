@@ -0,0 +1,129 @@
+"""
+Resident memory per worker: pickled vs memory-mapped model artifacts.
+
+Starts N worker processes at once for each artifact format, lets each one
+load the models and score a batch (so every page it needs is touched), and
+reports, per worker, RSS plus PSS and private memory from
+`/proc/self/smaps_rollup` (Linux). RSS counts shared pages in full for every
+process; PSS splits them between the processes sharing them, so PSS is what
+shows the page-cache sharing of the `.npy` artifacts.
+
+Usage (from the `api/` directory):
+    $ python -m benchmarks.fixtures --trees 100
+    $ python -m benchmarks.memory --model-dir /tmp/marketing-api-bench/models --workers 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+MB = 1024 * 1024
+
+
+def _memory() -> Dict[str, float]:
+    usage = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                usage["rss_mb"] = int(line.split()[1]) * 1024 / MB
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.endswith("kB\n")}
+        usage["pss_mb"] = fields["Pss"] * 1024 / MB
+        usage["private_mb"] = (fields["Private_Clean"] + fields["Private_Dirty"]) * 1024 / MB
+    except (FileNotFoundError, KeyError):
+        pass
+    return usage
+
+
+def _worker(model_dir: str, artifact_format: str, rows: int, ready, release, results) -> None:
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from model_registry import ModelRegistry
+    from scoring import CATEGORICAL_FEATURES, SALE_HORIZON_DAYS
+
+    before = _memory()
+    registry = ModelRegistry(Path(model_dir), poll_interval=0, categorical=CATEGORICAL_FEATURES,
+                             horizons=[SALE_HORIZON_DAYS], artifact_format=artifact_format)
+    registry.reload()
+    bundle = registry.current()
+
+    from benchmarks.fixtures import synthetic_records
+    records = synthetic_records(bundle.rent_flat.encoder, rows)
+    bundle.rent_flat.predict(records)
+    bundle.sales_flat.predict(records)
+
+    # measure only once every worker is loaded, so shared pages are shared
+    ready.wait()
+    results.put({"pid": os.getpid(), "baseline": before, "loaded": _memory()})
+    release.wait()
+
+
+def measure(model_dir: Path, artifact_format: str, workers: int, rows: int) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    ready, release, results = ctx.Barrier(workers), ctx.Barrier(workers + 1), ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(str(model_dir), artifact_format, rows, ready, release, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    reports: List[Dict] = [results.get(timeout=600) for _ in procs]
+    release.wait()
+    for p in procs:
+        p.join()
+
+    def mean(key: str, state: str = "loaded") -> float:
+        values = [r[state][key] for r in reports if key in r[state]]
+        return sum(values) / len(values) if values else float("nan")
+
+    return {
+        "workers": workers,
+        "per_worker": reports,
+        "mean_rss_mb": mean("rss_mb"),
+        "mean_pss_mb": mean("pss_mb"),
+        "mean_private_mb": mean("private_mb"),
+        "mean_model_pss_mb": mean("pss_mb") - mean("pss_mb", "baseline"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", type=Path, default=Path(os.getenv("MODEL_DIR", "models")),
+                        help="directory with the three .pkl artifacts")
+    parser.add_argument("--npy-dir", type=Path, help="converted artifacts (default: convert into a temp dir)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=256, help="rows each worker scores before measuring")
+    args = parser.parse_args()
+
+    import joblib
+    import flat_artifacts
+    from model_registry import COX_FILE, RENT_FILE, SALE_FILE, _content_version
+    from scoring import CATEGORICAL_FEATURES
+
+    npy_dir = args.npy_dir
+    if npy_dir is None:
+        npy_dir = Path(tempfile.mkdtemp(prefix="npy-artifacts-"))
+        flat_artifacts.write(
+            npy_dir,
+            version=_content_version(args.model_dir),
+            rent_model=joblib.load(args.model_dir / RENT_FILE),
+            sales_model=joblib.load(args.model_dir / SALE_FILE),
+            cox_model=joblib.load(args.model_dir / COX_FILE),
+            categorical=CATEGORICAL_FEATURES,
+        )
+
+    report = {
+        "model_dir": str(args.model_dir),
+        "npy_dir": str(npy_dir),
+        "pickle": measure(args.model_dir, "pickle", args.workers, args.rows),
+        "npy": measure(npy_dir, "npy", args.workers, args.rows),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
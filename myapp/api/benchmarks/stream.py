@@ -0,0 +1,158 @@
+"""
+Time to first row, throughput and server memory of `POST /predict/stream`.
+
+Boots the API (see `benchmarks.endpoints`), uploads a generated CSV or NDJSON
+body of `--rows` rows without materializing it, reads the streamed results
+while the upload is still going, and samples the server's RSS meanwhile.
+Peak RSS should not grow with `--rows`.
+
+HTTP client libraries send the whole request body before reading the
+response, which would hide the streaming; the upload therefore goes over a
+raw socket (chunked transfer encoding) from a separate thread.
+
+Usage (from the `api/` directory):
+    $ python -m benchmarks.fixtures
+    $ python -m benchmarks.stream --rows 200000 --format csv
+"""
+
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.endpoints import start_server
+from benchmarks.fixtures import DEFAULT_WORKDIR
+
+RENOVATIONS = ["Newly Renovated", "Partially Renovated", "Not Renovated"]
+COLUMNS = ["property_id", "location_id", "size_sqm", "rooms", "floor", "year_built", "renovation_status"]
+
+
+def generate(fmt: str, rows: int, locations: int, seed: int = 0, batch: int = 1000):
+    """
+    Upload body as an iterator of byte blocks of `batch` rows each.
+    """
+    rng = random.Random(seed)
+    if fmt == "csv":
+        yield (",".join(COLUMNS) + "\n").encode()
+    for start in range(0, rows, batch):
+        lines = []
+        for i in range(start, min(rows, start + batch)):
+            row = [i + 1, rng.randint(1, locations), round(rng.uniform(25, 200), 1), rng.randint(1, 6),
+                   rng.randint(1, 12), rng.randint(1965, 2024), rng.choice(RENOVATIONS)]
+            lines.append(",".join(map(str, row)) if fmt == "csv" else json.dumps(dict(zip(COLUMNS, row))))
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _read_chunked(sock: socket.socket):
+    """
+    Yield the lines of a chunked HTTP/1.1 response body, after checking the status.
+    """
+    reader = sock.makefile("rb")
+    status = reader.readline().decode()
+    if " 200 " not in status:
+        raise RuntimeError(f"Unexpected response: {status.strip()}")
+    while reader.readline() not in (b"\r\n", b""):
+        pass
+    pending = b""
+    while True:
+        size = int(reader.readline().split(b";")[0], 16)
+        if size == 0:
+            break
+        pending += reader.read(size)
+        reader.readline()
+        *lines, pending = pending.split(b"\n")
+        yield from lines
+    if pending:
+        yield pending
+
+
+def stream(port: int, fmt: str, body):
+    """
+    POST `body` (iterator of byte blocks) to /predict/stream from a sender thread
+    and yield the NDJSON result lines as they arrive.
+    """
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    sock = socket.create_connection(("127.0.0.1", port))
+
+    def send() -> None:
+        sock.sendall((
+            "POST /predict/stream?output=ndjson HTTP/1.1\r\n"
+            f"Host: 127.0.0.1:{port}\r\nContent-Type: {content_type}\r\n"
+            "Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+        ).encode())
+        for block in body:
+            sock.sendall(b"%x\r\n%s\r\n" % (len(block), block))
+        sock.sendall(b"0\r\n\r\n")
+
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+    try:
+        yield from _read_chunked(sock)
+    finally:
+        sender.join()
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="output of `benchmarks.fixtures`")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--locations", type=int, default=50, help="location_ids present in the database")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir)
+    proc = start_server(f"sqlite:///{workdir / 'bench.db'}", str(workdir / "models"), args.port)
+    samples = []
+    done = threading.Event()
+
+    def sample() -> None:
+        while not done.wait(0.1):
+            samples.append(rss_mb(proc.pid))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    try:
+        idle_rss = rss_mb(proc.pid)
+        sampler.start()
+        started = time.perf_counter()
+        first_row = None
+        rows = errors = 0
+        for line in stream(args.port, args.format, generate(args.format, args.rows, args.locations)):
+            if not line.strip():
+                continue
+            if first_row is None:
+                first_row = time.perf_counter() - started
+            rows += 1
+            errors += "error" in json.loads(line)
+        elapsed = time.perf_counter() - started
+    finally:
+        done.set()
+        proc.terminate()
+        proc.wait()
+
+    print(json.dumps({
+        "rows": rows,
+        "errors": errors,
+        "format": args.format,
+        "time_to_first_row_ms": first_row * 1000 if first_row is not None else None,
+        "total_seconds": elapsed,
+        "rows_per_second": rows / elapsed,
+        "server_rss_idle_mb": idle_rss,
+        "server_rss_peak_mb": max(samples, default=idle_rss),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
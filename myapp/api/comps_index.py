@@ -0,0 +1,284 @@
+# backend/comps_index.py
+
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+from scipy.spatial import cKDTree
+
+from database.models import Location, Property
+
+# Features compared between listings, after z-scoring; renovation is ordinal
+COMPS_FEATURES = ["size_sqm", "rooms", "year_built", "renovation"]
+RENOVATION_RANK = {"Not Renovated": 0.0, "Partially Renovated": 1.0, "Newly Renovated": 2.0}
+
+# Listing fields returned with every comp
+COMPS_FIELDS = [
+    "property_id", "location_id", "type_id", "deal_type", "status", "size_sqm", "rooms",
+    "year_built", "renovation_status", "estimated_saleprice", "estimated_rentprice",
+]
+
+
+class _Partition:
+    """
+    Listings of one (district, type_id) with a KD-tree over their normalized features.
+    """
+
+    def __init__(self, points: np.ndarray, rows: List[dict]):
+        self.points = points
+        self.rows = rows
+        self.tree = cKDTree(points)
+
+
+class _Snapshot:
+    """
+    Everything a query reads, published as one object: the partitions, the ID
+    lookup into them and the normalization their KD-trees were built with. A
+    query that takes one snapshot never mixes statistics and trees of two loads.
+    """
+
+    def __init__(self, partitions: Dict[Tuple[str, int], _Partition], mean: np.ndarray, scale: np.ndarray):
+        self.partitions = partitions
+        self.mean = mean
+        self.scale = scale
+        self.by_id: Dict[int, Tuple[Tuple[str, int], int]] = {
+            row["property_id"]: (key, i)
+            for key, part in partitions.items()
+            for i, row in enumerate(part.rows)
+        }
+        self.max_id = max(self.by_id, default=0)
+
+
+class CompsIndex:
+    """
+    In-memory nearest-neighbour index of the `properties` table for comparable listings.
+
+    Listings are partitioned by (district, type_id) and each partition holds a
+    KD-tree over z-scored size, rooms, year built and renovation rank, so a
+    query searches only the listings that can be comps and costs O(log n).
+
+    The table is loaded whole at startup. The background refresh then only
+    fetches properties with an ID above the highest one loaded and rebuilds
+    the partitions they fall in; every `full_refresh_every` refreshes (and on
+    `refresh(full=True)`) the whole table is reloaded, which also picks up
+    edits, deletions and new normalization statistics. Like `LocationIndex`,
+    the last good index keeps being served when the database is unreachable.
+    """
+
+    def __init__(self, session_factory, refresh_interval: float, full_refresh_every: int = 60,
+                 min_refresh_gap: float = 5.0):
+        """
+        Args:
+            session_factory: Callable returning a SQLAlchemy session (e.g. `SessionLocal`).
+            refresh_interval (float): Seconds between incremental refreshes; 0 disables them.
+            full_refresh_every (int): Every this many periodic refreshes is a full reload.
+            min_refresh_gap (float): Minimum seconds between on-demand refreshes.
+        """
+        self._session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self.full_refresh_every = max(1, full_refresh_every)
+        self.min_refresh_gap = min_refresh_gap
+        self._snapshot = _Snapshot({}, np.zeros(len(COMPS_FEATURES)), np.ones(len(COMPS_FEATURES)))
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._refreshes = 0
+        self.loaded = False
+        self.last_refresh: Optional[float] = None
+        self.last_full_refresh: Optional[float] = None
+        self.last_attempt = 0.0
+        self.last_error: Optional[str] = None
+
+    @staticmethod
+    def _raw_features(rows: Sequence[dict]) -> np.ndarray:
+        X = np.array(
+            [
+                [
+                    row["size_sqm"], row["rooms"], row["year_built"],
+                    RENOVATION_RANK.get(row["renovation_status"]),
+                ]
+                for row in rows
+            ],
+            dtype=float,
+        ).reshape(len(rows), len(COMPS_FEATURES))
+        return X
+
+    @staticmethod
+    def _normalize(X: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        Z = (X - mean) / scale
+        # a missing value sits at the mean: it neither attracts nor repels
+        return np.where(np.isnan(Z), 0.0, Z)
+
+    def _fetch(self, min_id: int) -> List[dict]:
+        db = self._session_factory()
+        try:
+            query = (
+                db.query(*(getattr(Property, f) for f in COMPS_FIELDS), Location.district)
+                .join(Location, Property.location_id == Location.location_id)
+                .filter(Property.property_id > min_id)
+            )
+            return [dict(row._mapping) for row in query]
+        finally:
+            db.close()
+
+    def _build(self, groups: Dict[Tuple[str, int], List[dict]], mean: np.ndarray,
+               scale: np.ndarray) -> Dict[Tuple[str, int], _Partition]:
+        return {
+            key: _Partition(self._normalize(self._raw_features(rows), mean, scale), rows)
+            for key, rows in groups.items()
+        }
+
+    @staticmethod
+    def _group(rows: Sequence[dict]) -> Dict[Tuple[str, int], List[dict]]:
+        groups: Dict[Tuple[str, int], List[dict]] = {}
+        for row in rows:
+            groups.setdefault((row["district"], row["type_id"]), []).append(row)
+        return groups
+
+    @staticmethod
+    def _statistics(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per-feature mean and scale (standard deviation, 1 where it is 0 or undefined).
+        """
+        if not len(X):
+            return np.zeros(len(COMPS_FEATURES)), np.ones(len(COMPS_FEATURES))
+        mean = np.nanmean(X, axis=0)
+        std = np.nanstd(X, axis=0)
+        return np.where(np.isfinite(mean), mean, 0.0), np.where(np.isfinite(std) & (std > 0), std, 1.0)
+
+    def refresh(self, full: bool = False, blocking: bool = True) -> bool:
+        """
+        Load new listings (or, with `full` or before the first load, the whole table).
+
+        Args:
+            full (bool): Reload everything and recompute the normalization.
+            blocking (bool): If False and another refresh is already running,
+                return immediately instead of queueing behind it.
+
+        Returns:
+            bool: True if the index was refreshed, False if the query failed
+            (the previous index is kept) or a refresh was already running.
+        """
+        if not self._refresh_lock.acquire(blocking=blocking):
+            return False
+        try:
+            self.last_attempt = time.monotonic()
+            full = full or not self.loaded
+            current = self._snapshot
+            try:
+                rows = self._fetch(0 if full else current.max_id)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Comps index refresh failed, keeping {len(current.by_id)} listings: {e}")
+                return False
+
+            if full:
+                mean, scale = self._statistics(self._raw_features(rows))
+                self._snapshot = _Snapshot(self._build(self._group(rows), mean, scale), mean, scale)
+                self.last_full_refresh = time.time()
+            elif rows:
+                # rebuild only the partitions that received new listings, with the current statistics
+                partitions = dict(current.partitions)
+                for key, new_rows in self._group(rows).items():
+                    old = partitions.get(key)
+                    partitions[key] = self._build(
+                        {key: (old.rows if old else []) + new_rows}, current.mean, current.scale
+                    )[key]
+                self._snapshot = _Snapshot(partitions, current.mean, current.scale)
+                logger.info(f"Comps index added {len(rows)} listings")
+
+            self.loaded = True
+            self.last_refresh = time.time()
+            self.last_error = None
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def get(self, property_id: int, refresh_on_miss: bool = True) -> Optional[dict]:
+        """
+        An indexed listing by ID; unknown IDs trigger one rate-limited incremental refresh.
+        """
+        snapshot = self._snapshot
+        hit = snapshot.by_id.get(property_id)
+        if hit is None and refresh_on_miss and time.monotonic() - self.last_attempt >= self.min_refresh_gap:
+            self.refresh(blocking=False)
+            snapshot = self._snapshot
+            hit = snapshot.by_id.get(property_id)
+        if hit is None:
+            return None
+        key, i = hit
+        return snapshot.partitions[key].rows[i]
+
+    def query(self, listing: dict, k: int, exclude_id: Optional[int] = None) -> List[dict]:
+        """
+        The `k` listings closest to `listing` in its district (and type, if given).
+
+        Args:
+            listing (dict): `district`, `type_id` (may be None: any type) and the
+                `COMPS_FIELDS` used as features.
+            k (int): Number of comps.
+            exclude_id (int, optional): Listing to leave out (the subject itself).
+
+        Returns:
+            List[dict]: Comps nearest first, each with its `COMPS_FIELDS`,
+            `district` and `distance` (in standard deviations).
+        """
+        snapshot = self._snapshot
+        partitions = snapshot.partitions
+        if listing.get("type_id") is None:
+            keys = [key for key in partitions if key[0] == listing["district"]]
+        else:
+            keys = [(listing["district"], listing["type_id"])]
+        point = self._normalize(self._raw_features([listing]), snapshot.mean, snapshot.scale)[0]
+
+        found: List[Tuple[float, dict]] = []
+        for key in keys:
+            part = partitions.get(key)
+            if part is None:
+                continue
+            n = min(len(part.rows), k + (exclude_id is not None))
+            distances, idx = part.tree.query(point, k=n)
+            for d, i in zip(np.atleast_1d(distances), np.atleast_1d(idx)):
+                row = part.rows[i]
+                if row["property_id"] != exclude_id:
+                    found.append((float(d), row))
+        found.sort(key=lambda pair: pair[0])
+        return [{**row, "distance": d} for d, row in found[:k]]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self._refreshes += 1
+            self.refresh(full=self._refreshes % self.full_refresh_every == 0)
+
+    def start(self) -> None:
+        """
+        Load the table and start the periodic refresh thread.
+        """
+        self.refresh(full=True)
+        if self.refresh_interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="comps-index", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        partitions = snapshot.partitions
+        return {
+            "size": len(snapshot.by_id),
+            "partitions": len(partitions),
+            "largest_partition": max((len(p.rows) for p in partitions.values()), default=0),
+            "max_property_id": snapshot.max_id,
+            "loaded": self.loaded,
+            "last_refresh": self.last_refresh,
+            "last_full_refresh": self.last_full_refresh,
+            "last_error": self.last_error,
+            "refresh_interval_seconds": self.refresh_interval,
+        }
@@ -0,0 +1,212 @@
+# backend/cox_scorer.py
+
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class CoxScorer:
+    """
+    Closed-form scorer for a fitted lifelines `CoxPHFitter`.
+
+    Everything that does not depend on the request (coefficient vector,
+    normalization means, baseline cumulative hazard at the configured horizons)
+    is extracted once at load time, so scoring is a dot product and an `exp`:
+
+        P(sold by t) = 1 - S0(t) ** exp((x - mean) · β)
+                     = 1 - exp(-H0(t) * exp(x · β - mean · β))
+
+    Attributes:
+        features (List[str]): Covariate names, in the order of `params_`.
+        horizons (np.ndarray): Horizons (days) whose baseline hazard is precomputed.
+    """
+
+    def __init__(self, cox_model, categorical: Sequence[str], horizons: Iterable[float]):
+        """
+        Args:
+            cox_model: Fitted `lifelines.CoxPHFitter`.
+            categorical (Sequence[str]): Raw categorical columns that were one-hot
+                encoded as `<column>_<value>` before fitting.
+            horizons (Iterable[float]): Horizons (days) to precompute S0(t) for.
+        """
+        features = list(cox_model.params_.index)
+        beta = cox_model.params_.values.astype(float)
+        norm_mean = cox_model._norm_mean.reindex(features).values.astype(float)
+        baseline = cox_model.baseline_cumulative_hazard_
+        self._compile(
+            features=features,
+            beta=beta,
+            offset=float(norm_mean @ beta),
+            timeline=baseline.index.values.astype(float),
+            cum_hazard=baseline.values[:, 0].astype(float),
+            categorical=categorical,
+            horizons=horizons,
+        )
+
+    @classmethod
+    def from_arrays(cls, features: Sequence[str], arrays: Dict[str, np.ndarray],
+                    categorical: Sequence[str], horizons: Iterable[float]) -> "CoxScorer":
+        """
+        Rebuild a scorer from the output of `arrays()`, without lifelines.
+        """
+        scorer = cls.__new__(cls)
+        scorer._compile(
+            features=list(features),
+            beta=arrays["beta"],
+            offset=float(arrays["offset"]),
+            timeline=arrays["timeline"],
+            cum_hazard=arrays["cum_hazard"],
+            categorical=categorical,
+            horizons=horizons,
+        )
+        return scorer
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Everything needed to rebuild the scorer besides `features` (see `from_arrays`).
+        """
+        return {
+            "beta": self.beta,
+            "offset": np.asarray(self._offset),
+            "timeline": self._timeline,
+            "cum_hazard": self._cum_hazard,
+        }
+
+    def _compile(self, features, beta, offset, timeline, cum_hazard, categorical, horizons) -> None:
+        self.features: List[str] = features
+        self.beta = beta
+        self._offset = offset
+        self._timeline = timeline
+        self._cum_hazard = cum_hazard
+
+        self.horizons = np.asarray(list(horizons), dtype=float)
+        self._horizon_hazard = np.interp(self.horizons, self._timeline, self._cum_hazard)
+
+        # numeric covariates: column -> position; dummies: (column, value) -> position
+        self._numeric: Dict[str, int] = {}
+        self._dummies: Dict[tuple, int] = {}
+        for pos, name in enumerate(self.features):
+            for col in categorical:
+                if name.startswith(col + "_"):
+                    self._dummies[(col, name[len(col) + 1:])] = pos
+                    break
+            else:
+                self._numeric[name] = pos
+        self._categorical = list(categorical)
+
+        # covariate -> raw column (dummies summed into their categorical column)
+        self.raw_features: List[str] = list(self._numeric) + self._categorical
+        self._groups = np.zeros((len(self.features), len(self.raw_features)))
+        for name, pos in self._numeric.items():
+            self._groups[pos, self.raw_features.index(name)] = 1.0
+        for (col, _), pos in self._dummies.items():
+            self._groups[pos, self.raw_features.index(col)] = 1.0
+
+    def design_matrix(self, columns) -> np.ndarray:
+        """
+        Build the covariate matrix straight from raw columns, without `pd.get_dummies`.
+
+        Args:
+            columns: Mapping (dict or DataFrame) of raw column name -> values. Must
+                contain every numeric covariate and every categorical column.
+
+        Returns:
+            np.ndarray: (n_rows, n_features) matrix aligned with `features`.
+        """
+        first = self._categorical[0] if self._categorical else next(iter(self._numeric))
+        n = len(columns[first])
+        X = np.zeros((n, len(self.features)), dtype=float)
+        for name, pos in self._numeric.items():
+            X[:, pos] = np.asarray(columns[name], dtype=float)
+        for col in self._categorical:
+            for row, value in enumerate(columns[col]):
+                pos = self._dummies.get((col, value))
+                if pos is not None:
+                    X[row, pos] = 1.0
+        return X
+
+    def partial_hazard(self, X: np.ndarray) -> np.ndarray:
+        """
+        exp((x - mean) · β) for each row of an encoded covariate matrix.
+        """
+        return np.exp(X @ self.beta - self._offset)
+
+    def contributions(self, X: np.ndarray):
+        """
+        Linear contributions x_i·β_i to the log partial hazard, summed per raw column.
+
+        Args:
+            X (np.ndarray): Encoded covariates from `design_matrix`.
+
+        Returns:
+            tuple: (base, contributions) where `base` is -mean·β and `contributions`
+            has shape (n_rows, len(raw_features)); `base + contributions.sum(axis=1)`
+            is log `partial_hazard(X)`.
+        """
+        return -self._offset, (X * self.beta) @ self._groups
+
+    def prob_sold(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probability of sale by each precomputed horizon.
+
+        Args:
+            X (np.ndarray): Encoded covariates from `design_matrix`.
+
+        Returns:
+            np.ndarray: (n_rows, n_horizons) array of 1 - S(t | x).
+        """
+        return -np.expm1(-np.outer(self.partial_hazard(X), self._horizon_hazard))
+
+    def prob_sold_at(self, partial_hazard: np.ndarray, horizons: Sequence[float]) -> np.ndarray:
+        """
+        Probability of sale by arbitrary horizons: one baseline lookup for all
+        horizons, one outer product for all rows.
+
+        Args:
+            partial_hazard (np.ndarray): Output of `partial_hazard`, shape (n_rows,).
+            horizons (Sequence[float]): Horizons in days.
+
+        Returns:
+            np.ndarray: (n_rows, n_horizons) array of 1 - S(t | x).
+        """
+        hazard = np.interp(np.asarray(horizons, dtype=float), self._timeline, self._cum_hazard)
+        return -np.expm1(-np.outer(partial_hazard, hazard))
+
+    def median_time(self, partial_hazard: np.ndarray) -> np.ndarray:
+        """
+        Median time to sale, matching lifelines' `predict_median`: the first time
+        on the baseline timeline where S(t | x) <= 0.5, or +inf if never reached.
+
+        S(t | x) <= 0.5  <=>  H0(t) >= ln 2 / partial_hazard, and H0 is non-decreasing,
+        so this is a single `searchsorted` for all rows.
+
+        Args:
+            partial_hazard (np.ndarray): Output of `partial_hazard`, shape (n_rows,).
+
+        Returns:
+            np.ndarray: (n_rows,) median days to sale.
+        """
+        idx = np.searchsorted(self._cum_hazard, np.log(2.0) / partial_hazard, side="left")
+        reached = idx < len(self._timeline)
+        median = np.full(len(partial_hazard), np.inf)
+        median[reached] = self._timeline[idx[reached]]
+        return median
+
+
+def max_abs_difference(scorer: CoxScorer, cox_model, df_ready: pd.DataFrame) -> float:
+    """
+    Compare the closed-form scorer with lifelines on an already-encoded frame.
+
+    Args:
+        scorer (CoxScorer): Scorer built from `cox_model`.
+        cox_model: The fitted `CoxPHFitter` the scorer was compiled from.
+        df_ready (pd.DataFrame): Frame with exactly the model covariates as columns.
+
+    Returns:
+        float: Largest absolute difference in sale probability over rows and horizons.
+    """
+    surv = cox_model.predict_survival_function(df_ready, times=scorer.horizons)
+    expected = 1 - surv.values.T
+    actual = scorer.prob_sold(df_ready[scorer.features].to_numpy(dtype=float))
+    return float(np.max(np.abs(expected - actual)))
@@ -3,10 +3,11 @@ Database Configuration Module.
 
 This module sets up the SQLAlchemy database engine, session factory,
 and base declarative class for ORM models. It also provides a utility
-function to get a scoped database session.
+function to get a scoped database session, and its async counterparts
+used by the request handlers.
 
 Uses:
-    - SQLAlchemy for ORM.
+    - SQLAlchemy for ORM (asyncio extension for the async sessions).
     - dotenv for environment variable management.
 
 Environment:
@@ -16,9 +17,10 @@ Environment:
 import sqlalchemy as sql
 import sqlalchemy.ext.declarative as declarative
 import sqlalchemy.orm as orm
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from dotenv import load_dotenv
 import os
-from .engine import engine
+from .engine import async_engine, engine
 
 def get_db():
     """
@@ -36,6 +38,23 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Function to get an async database session.
+
+    Yields:
+        AsyncSession: SQLAlchemy async session instance.
+
+    Ensures the session is closed after use.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 Base = declarative.declarative_base()
 
-SessionLocal = orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+SessionLocal = orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# expire_on_commit=False: attributes of committed objects stay readable without
+# an implicit (and in async code, impossible) lazy reload
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
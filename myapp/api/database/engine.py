@@ -1,7 +1,164 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import time
+import uuid
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv(".env")
 DATABASE_URL = os.environ.get("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
\ No newline at end of file
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Connection pool, per API worker process. DB_POOL_SIZE connections are kept
+# open and up to DB_MAX_OVERFLOW more are opened under load; a request that
+# finds all of them busy waits DB_POOL_TIMEOUT seconds, then fails with 503.
+# DB_POOL_RECYCLE replaces connections older than that many seconds (-1: never)
+# and DB_POOL_PRE_PING tests each connection on checkout, so connections
+# dropped by the server or a proxy are replaced instead of failing a request.
+# The sync and the async engine (see below) each get a pool of this size.
+# ────────────────────────────────────────────────────────────────────────────────
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Server-side statement timeout (PostgreSQL; 0 disables it). Behind a
+# transaction-mode pooler (DB_POOLER=transaction, e.g. PgBouncer) a server
+# connection serves another client after every transaction, so session
+# settings would leak or be lost: the timeout is then set with `SET LOCAL` at
+# the start of each transaction instead of once per connection, and asyncpg
+# does not cache prepared statements.
+# ────────────────────────────────────────────────────────────────────────────────
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_POOLER = os.getenv("DB_POOLER", "none").lower()
+if DB_POOLER not in ("none", "transaction"):
+    raise ValueError(f"Unknown DB_POOLER {DB_POOLER!r}; expected 'none' or 'transaction'")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Async engine of the request handlers: DATABASE_URL with its async driver
+# (asyncpg for PostgreSQL, aiosqlite for SQLite), unless ASYNC_DATABASE_URL is set.
+# ────────────────────────────────────────────────────────────────────────────────
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+# PostgreSQL error code of a statement cancelled by `statement_timeout`
+QUERY_CANCELED = "57014"
+
+
+class _InstrumentedPool:
+    """
+    Records how long each checkout waited for a connection (including opening
+    a new one) and counts checkouts that timed out.
+    """
+    engine_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.count_db_timeout(self.engine_label, "pool")
+            raise
+        finally:
+            metrics.observe_pool_checkout(self.engine_label, time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    engine_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+
+def async_url(url):
+    """
+    `url` with the async driver of its backend.
+    """
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend!r} databases; set ASYNC_DATABASE_URL")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def _engine_kwargs(url, poolclass) -> dict:
+    kwargs = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # in-memory SQLite lives in one connection; keep SQLAlchemy's default pool
+        return kwargs
+    kwargs.update(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if url.get_backend_name() != "postgresql":
+        return kwargs
+    connect_args = {}
+    if url.get_driver_name() == "asyncpg":
+        if DB_STATEMENT_TIMEOUT_MS and DB_POOLER == "none":
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        if DB_POOLER == "transaction":
+            # prepared statements live on one server connection, which the pooler hands around
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+            )
+    elif DB_STATEMENT_TIMEOUT_MS and DB_POOLER == "none":
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    if connect_args:
+        kwargs["connect_args"] = connect_args
+    return kwargs
+
+
+def is_statement_timeout(error: exc.DBAPIError) -> bool:
+    return getattr(error.orig, "pgcode", None) == QUERY_CANCELED
+
+
+def instrument(engine, label: str) -> None:
+    """
+    Keep the pool occupancy gauges current, count statement timeouts, and
+    apply the statement timeout per transaction behind a transaction pooler.
+
+    Args:
+        engine: A sync `Engine` (for an `AsyncEngine`, its `sync_engine`).
+        label (str): Value of the metrics' `engine` label.
+    """
+    def update_gauges(returning: int) -> None:
+        pool = engine.pool  # replaced by `dispose()`
+        if isinstance(pool, QueuePool):
+            metrics.set_pool_occupancy(label, pool.checkedout() - returning, pool.checkedin() + returning, pool.size())
+
+    # "checkin" fires just before the connection is back in the pool
+    event.listen(engine, "checkout", lambda *_: update_gauges(0))
+    event.listen(engine, "checkin", lambda *_: update_gauges(1))
+
+    @event.listens_for(engine, "handle_error")
+    def count_statement_timeouts(context):
+        if isinstance(context.sqlalchemy_exception, exc.DBAPIError) and is_statement_timeout(context.sqlalchemy_exception):
+            metrics.count_db_timeout(label, "statement")
+
+    if DB_STATEMENT_TIMEOUT_MS and DB_POOLER == "transaction" and engine.dialect.name == "postgresql":
+        @event.listens_for(engine, "begin")
+        def set_local_statement_timeout(conn):
+            # straight on the DBAPI connection: the transaction is not registered yet
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+            finally:
+                cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs(make_url(DATABASE_URL), InstrumentedQueuePool))
+instrument(engine, "sync")
+
+_async_url = make_url(os.getenv("ASYNC_DATABASE_URL") or async_url(make_url(DATABASE_URL)))
+async_engine = create_async_engine(_async_url, **_engine_kwargs(_async_url, InstrumentedAsyncQueuePool))
+instrument(async_engine.sync_engine, "async")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Numeric, Date
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, Numeric, Date, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from .engine import engine
@@ -85,6 +85,8 @@ class Property(Base):
             type (PropertyType): Relationship to the PropertyType model.
             user (User): Relationship to the User who posted the property.
             location (Location): Relationship to the property's Location.
+            images (List[Image]): Images of the property (read-only).
+            predictions (List[Prediction]): Stored predictions of the property (read-only).
     """
     __tablename__ = "properties"
 
@@ -108,6 +110,21 @@ class Property(Base):
     type = relationship("PropertyType")
     user = relationship("User")
     location = relationship("Location")
+    # read-only collections for `/properties/{id}/full`; writes go through Image/Prediction
+    images = relationship("Image", viewonly=True, order_by="Image.image_id")
+    predictions = relationship("Prediction", viewonly=True, order_by="Prediction.prediction_id")
+
+    # Keyset pagination of `GET /properties` (see `listing.py`): one index per
+    # sort key, led by the equality filters dashboards always set and ending in
+    # the `property_id` tie-breaker, so a page is a single index range scan.
+    __table_args__ = (
+        Index("ix_properties_post_date", "post_date", "property_id"),
+        Index("ix_properties_deal_post_date", "deal_type", "post_date", "property_id"),
+        Index("ix_properties_location_deal_post_date", "location_id", "deal_type", "post_date", "property_id"),
+        Index("ix_properties_deal_size", "deal_type", "size_sqm", "property_id"),
+        Index("ix_properties_deal_saleprice", "deal_type", "estimated_saleprice", "property_id"),
+        Index("ix_properties_deal_rentprice", "deal_type", "estimated_rentprice", "property_id"),
+    )
 
 
 class Image(Base):
@@ -141,4 +158,58 @@ class Prediction(Base):
     property = relationship("Property")
 
 
+class ScoringJob(Base):
+    """
+        Represents an asynchronous batch-scoring job (see `jobs.py`).
+
+        Progress is committed once per scored chunk, together with the position
+        to resume from, so a job picked up again after a restart continues
+        after the last committed chunk.
+
+        Attributes:
+            job_id (str): Primary key (UUID hex).
+            status (str): queued, running, done, failed or cancelled.
+            source (str): What is scored: an uploaded file ("upload") or a filter over properties ("filter").
+            input_format (str): csv or ndjson, for uploads.
+            filters (dict): Property filter, for "filter" jobs.
+            sinks (list): Where results go: "file" and/or "predictions".
+            output_format (str): csv or ndjson, for the results file.
+            total_rows (int): Rows to score.
+            rows_done (int): Rows scored and committed (including rows that failed).
+            rows_failed (int): Committed rows that could not be scored.
+            chunks_done (int): Committed chunks.
+            cursor (int): Resume position: input bytes consumed (uploads) or the last property_id (filters).
+            output_bytes (int): Committed length of the results file.
+            model_version (str): Model version that scored the last chunk.
+            error (str): Why the job failed.
+            worker (str): Claim token of the worker running the job.
+            created_at, started_at, resumed_at, heartbeat_at, finished_at (float): Unix timestamps.
+            rows_at_resume (int): `rows_done` when the current run started (for throughput).
+    """
+    __tablename__ = "scoring_jobs"
+
+    job_id = Column(String, primary_key=True)
+    status = Column(String, nullable=False, index=True)
+    source = Column(String, nullable=False)
+    input_format = Column(String)
+    filters = Column(JSON)
+    sinks = Column(JSON, nullable=False)
+    output_format = Column(String)
+    total_rows = Column(Integer)
+    rows_done = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    cursor = Column(BigInteger, nullable=False, default=0)
+    output_bytes = Column(BigInteger, nullable=False, default=0)
+    model_version = Column(String)
+    error = Column(String)
+    worker = Column(String)
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float)
+    resumed_at = Column(Float)
+    heartbeat_at = Column(Float)
+    finished_at = Column(Float)
+    rows_at_resume = Column(Integer, nullable=False, default=0)
+
+
 # Base.metadata.drop_all(engine)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional, Union
 from datetime import date
 from decimal import Decimal
 
@@ -81,6 +81,12 @@ class PropertyBase(BaseModel):
         from_attributes= True
 
 
+class PropertyPage(BaseModel):
+    items: List[PropertyBase]
+    # pass as `cursor` to get the next page; None on the last page
+    next_cursor: Optional[str]
+
+
 class PropertyCreate(BaseModel):
     title: Optional[str] = None
     deal_type: Optional[str] = None
@@ -128,12 +134,25 @@ class PredictionCreate(BaseModel):
     prob_sold_within_5_months: float
 
 
+class PropertyFull(PropertyBase):
+    # everything needed to render one listing
+    type: Optional[PropertyTypeBase]
+    user: Optional[UserBase]
+    location: Optional[LocationBase]
+    images: List[ImageBase]
+    prediction: Optional[PredictionBase]
+
+
 class CoxPredictionBase(BaseModel):
     prob_sold_within_5_months: float
 
 class RentCoxPrediction(BaseModel):
     predicted_rent_price: float
     prob_sold_within_5_months: float
+    # only with ?quantiles=...; keys like "p10", "p50", "p90"
+    predicted_rent_price_quantiles: Optional[Dict[str, float]] = None
+    # "full" or "fallback" (see ?deadline_ms=)
+    scored_by: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -142,6 +161,146 @@ class RentCoxPrediction(BaseModel):
 class SaleCoxPrediction(BaseModel):
     predicted_sale_price: float
     prob_sold_within_5_months: float
+    predicted_sale_price_quantiles: Optional[Dict[str, float]] = None
+    scored_by: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BatchPrediction(BaseModel):
+    property_id: int
+    predicted_rent_price: float
+    predicted_sale_price: float
+    prob_sold_within_5_months: float
+    predicted_rent_price_quantiles: Optional[Dict[str, float]] = None
+    predicted_sale_price_quantiles: Optional[Dict[str, float]] = None
+    scored_by: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SurvivalCurveRequest(BaseModel):
+    properties: List[PropertyBase]
+    # explicit horizons in days, or a grid start..stop (inclusive) every step days
+    horizons: Optional[List[float]] = None
+    horizon_start: Optional[float] = None
+    horizon_stop: Optional[float] = None
+    horizon_step: Optional[float] = None
+
+
+class SurvivalCurvePrediction(BaseModel):
+    property_id: int
+    predicted_rent_price: float
+    predicted_sale_price: float
+    # None when the survival curve never drops to 0.5 within the model's timeline
+    median_days_to_sale: Optional[float]
+    prob_sold: List[float]
 
     class Config:
         from_attributes = True
+
+
+class SurvivalCurveResponse(BaseModel):
+    horizons: List[float]
+    predictions: List[SurvivalCurvePrediction]
+
+
+class WhatIfRequest(BaseModel):
+    base: PropertyBase
+    # model input to vary: size_sqm, rooms, floor, year_built, renovation_status or district
+    feature: str
+    # explicit values, or (numeric features only) a grid start..stop (inclusive) every step
+    values: Optional[List[Union[float, str]]] = None
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    step: Optional[float] = None
+
+
+class WhatIfPoint(BaseModel):
+    value: Union[float, str]
+    predicted_rent_price: float
+    predicted_sale_price: float
+    prob_sold_within_5_months: float
+
+
+class WhatIfResponse(BaseModel):
+    property_id: int
+    feature: str
+    points: List[WhatIfPoint]
+
+
+class FeatureContributions(BaseModel):
+    # prediction = base_value + sum(contributions); for the Cox model both are on
+    # the log partial hazard scale
+    base_value: float
+    prediction: float
+    contributions: Dict[str, float]
+
+
+class ExplainPrediction(BaseModel):
+    property_id: int
+    prob_sold_within_5_months: float
+    rent: FeatureContributions
+    sale: FeatureContributions
+    cox: FeatureContributions
+
+
+class Comp(BaseModel):
+    property_id: int
+    location_id: Optional[int]
+    district: Optional[str]
+    type_id: Optional[int]
+    deal_type: Optional[str]
+    status: Optional[str]
+    size_sqm: Optional[float]
+    rooms: Optional[int]
+    year_built: Optional[int]
+    renovation_status: Optional[str]
+    estimated_saleprice: Optional[int]
+    estimated_rentprice: Optional[int]
+    # Euclidean distance over z-scored size, rooms, year built and renovation rank
+    distance: float
+
+
+class CompsResponse(BaseModel):
+    property_id: int
+    comps: List[Comp]
+
+
+class PredictionWithComps(BaseModel):
+    prediction: BatchPrediction
+    comps: List[Comp]
+
+
+class JobFilter(BaseModel):
+    # properties to score: every given field must match (any of its values); empty = all
+    property_id: Optional[List[int]] = None
+    location_id: Optional[List[int]] = None
+    district: Optional[List[str]] = None
+    type_id: Optional[List[int]] = None
+    deal_type: Optional[List[str]] = None
+    status: Optional[List[str]] = None
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    source: str
+    sinks: List[str]
+    output_format: Optional[str]
+    total_rows: Optional[int]
+    rows_done: int
+    rows_failed: int
+    chunks_done: int
+    progress: Optional[float]
+    # rows per second and seconds left, measured since the job (re)started running
+    rows_per_second: Optional[float]
+    eta_seconds: Optional[float]
+    model_version: Optional[str]
+    error: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    result_url: Optional[str]
@@ -0,0 +1,110 @@
+# backend/deadline.py
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+class CostModel:
+    """
+    Running estimate of when a full-model call submitted now would return: the
+    model work already in flight ahead of it plus its own model time.
+
+    Model time is an exponentially weighted average per row-count bucket
+    (powers of two), fed with the stage timings of every full-model call,
+    including the warm-up batches. For a bucket without samples yet, the time
+    is scaled linearly from the nearest bucket that has one. The queue estimate
+    is the expected model time of the calls submitted but not finished, divided
+    by the `capacity` calls that run in parallel.
+    """
+
+    def __init__(self, capacity: int, alpha: float = 0.2):
+        """
+        Args:
+            capacity (int): Full-model calls that make progress at the same time
+                (inference workers in process mode, 1 inline: the GIL serializes them).
+            alpha (float): Weight of the newest sample in the averages.
+        """
+        self.capacity = max(1, capacity)
+        self.alpha = alpha
+        # bucket -> [average seconds, average rows]
+        self._buckets: Dict[int, list] = {}
+        self._outstanding = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, rows: int, seconds: float) -> None:
+        """
+        Record the model time of one full-model call over `rows` rows.
+        """
+        if rows <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(rows.bit_length())
+            if bucket is None:
+                self._buckets[rows.bit_length()] = [seconds, float(rows)]
+            else:
+                bucket[0] += self.alpha * (seconds - bucket[0])
+                bucket[1] += self.alpha * (rows - bucket[1])
+
+    def model_seconds(self, rows: int) -> Optional[float]:
+        """
+        Expected model time of a call over `rows` rows; None before any sample.
+        """
+        # `observe` may add a bucket meanwhile (batcher thread, threadpool)
+        with self._lock:
+            buckets = {b: tuple(v) for b, v in self._buckets.items()}
+        if not buckets:
+            return None
+        nearest = min(buckets, key=lambda b: abs(b - rows.bit_length()))
+        seconds, avg_rows = buckets[nearest]
+        return seconds * rows / avg_rows
+
+    def queue_seconds(self) -> float:
+        """
+        Expected wait before a call submitted now starts running.
+        """
+        return self._outstanding / self.capacity
+
+    def expected_seconds(self, rows: int) -> Optional[float]:
+        """
+        Queue wait plus model time for a call over `rows` rows; None before any sample.
+        """
+        model = self.model_seconds(rows)
+        return None if model is None else self.queue_seconds() + model
+
+    def enqueue(self, rows: int) -> float:
+        """
+        Count a full-model call as queued work until `dequeue` is called with the returned cost.
+        """
+        cost = self.model_seconds(rows) or 0.0
+        with self._lock:
+            self._outstanding += cost
+        return cost
+
+    def dequeue(self, cost: float) -> None:
+        with self._lock:
+            self._outstanding = max(0.0, self._outstanding - cost)
+
+    @contextmanager
+    def pending(self, rows: int) -> Iterator[None]:
+        """
+        Count a full-model call as queued work until the block exits.
+        """
+        cost = self.enqueue(rows)
+        try:
+            yield
+        finally:
+            self.dequeue(cost)
+
+    def stats(self) -> dict:
+        with self._lock:
+            buckets = [tuple(v) for v in self._buckets.values()]
+        return {
+            "capacity": self.capacity,
+            "queue_seconds": self.queue_seconds(),
+            "model_seconds": {
+                f"{int(round(avg_rows))}_rows": seconds for seconds, avg_rows in sorted(
+                    buckets, key=lambda b: b[1]
+                )
+            },
+        }
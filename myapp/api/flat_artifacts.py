@@ -0,0 +1,235 @@
+# backend/flat_artifacts.py
+
+"""
+Memory-mappable model artifacts.
+
+The `.pkl` artifacts are unpickled into private memory by every process that
+loads them. This format stores the flattened forests and the compiled Cox
+scorer as uncompressed `.npy` files, which are opened with `mmap_mode="r"`:
+all API workers on a host then share one page-cache copy of the node arrays.
+
+Layout of an artifact directory:
+
+    current.json              {"version": "<v>"}, replaced atomically on deploy
+    <v>/manifest.json         encoders, feature lists, array shapes
+    <v>/rent.<array>.npy      one file per `FlatForest.ARRAYS` entry
+    <v>/sale.<array>.npy
+    <v>/cox.<array>.npy       `CoxScorer.arrays()`
+
+Every version lives in its own directory and is never modified after it is
+published, so a process still mapping an older version keeps valid pages.
+
+Convert the pickles (from the `api/` directory):
+    $ python flat_artifacts.py models models/npy
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Sequence
+
+import numpy as np
+from loguru import logger
+
+from cox_scorer import CoxScorer
+from forest_engine import FlatForest, FlatPipeline, RecordEncoder
+
+CURRENT_FILE = "current.json"
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+
+PRICE_MODELS = ("rent", "sale")
+
+
+def read_current(artifact_dir: Path) -> str:
+    """
+    Version currently published in `artifact_dir`.
+
+    Raises:
+        FileNotFoundError: If nothing was published there yet.
+    """
+    with open(Path(artifact_dir) / CURRENT_FILE) as f:
+        return json.load(f)["version"]
+
+
+def _write_json(path: Path, payload: dict) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _probe_records(pipeline: FlatPipeline, n: int = 256, seed: int = 0):
+    """
+    Rows that exercise both sides of the split thresholds, for the parity check.
+    """
+    rng = np.random.default_rng(seed)
+    encoder, forest = pipeline.encoder, pipeline.forest
+    internal = np.isfinite(np.asarray(forest.threshold))
+    records = [{} for _ in range(n)]
+    for j, col in enumerate(encoder.numeric):
+        cuts = np.asarray(forest.threshold)[internal & (np.asarray(forest.feature) == j)]
+        low, high = (cuts.min() - 1, cuts.max() + 1) if len(cuts) else (0.0, 1.0)
+        for rec, value in zip(records, rng.uniform(low, high, n)):
+            rec[col] = float(value)
+    for col in encoder.categorical:
+        values = encoder.categories[col]
+        for rec, k in zip(records, rng.integers(0, len(values), n)):
+            rec[col] = values[k]
+    return records
+
+
+def write(artifact_dir: Path, version: str, rent_model, sales_model, cox_model,
+          categorical: Sequence[str], keep: int = 2) -> Path:
+    """
+    Flatten fitted models into a new version directory, verify it, and publish it.
+
+    Args:
+        artifact_dir (Path): Artifact directory (created if needed).
+        version (str): Version id, normally the content hash of the source `.pkl` set.
+        rent_model, sales_model: Fitted rent/sale `Pipeline`s.
+        cox_model: Fitted `CoxPHFitter`.
+        categorical (Sequence[str]): Raw categorical columns of the Cox model.
+        keep (int): Published versions to keep on disk, including the new one.
+
+    Returns:
+        Path: The published version directory.
+
+    Raises:
+        ValueError: If the memory-mapped copy does not reproduce the source models.
+    """
+    artifact_dir = Path(artifact_dir)
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    target = artifact_dir / version
+    if not (target / MANIFEST_FILE).exists():
+        tmp = artifact_dir / f".{version}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "version": version,
+            "created_at": time.time(),
+            "categorical": list(categorical),
+            "cox_features": list(cox_model.params_.index),
+        }
+        for name, pipeline in zip(PRICE_MODELS, (rent_model, sales_model)):
+            flat = FlatPipeline.from_pipeline(pipeline)
+            for array in FlatForest.ARRAYS:
+                np.save(tmp / f"{name}.{array}.npy", np.ascontiguousarray(getattr(flat.forest, array)))
+            manifest[name] = {
+                "features": list(pipeline.feature_names_in_),
+                "numeric": flat.encoder.numeric,
+                "categories": flat.encoder.categories,
+                "max_depth": flat.forest.max_depth,
+            }
+        for array, values in CoxScorer(cox_model, categorical, horizons=[]).arrays().items():
+            np.save(tmp / f"cox.{array}.npy", values)
+        _write_json(tmp / MANIFEST_FILE, manifest)
+
+        _verify(tmp, rent_model, sales_model, cox_model, categorical)
+        os.replace(tmp, target)
+
+    _write_json(artifact_dir / CURRENT_FILE, {"version": version})
+    _prune(artifact_dir, keep)
+    logger.info(f"Published memory-mappable artifacts {version} in {artifact_dir}")
+    return target
+
+
+def _verify(version_dir: Path, rent_model, sales_model, cox_model, categorical: Sequence[str]) -> None:
+    import pandas as pd
+    from cox_scorer import max_abs_difference
+
+    loaded = load(version_dir, categorical, horizons=[30, 150, 365])
+    for name, pipeline, flat in (
+        ("rent", rent_model, loaded["rent_flat"]),
+        ("sale", sales_model, loaded["sales_flat"]),
+    ):
+        records = _probe_records(flat)
+        expected = pipeline.predict(pd.DataFrame(records))
+        diff = float(np.max(np.abs(flat.predict(records) - expected) / np.maximum(np.abs(expected), 1e-12)))
+        if diff > 1e-9:
+            raise ValueError(f"{name} forest copy deviates from the pipeline by {diff:.3g}")
+
+    scorer = loaded["cox_scorer"]
+    probe = pd.DataFrame(
+        [cox_model._norm_mean + k * cox_model._norm_std for k in (-1, 0, 1)]
+    )[scorer.features]
+    diff = max_abs_difference(scorer, cox_model, probe)
+    if diff > 1e-9:
+        raise ValueError(f"Cox scorer copy deviates from lifelines by {diff:.3g}")
+
+
+def _prune(artifact_dir: Path, keep: int) -> None:
+    current = read_current(artifact_dir)
+    versions = sorted(
+        (p for p in artifact_dir.iterdir() if p.is_dir() and (p / MANIFEST_FILE).exists() and p.name != current),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in versions[max(keep - 1, 0):]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def load(version_dir: Path, categorical: Sequence[str], horizons: Sequence[float]) -> Dict:
+    """
+    Open one version directory with every array memory-mapped read-only.
+
+    Returns:
+        dict: `version`, `manifest`, `rent_flat`, `sales_flat`, `cox_scorer`.
+    """
+    version_dir = Path(version_dir)
+    with open(version_dir / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format')!r} in {version_dir}")
+
+    def mapped(name: str, array: str) -> np.ndarray:
+        return np.load(version_dir / f"{name}.{array}.npy", mmap_mode="r")
+
+    flats = {}
+    for name in PRICE_MODELS:
+        spec = manifest[name]
+        forest = FlatForest(max_depth=spec["max_depth"], **{a: mapped(name, a) for a in FlatForest.ARRAYS})
+        flats[name] = FlatPipeline(RecordEncoder(spec["numeric"], spec["categories"]), forest)
+
+    cox_arrays = {a: mapped("cox", a) for a in ("beta", "offset", "timeline", "cum_hazard")}
+    return {
+        "version": manifest["version"],
+        "manifest": manifest,
+        "rent_flat": flats["rent"],
+        "sales_flat": flats["sale"],
+        "cox_scorer": CoxScorer.from_arrays(manifest["cox_features"], cox_arrays, categorical, horizons),
+    }
+
+
+def main():
+    import joblib
+    from model_registry import COX_FILE, RENT_FILE, SALE_FILE, _content_version
+    from scoring import CATEGORICAL_FEATURES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("src", type=Path, help="directory with the three .pkl artifacts")
+    parser.add_argument("dst", type=Path, help="artifact directory to publish into")
+    parser.add_argument("--keep", type=int, default=2, help="published versions to keep on disk")
+    args = parser.parse_args()
+
+    target = write(
+        args.dst,
+        version=_content_version(args.src),
+        rent_model=joblib.load(args.src / RENT_FILE),
+        sales_model=joblib.load(args.src / SALE_FILE),
+        cox_model=joblib.load(args.src / COX_FILE),
+        categorical=CATEGORICAL_FEATURES,
+        keep=args.keep,
+    )
+    print(target)
+
+
+if __name__ == "__main__":
+    main()
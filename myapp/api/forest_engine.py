@@ -0,0 +1,362 @@
+# backend/forest_engine.py
+
+from typing import Dict, List, Mapping, Sequence
+
+import numpy as np
+
+
+class FlatForest:
+    """
+    A fitted `RandomForestRegressor` flattened into contiguous NumPy node arrays.
+
+    All trees are concatenated into one set of arrays so a batch of rows walks
+    every tree at once: each step of the loop advances all (row, tree) pairs by
+    one level, so the number of Python-level operations depends on the forest
+    depth only, not on the number of trees or rows.
+
+    Leaves point to themselves (threshold = +inf), so pairs that reached a leaf
+    early simply stay there until the deepest tree is done.
+
+    The arrays are used as given, so they may be read-only memory maps (see
+    `flat_artifacts.py`).
+    """
+
+    # arrays that make up a forest, as stored by `flat_artifacts.py`
+    ARRAYS = ("feature", "threshold", "children", "value", "missing_left", "roots")
+
+    def __init__(self, feature, threshold, children, value, missing_left, roots, max_depth):
+        """
+        Args:
+            children: Interleaved (right, left) child of every node, so one gather
+                picks the next node: `children[2 * node + go_left]`.
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.missing_left = missing_left
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+    @property
+    def left(self) -> np.ndarray:
+        return self.children[1::2]
+
+    @property
+    def right(self) -> np.ndarray:
+        return self.children[0::2]
+
+    @classmethod
+    def from_forest(cls, forest) -> "FlatForest":
+        """
+        Flatten the estimators of a fitted sklearn forest regressor.
+
+        Args:
+            forest: Fitted `RandomForestRegressor` (single output).
+
+        Returns:
+            FlatForest: Flattened copy of the forest.
+        """
+        features, thresholds, lefts, rights, values, missing, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for est in forest.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            idx = np.arange(offset, offset + n)
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, idx, tree.children_left + offset))
+            rights.append(np.where(is_leaf, idx, tree.children_right + offset))
+            values.append(tree.value[:, 0, 0])
+            missing.append(
+                np.asarray(getattr(tree, "missing_go_to_left", np.zeros(n)), dtype=bool)
+            )
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        left = np.concatenate(lefts).astype(np.intp)
+        right = np.concatenate(rights).astype(np.intp)
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.stack([right, left], axis=1).ravel(),
+            value=np.concatenate(values).astype(np.float64),
+            missing_left=np.concatenate(missing),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+        )
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def shallow(self, n_trees: int, max_depth: int) -> "FlatForest":
+        """
+        The first `n_trees` trees cut off at `max_depth`, sharing this forest's arrays.
+
+        A walk stopped early predicts the value of the node it stopped at (the mean
+        target of the training rows that reached it), so this is a coarser but
+        valid forest costing about `n_trees * max_depth / (self.n_trees * self.max_depth)`
+        of `predict`. Bootstrapped trees are exchangeable, so the first ones are as
+        good a sample as any.
+        """
+        return FlatForest(
+            self.feature, self.threshold, self.children, self.value, self.missing_left,
+            self.roots[:max(1, n_trees)], min(max_depth, self.max_depth),
+        )
+
+    def _prepare(self, X: np.ndarray):
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        row_base = (np.arange(X.shape[0]) * X.shape[1])[:, None]
+        node = np.repeat(self.roots[None, :], X.shape[0], axis=0)
+        return X.ravel(), row_base, bool(np.isnan(X).any()), node
+
+    def _branch(self, flat_x: np.ndarray, row_base: np.ndarray, has_nan: bool, node: np.ndarray) -> np.ndarray:
+        """
+        Slot in `children` of the child every (row, tree) pair moves to next.
+        """
+        x = flat_x[row_base + self.feature[node]]
+        go_left = x <= self.threshold[node]
+        if has_nan:
+            go_left = np.where(np.isnan(x), self.missing_left[node], go_left)
+        return 2 * node + go_left
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """
+        Index of the leaf reached in every tree for every row.
+
+        Args:
+            X (np.ndarray): (n_rows, n_features) encoded feature matrix.
+
+        Returns:
+            np.ndarray: (n_rows, n_trees) global node indices.
+        """
+        flat_x, row_base, has_nan, node = self._prepare(X)
+        for _ in range(self.max_depth):
+            node = self.children[self._branch(flat_x, row_base, has_nan, node)]
+        return node
+
+    @property
+    def child_delta(self) -> np.ndarray:
+        """
+        `value[child] - value[node]` for every slot of `children` (0 at leaves):
+        what taking that branch adds to the prediction. Built on first use and
+        kept, so memory-mapped forests that are never explained do not pay for it.
+        """
+        if getattr(self, "_child_delta", None) is None:
+            value = np.asarray(self.value, dtype=np.float64)
+            self._child_delta = value[np.asarray(self.children)] - np.repeat(value, 2)
+        return self._child_delta
+
+    def contributions(self, X: np.ndarray):
+        """
+        Path-based per-feature contributions: along the path of each row in each
+        tree, the change in node value at every split is credited to the split
+        feature, then averaged over trees. Vectorized over rows and trees like
+        `leaves`; `bias + contributions.sum(axis=1)` equals `predict(X)`.
+
+        Args:
+            X (np.ndarray): (n_rows, n_features) encoded feature matrix.
+
+        Returns:
+            tuple: (bias, contributions, prediction) — the mean root value of the
+            trees (the prediction before any split), an (n_rows, n_features) array,
+            and `predict(X)` from the same walk.
+        """
+        flat_x, row_base, has_nan, node = self._prepare(X)
+        n_rows, n_features = np.shape(X)
+        delta = self.child_delta
+        out_base = (np.arange(n_rows) * n_features)[:, None]
+        totals = np.zeros(n_rows * n_features)
+        for _ in range(self.max_depth):
+            slot = self._branch(flat_x, row_base, has_nan, node)
+            totals += np.bincount(
+                (out_base + self.feature[node]).ravel(), weights=delta[slot].ravel(), minlength=len(totals)
+            )
+            node = self.children[slot]
+        bias = float(np.mean(np.asarray(self.value)[self.roots]))
+        return bias, totals.reshape(n_rows, n_features) / self.n_trees, self.value[node].mean(axis=1)
+
+    def predict_per_tree(self, X: np.ndarray) -> np.ndarray:
+        """
+        Output of every tree for every row, shape (n_rows, n_trees).
+        """
+        return self.value[self.leaves(X)]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Forest prediction (mean over trees), matching `RandomForestRegressor.predict`.
+        """
+        return self.predict_per_tree(X).mean(axis=1)
+
+    def predict_quantiles(self, X: np.ndarray, quantiles: Sequence[float]):
+        """
+        Forest prediction plus quantiles of the per-tree outputs, from one walk
+        of all trees.
+
+        Args:
+            X (np.ndarray): (n_rows, n_features) encoded feature matrix.
+            quantiles (Sequence[float]): Quantiles in [0, 1].
+
+        Returns:
+            tuple: (mean, quantiles) with shapes (n_rows,) and (n_rows, n_quantiles).
+        """
+        per_tree = self.predict_per_tree(X)
+        return per_tree.mean(axis=1), np.quantile(per_tree, quantiles, axis=1).T
+
+
+class RecordEncoder:
+    """
+    Re-implementation of the training `ColumnTransformer` (numeric passthrough +
+    `OneHotEncoder(handle_unknown='ignore')`) that encodes plain dicts into the
+    float32 matrix the forest expects, without building a DataFrame.
+    """
+
+    def __init__(self, numeric: Sequence[str], categories: Dict[str, Sequence[str]]):
+        """
+        Args:
+            numeric (Sequence[str]): Passthrough columns, in output order.
+            categories (Dict[str, Sequence[str]]): Categorical column -> fitted
+                categories, in output order.
+        """
+        self.numeric = list(numeric)
+        self.categorical = list(categories)
+        self.n_features = len(self.numeric)
+        self._slots: Dict[str, Dict[str, int]] = {}
+        for col, values in categories.items():
+            self._slots[col] = {v: self.n_features + i for i, v in enumerate(values)}
+            self.n_features += len(values)
+
+    @property
+    def categories(self) -> Dict[str, List[str]]:
+        """
+        Fitted categories of every categorical column, in output order.
+        """
+        return {col: list(slots) for col, slots in self._slots.items()}
+
+    @property
+    def raw_features(self) -> List[str]:
+        """
+        Input columns, one per numeric and per categorical column.
+        """
+        return self.numeric + self.categorical
+
+    def group_matrix(self) -> np.ndarray:
+        """
+        (n_features, n_raw_features) 0/1 matrix summing encoded columns (the
+        one-hot slots of a categorical column) into their input column.
+        """
+        groups = np.zeros((self.n_features, len(self.raw_features)))
+        for j in range(len(self.numeric)):
+            groups[j, j] = 1.0
+        for k, col in enumerate(self.categorical, start=len(self.numeric)):
+            for slot in self._slots[col].values():
+                groups[slot, k] = 1.0
+        return groups
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "RecordEncoder":
+        """
+        Read the fitted column layout from the pipeline's `preprocessor` step.
+
+        Raises:
+            ValueError: If the preprocessor uses a transformer other than
+                'passthrough' or `OneHotEncoder`.
+        """
+        preprocessor = pipeline.named_steps["preprocessor"]
+        # fitted 'passthrough' steps become FunctionTransformers, so check the declared spec
+        declared = {name: spec for name, spec, _ in preprocessor.transformers}
+        numeric: List[str] = []
+        categories: Dict[str, Sequence[str]] = {}
+        for name, transformer, columns in preprocessor.transformers_:
+            spec = declared.get(name, transformer)
+            if isinstance(spec, str) and spec == "drop" or len(columns) == 0:
+                continue
+            if isinstance(spec, str) and spec == "passthrough":
+                numeric.extend(columns)
+            elif (
+                type(transformer).__name__ == "OneHotEncoder"
+                and transformer.handle_unknown == "ignore"
+                and transformer.drop is None
+            ):
+                for col, cats in zip(columns, transformer.categories_):
+                    categories[col] = list(cats)
+            else:
+                raise ValueError(f"Unsupported transformer {name!r} in preprocessor")
+        return cls(numeric, categories)
+
+    def encode(self, records: Sequence[Mapping]) -> np.ndarray:
+        """
+        Encode records (e.g. `PropertyBase.dict()` plus `district`) into a matrix.
+
+        Args:
+            records (Sequence[Mapping]): One mapping per row.
+
+        Returns:
+            np.ndarray: (n_rows, n_features) float32 matrix; missing numerics are NaN.
+        """
+        X = np.zeros((len(records), self.n_features), dtype=np.float32)
+        for i, rec in enumerate(records):
+            for j, col in enumerate(self.numeric):
+                value = rec.get(col)
+                X[i, j] = np.nan if value is None else value
+            for col in self.categorical:
+                slot = self._slots[col].get(rec.get(col))
+                if slot is not None:
+                    X[i, slot] = 1.0
+        return X
+
+
+class FlatPipeline:
+    """
+    Pandas-free stand-in for a fitted `Pipeline(preprocessor, RandomForestRegressor)`.
+    """
+
+    def __init__(self, encoder: RecordEncoder, forest: FlatForest):
+        self.encoder = encoder
+        self.forest = forest
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "FlatPipeline":
+        return cls(
+            RecordEncoder.from_pipeline(pipeline),
+            FlatForest.from_forest(pipeline.named_steps["regressor"]),
+        )
+
+    def shallow(self, n_trees: int, max_depth: int) -> "FlatPipeline":
+        """
+        Same encoder over `FlatForest.shallow` of the forest; copies no arrays.
+        """
+        return FlatPipeline(self.encoder, self.forest.shallow(n_trees, max_depth))
+
+    def predict(self, records: Sequence[Mapping]) -> np.ndarray:
+        """
+        Predict for a list of records, matching `Pipeline.predict` on the same rows.
+        """
+        return self.forest.predict(self.encoder.encode(records))
+
+    def predict_quantiles(self, records: Sequence[Mapping], quantiles: Sequence[float]):
+        """
+        `predict` plus quantiles of the per-tree outputs (see `FlatForest.predict_quantiles`).
+        """
+        return self.forest.predict_quantiles(self.encoder.encode(records), quantiles)
+
+    def explain(self, records: Sequence[Mapping]):
+        """
+        Per-input-column contributions to the prediction of each record (see
+        `FlatForest.contributions`); one-hot columns are summed into their
+        categorical column.
+
+        Returns:
+            tuple: (bias, contributions, prediction) with contributions of shape
+            (n_records, len(encoder.raw_features)).
+        """
+        if getattr(self, "_groups", None) is None:
+            self._groups = self.encoder.group_matrix()
+        bias, contributions, prediction = self.forest.contributions(self.encoder.encode(records))
+        return bias, contributions @ self._groups, prediction
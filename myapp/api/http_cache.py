@@ -0,0 +1,59 @@
+# backend/http_cache.py
+
+import hashlib
+import os
+from typing import Type
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+# ────────────────────────────────────────────────────────────────────────────────
+# HTTP caching of the read-only resources. Responses carry a strong ETag (hash
+# of the JSON body) and `Cache-Control: max-age=HTTP_CACHE_MAX_AGE`: clients
+# and the CDN reuse them that long, then revalidate with `If-None-Match` and get
+# an empty 304 when nothing changed. The rows carry no modification time, so
+# there is no `Last-Modified` (and `If-Modified-Since` is not answered).
+# 0 makes clients revalidate on every use.
+# ────────────────────────────────────────────────────────────────────────────────
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "60"))
+
+
+def etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def matches(if_none_match: str, tag: str) -> bool:
+    """
+    Whether an `If-None-Match` header matches `tag` (weak comparison, RFC 9110).
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in if_none_match.split(","))
+
+
+def cache_control(private: bool = False) -> str:
+    scope = "private" if private else "public"
+    return f"{scope}, max-age={HTTP_CACHE_MAX_AGE}" if HTTP_CACHE_MAX_AGE > 0 else f"{scope}, no-cache"
+
+
+def cached(request: Request, schema: Type[BaseModel], obj, private: bool = False) -> Response:
+    """
+    `obj` serialized as `schema`, with validators and caching headers; 304 if
+    the client's copy is current.
+
+    Args:
+        request (Request): The request, for its `If-None-Match`.
+        schema (Type[BaseModel]): The endpoint's response model.
+        obj: ORM row (or anything `schema` validates).
+        private (bool): Keep the response out of shared caches (CDN), e.g.
+            for personal data.
+
+    Returns:
+        Response: 200 with the JSON body, or 304 without one.
+    """
+    body = schema.model_validate(obj).model_dump_json().encode()
+    headers = {"ETag": etag(body), "Cache-Control": cache_control(private)}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
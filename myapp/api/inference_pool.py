@@ -0,0 +1,224 @@
+# backend/inference_pool.py
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from loguru import logger
+
+class PoolUnavailable(RuntimeError):
+    """
+    The pool could not score a call with the requested model version: its
+    workers are being replaced after one died, or the worker serves another
+    version. The caller scores in its own process instead.
+    """
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Worker-process side. Each worker loads its own copy of the models once, in
+# the pool initializer, and reloads only when asked to score a newer version.
+# ────────────────────────────────────────────────────────────────────────────────
+_worker_registry = None
+
+# A version the last reload did not find on disk (e.g. the API process still
+# serves the previous set) is not reloaded for again until this many seconds later.
+_RELOAD_RETRY_SECONDS = 5.0
+_missed_versions: dict = {}
+
+
+def _init_worker(model_dir: str, categorical: Sequence[str], horizons: Sequence[float], verify_cox: bool,
+                 artifact_format: str) -> None:
+    global _worker_registry
+    from model_registry import ModelRegistry
+
+    _worker_registry = ModelRegistry(
+        Path(model_dir), poll_interval=0, categorical=categorical,
+        horizons=horizons, verify_cox=verify_cox, artifact_format=artifact_format,
+    )
+    _worker_registry.reload()
+
+
+def _worker_version(delay: float = 0.0) -> tuple:
+    # the short sleep keeps a warm worker from taking every probe task
+    time.sleep(delay)
+    return os.getpid(), _worker_registry.current().version
+
+
+def _score_in_worker(version: str, fn: str, records: List[dict], kwargs: dict):
+    import scoring
+    from metrics import StageTimings
+
+    if _worker_registry.current().version != version:
+        if time.monotonic() - _missed_versions.get(version, float("-inf")) > _RELOAD_RETRY_SECONDS:
+            # the API process swapped to a new artifact set; follow it
+            _worker_registry.reload()
+            if _worker_registry.current().version != version:
+                _missed_versions[version] = time.monotonic()
+        served = _worker_registry.current().version
+        if served != version:
+            # the results would be cached under `version`
+            raise PoolUnavailable(f"Worker {os.getpid()} serves model version {served}, not {version}")
+    timings = StageTimings()
+    outputs = getattr(scoring, fn)(_worker_registry.current(), records, timings=timings, **kwargs)
+    return outputs, timings
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# API-process side
+# ────────────────────────────────────────────────────────────────────────────────
+class InferencePool:
+    """
+    Process pool that runs model inference outside the API process.
+
+    Workers are started with the `spawn` method (the API process runs
+    background threads, which do not survive `fork` safely) and each loads the
+    models once in its initializer. Only plain record dicts go to the workers
+    and only the result arrays come back, so the event loop and the CRUD
+    endpoints never compete with inference for the GIL.
+
+    If a worker dies, the pool is replaced by a background thread; until the new
+    workers are ready `running` is False and calls fail with `PoolUnavailable`.
+    """
+
+    def __init__(self, workers: int, model_dir: Path, categorical: Sequence[str],
+                 horizons: Sequence[float], verify_cox: bool, artifact_format: str = "pickle",
+                 on_timings: Optional[Callable[[str, int, dict], None]] = None):
+        """
+        Args:
+            workers (int): Number of worker processes.
+            model_dir (Path): Directory the workers load the artifacts from.
+            categorical (Sequence[str]): Raw categorical columns of the Cox model.
+            horizons (Sequence[float]): Horizons (days) precompiled into the Cox scorer.
+            verify_cox (bool): Passed on to each worker's `ModelRegistry`.
+            artifact_format (str): Passed on to each worker's `ModelRegistry`.
+            on_timings (Callable, optional): Called in the API process with the
+                function name, the number of records and the per-stage timings
+                of each worker call.
+        """
+        self.workers = workers
+        self.on_timings = on_timings
+        self._initargs = (str(model_dir), list(categorical), list(horizons), verify_cox, artifact_format)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # guards `_executor` and `_stopped` between callers, `stop` and the restart thread
+        self._lock = threading.Lock()
+        self._stopped = True
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def start(self) -> None:
+        """
+        Spawn the workers and wait until every one of them has loaded the models.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._stopped = False
+        executor = self._spawn()
+        with self._lock:
+            self._executor = executor
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopped = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _spawn(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+        try:
+            ready = {}
+            while len(ready) < self.workers:
+                ready.update(executor.map(_worker_version, [0.05] * self.workers))
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        logger.info(f"Inference pool ready: {len(ready)} workers serving {sorted(set(ready.values()))}")
+        return executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """
+        Replace `broken` in a background thread, once however many calls saw it fail.
+        """
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        logger.error("Inference pool broken, restarting workers")
+        broken.shutdown(wait=False, cancel_futures=True)
+        threading.Thread(target=self._replace, name="inference-pool-restart", daemon=True).start()
+
+    def _replace(self) -> None:
+        try:
+            executor = self._spawn()
+        except Exception as e:
+            # stays down: calls are scored in the API process and /readyz reports it
+            logger.exception(f"Inference pool restart failed: {e}")
+            return
+        with self._lock:
+            if not self._stopped:
+                self._executor = executor
+                return
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, bundle, records: List[dict], fn: str = "run_models", **kwargs) -> Future:
+        """
+        Score records in a worker with the same model version as `bundle`.
+
+        Args:
+            fn (str): Name of the scoring function in `scoring.py` to call.
+            **kwargs: Extra keyword arguments for `fn` (must be picklable).
+
+        Returns:
+            Future: Resolves to the output of `fn` for `records`; fails with
+            `PoolUnavailable` while the pool is down or being restarted.
+        """
+        outer: Future = Future()
+        executor = self._executor
+        if executor is None:
+            outer.set_exception(PoolUnavailable("Inference pool is not running"))
+            return outer
+        try:
+            inner = executor.submit(_score_in_worker, bundle.version, fn, records, kwargs)
+        except RuntimeError as e:
+            # a worker died (e.g. OOM-killed), or the pool was shut down meanwhile
+            if isinstance(e, BrokenProcessPool):
+                self._restart(executor)
+            outer.set_exception(PoolUnavailable(f"Inference pool unavailable: {e}"))
+            return outer
+
+        def _unwrap(done: Future) -> None:
+            try:
+                outputs, timings = done.result()
+            except BrokenProcessPool as e:
+                self._restart(executor)
+                outer.set_exception(PoolUnavailable(f"Inference worker died: {e}"))
+                return
+            except CancelledError:
+                outer.set_exception(PoolUnavailable("Inference pool shut down"))
+                return
+            except BaseException as e:
+                outer.set_exception(e)
+                return
+            if self.on_timings is not None:
+                self.on_timings(fn, len(records), timings)
+            outer.set_result(outputs)
+
+        inner.add_done_callback(_unwrap)
+        return outer
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 2) - 1)
@@ -0,0 +1,163 @@
+# backend/job_router.py
+
+import os
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
+
+import stream_scoring
+from database.database import SessionLocal
+from database.schema import JobFilter, JobStatus
+from jobs import JOB_SINKS, JobRunner
+from prediction_router import STREAM_MAX_LINE_BYTES, score_job_chunk
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Asynchronous scoring jobs: uploads and result files live under JOBS_DIR (a
+# volume shared by all API workers), state in the `scoring_jobs` table. Each
+# worker process runs JOB_WORKERS job threads; a running job whose heartbeat is
+# older than JOB_STALE_SECONDS is resumed by another worker.
+# ────────────────────────────────────────────────────────────────────────────────
+BASE_DIR = Path(__file__).resolve().parent
+JOBS_DIR = Path(os.getenv("JOBS_DIR", BASE_DIR / "jobs"))
+
+job_runner = JobRunner(
+    SessionLocal,
+    score_job_chunk,
+    JOBS_DIR,
+    workers=int(os.getenv("JOB_WORKERS", "1")),
+    chunk_rows=int(os.getenv("JOB_CHUNK_ROWS", "5000")),
+    poll_interval=float(os.getenv("JOB_POLL_SECONDS", "2")),
+    stale_after=float(os.getenv("JOB_STALE_SECONDS", "120")),
+)
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+def startup() -> None:
+    job_runner.start()
+
+
+def shutdown() -> None:
+    job_runner.stop()
+
+
+def _with_result_url(status: dict) -> dict:
+    done_with_file = status["status"] == "done" and "file" in status["sinks"]
+    return {**status, "result_url": f"/jobs/{status['job_id']}/result" if done_with_file else None}
+
+
+def _parse_sinks(raw: str):
+    sinks = sorted({s.strip() for s in raw.split(",") if s.strip()})
+    if not sinks or not set(sinks) <= set(JOB_SINKS):
+        raise HTTPException(status_code=400, detail=f"Invalid sinks {raw!r}; expected some of {JOB_SINKS}")
+    return sinks
+
+
+@router.post(
+    "/score",
+    response_model=JobStatus,
+    status_code=202,
+    summary="Queue a batch-scoring job",
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": JobFilter.model_json_schema()},
+                "text/csv": {"schema": {"type": "string"}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        },
+    },
+)
+async def submit_scoring_job(
+    request: Request,
+    sinks: str = Query("file", description="Where results go: file, predictions or file,predictions"),
+    output_format: Optional[str] = Query(None, alias="output", description="csv or ndjson (default: csv, or as the upload)"),
+):
+    """
+    Queues a scoring job and returns its ID right away.
+
+    The dataset is either a CSV or NDJSON upload (`Content-Type: text/csv` or
+    `application/x-ndjson`, same columns as `/predict/stream`), or, with a JSON
+    body, the properties matching a `JobFilter` (`{}` scores every property).
+    Background workers score it in chunks and write the results to a file
+    (`GET /jobs/{id}/result`) and/or the `predictions` table; `GET /jobs/{id}`
+    reports progress.
+
+    Returns:
+        JobStatus: The queued job.
+    """
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    sink_list = _parse_sinks(sinks)
+    job_id = job_runner.new_id()
+
+    if content_type == "application/json":
+        try:
+            filters = JobFilter.model_validate_json(await request.body()).model_dump(exclude_none=True)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+        source, input_format, total_rows = "filter", None, None
+    else:
+        input_format = stream_scoring.format_from_content_type(content_type)
+        if input_format is None:
+            raise HTTPException(
+                status_code=415, detail="Send a JSON filter, or a text/csv or application/x-ndjson upload"
+            )
+        try:
+            total_rows = await job_runner.spool_upload(
+                job_id, stream_scoring.iter_lines(request.stream(), STREAM_MAX_LINE_BYTES), input_format
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        source, filters = "upload", None
+
+    output_format = (output_format or input_format or "csv").lower()
+    if output_format not in stream_scoring.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown output format {output_format!r}")
+
+    status = await run_in_threadpool(
+        job_runner.create, job_id, source, sink_list, output_format,
+        input_format=input_format, filters=filters, total_rows=total_rows,
+    )
+    return _with_result_url(status)
+
+
+@router.get("/{job_id}", response_model=JobStatus, summary="Progress of a scoring job")
+def get_scoring_job(job_id: str):
+    """
+    Returns the job's status, rows done and failed, throughput and ETA.
+    """
+    status = job_runner.get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _with_result_url(status)
+
+
+@router.get("/{job_id}/result", summary="Results file of a finished scoring job")
+def get_scoring_job_result(job_id: str):
+    """
+    Downloads the results of a finished job with a `file` sink: one row per
+    input row, in input order, as in `/predict/stream`.
+    """
+    status = job_runner.get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    path = job_runner.result_path(job_id)
+    if path is None:
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']} and has no results file")
+    media_type = "text/csv" if status["output_format"] == "csv" else "application/x-ndjson"
+    return FileResponse(path, media_type=media_type, filename=f"{job_id}.{status['output_format']}")
+
+
+@router.delete("/{job_id}", response_model=JobStatus, summary="Cancel a scoring job")
+def cancel_scoring_job(job_id: str):
+    """
+    Cancels a queued or running job; rows already committed stay written.
+    """
+    status = job_runner.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _with_result_url(status)
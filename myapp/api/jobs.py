@@ -0,0 +1,615 @@
+# backend/jobs.py
+
+"""
+Asynchronous batch scoring (`POST /jobs/score`).
+
+A job scores either an uploaded CSV/NDJSON file, spooled to `jobs_dir` when it
+is submitted, or the properties matching a filter. Background worker threads
+score it in chunks and write the results to a file and/or the `predictions`
+table. The job's state lives in the `scoring_jobs` table. After every chunk,
+the results and the position to resume from are committed together. While a
+job runs, its worker heartbeats every `stale_after / 4` seconds, however long a
+chunk takes. A job whose worker stopped heartbeating for `stale_after` seconds
+(crash, restart, deploy) is claimed again by any worker and continues after its
+last committed chunk.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from sqlalchemy import and_, bindparam, func, or_
+from sqlalchemy.exc import IntegrityError
+
+import stream_scoring
+from database.models import Location, Prediction, Property, ScoringJob
+
+JOB_SOURCES = ("upload", "filter")
+JOB_SINKS = ("file", "predictions")
+ACTIVE_STATUSES = ("queued", "running")
+
+# filter field -> column it matches (see `JobFilter`)
+FILTER_COLUMNS = {
+    "property_id": Property.property_id,
+    "location_id": Property.location_id,
+    "district": Location.district,
+    "type_id": Property.type_id,
+    "deal_type": Property.deal_type,
+    "status": Property.status,
+}
+
+# properties columns read by "filter" jobs
+PROPERTY_INPUT_COLUMNS = ["property_id", *stream_scoring.REQUIRED_COLUMNS]
+
+# scores one chunk of parsed rows: (output rows as in `stream_scoring.OUTPUT_COLUMNS`, model version)
+ChunkScorer = Callable[[List[stream_scoring.ParsedRow]], Tuple[List[dict], str]]
+
+
+class JobRunner:
+    """
+    Submits scoring jobs and runs them on background threads.
+
+    Every API worker process runs `workers` threads. A thread claims the oldest
+    claimable job with a conditional UPDATE, so each job runs in one thread at a
+    time, across processes too. Each claim gets a new token. Progress commits
+    only succeed while the job still carries that token and is still running,
+    so a cancelled job, or one taken over after going stale, stops at its next
+    chunk.
+    """
+
+    def __init__(self, session_factory, score_chunk: ChunkScorer, jobs_dir: Path, workers: int = 1,
+                 chunk_rows: int = 5000, poll_interval: float = 2.0, stale_after: float = 120.0):
+        """
+        Args:
+            session_factory: Callable returning a SQLAlchemy session (e.g. `SessionLocal`).
+            score_chunk (ChunkScorer): Scores one chunk with the current models.
+            jobs_dir (Path): Where uploads and result files are kept, one directory per job.
+            workers (int): Job threads in this process; 0 only accepts jobs.
+            chunk_rows (int): Rows per chunk (and per commit).
+            poll_interval (float): Seconds an idle thread waits before looking for jobs again.
+            stale_after (float): Seconds without a heartbeat after which a running
+                job is considered orphaned and may be claimed again.
+        """
+        self._session_factory = session_factory
+        self._score_chunk = score_chunk
+        self.jobs_dir = Path(jobs_dir)
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running_jobs: set = set()
+
+    # — files —
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.jobs_dir / job_id
+
+    def input_path(self, job_id: str, fmt: str) -> Path:
+        return self.job_dir(job_id) / f"input.{fmt}"
+
+    def output_path(self, job_id: str, fmt: str) -> Path:
+        return self.job_dir(job_id) / f"results.{fmt}"
+
+    # — submission —
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    async def spool_upload(self, job_id: str, lines: AsyncIterator[str], fmt: str) -> int:
+        """
+        Write an upload to the job's input file, one normalized line per row.
+
+        Args:
+            job_id (str): Job the upload belongs to.
+            lines (AsyncIterator[str]): Lines of the request body (see `stream_scoring.iter_lines`).
+            fmt (str): "csv" or "ndjson".
+
+        Returns:
+            int: Number of data rows (the CSV header excluded).
+
+        Raises:
+            ValueError: If the CSV header lacks a required column or a line is too
+                long; the job directory is removed.
+        """
+        parser = stream_scoring.RowParser(fmt)
+        path = self.input_path(job_id, fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rows = 0
+        try:
+            with open(path, "w", encoding="utf-8", newline="\n") as f:
+                async for line in lines:
+                    if fmt == "csv" and parser.header is None:
+                        parser.parse(line)
+                    else:
+                        rows += 1
+                    f.write(line + "\n")
+        except BaseException:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+            raise
+        return rows
+
+    def create(self, job_id: str, source: str, sinks: Sequence[str], output_format: str,
+               input_format: Optional[str] = None, filters: Optional[dict] = None,
+               total_rows: Optional[int] = None) -> dict:
+        """
+        Queue a job (an upload must already be spooled under `job_id`).
+
+        Args:
+            job_id (str): From `new_id`.
+            source (str): "upload" or "filter".
+            sinks (Sequence[str]): "file" and/or "predictions".
+            output_format (str): Format of the results file.
+            input_format (str, optional): Format of the spooled upload.
+            filters (dict, optional): `JobFilter` fields, for "filter" jobs.
+            total_rows (int, optional): Rows of the upload; counted here for filters.
+
+        Returns:
+            dict: The job's status (see `get`).
+        """
+        if source not in JOB_SOURCES:
+            raise ValueError(f"Unknown job source {source!r}; expected one of {JOB_SOURCES}")
+        unknown = set(sinks) - set(JOB_SINKS)
+        if not sinks or unknown:
+            raise ValueError(f"Unknown job sinks {sorted(unknown)}; expected some of {JOB_SINKS}")
+        db = self._session_factory()
+        try:
+            if source == "filter":
+                total_rows = self._filter_query(db, filters or {}).count()
+            db.add(ScoringJob(
+                job_id=job_id,
+                status="queued",
+                source=source,
+                input_format=input_format,
+                filters=filters,
+                sinks=list(sinks),
+                output_format=output_format,
+                total_rows=total_rows,
+                rows_done=0,
+                rows_failed=0,
+                chunks_done=0,
+                cursor=0,
+                output_bytes=0,
+                rows_at_resume=0,
+                created_at=time.time(),
+            ))
+            db.commit()
+        finally:
+            db.close()
+        logger.info(f"Queued {source} job {job_id} ({total_rows} rows -> {', '.join(sinks)})")
+        self._wake.set()
+        return self.get(job_id)
+
+    # — status —
+
+    @staticmethod
+    def _status(job: ScoringJob) -> dict:
+        rows_per_second = eta = None
+        if job.status == "running" and job.resumed_at:
+            elapsed = (job.heartbeat_at or job.resumed_at) - job.resumed_at
+            scored = job.rows_done - job.rows_at_resume
+            if elapsed > 0 and scored > 0:
+                rows_per_second = scored / elapsed
+                if job.total_rows is not None:
+                    eta = max(job.total_rows - job.rows_done, 0) / rows_per_second
+        elif job.status == "done" and job.started_at and job.finished_at > job.started_at:
+            rows_per_second = job.rows_done / (job.finished_at - job.started_at)
+        progress = None
+        if job.total_rows:
+            progress = min(job.rows_done / job.total_rows, 1.0)
+        elif job.status == "done":
+            progress = 1.0
+        return {
+            "job_id": job.job_id,
+            "status": job.status,
+            "source": job.source,
+            "sinks": job.sinks,
+            "output_format": job.output_format,
+            "total_rows": job.total_rows,
+            "rows_done": job.rows_done,
+            "rows_failed": job.rows_failed,
+            "chunks_done": job.chunks_done,
+            "progress": progress,
+            "rows_per_second": rows_per_second,
+            "eta_seconds": eta,
+            "model_version": job.model_version,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Status, progress, throughput and ETA of a job; None if it does not exist.
+
+        Throughput is measured from the job's last (re)start to its last committed
+        chunk; the ETA extrapolates it over the remaining rows.
+        """
+        db = self._session_factory()
+        try:
+            job = db.get(ScoringJob, job_id)
+            return None if job is None else self._status(job)
+        finally:
+            db.close()
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Cancel a queued or running job; a running one stops before its next commit.
+        Finished jobs are left as they are.
+        """
+        db = self._session_factory()
+        try:
+            db.query(ScoringJob).filter(
+                ScoringJob.job_id == job_id, ScoringJob.status.in_(ACTIVE_STATUSES)
+            ).update({"status": "cancelled", "finished_at": time.time()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        return self.get(job_id)
+
+    def result_path(self, job_id: str) -> Optional[Path]:
+        """
+        The results file of a finished job with a "file" sink, else None.
+        """
+        db = self._session_factory()
+        try:
+            job = db.get(ScoringJob, job_id)
+            if job is None or job.status != "done" or "file" not in job.sinks:
+                return None
+            return self.output_path(job_id, job.output_format)
+        finally:
+            db.close()
+
+    # — inputs —
+
+    @staticmethod
+    def _filter_query(db, filters: dict):
+        query = db.query(*(getattr(Property, col) for col in PROPERTY_INPUT_COLUMNS))
+        if filters.get("district") is not None:
+            query = query.join(Location, Property.location_id == Location.location_id)
+        for field, values in filters.items():
+            if values is not None:
+                query = query.filter(FILTER_COLUMNS[field].in_(values))
+        return query
+
+    def _upload_chunks(self, job: ScoringJob) -> Iterator[Tuple[List[stream_scoring.ParsedRow], int]]:
+        """
+        (chunk, input byte offset after it) of the spooled upload, from `job.cursor` on.
+        """
+        parser = stream_scoring.RowParser(job.input_format)
+        with open(self.input_path(job.job_id, job.input_format), "rb") as f:
+            if job.input_format == "csv":
+                parser.parse(f.readline().decode("utf-8").rstrip("\n"))
+            if job.cursor:
+                f.seek(job.cursor)
+            parser.rows = job.rows_done
+            chunk = []
+            for line in f:
+                chunk.append(parser.parse(line.decode("utf-8").rstrip("\n")))
+                if len(chunk) >= self.chunk_rows:
+                    yield chunk, f.tell()
+                    chunk = []
+            if chunk:
+                yield chunk, f.tell()
+
+    def _filter_chunks(self, job: ScoringJob) -> Iterator[Tuple[List[stream_scoring.ParsedRow], int]]:
+        """
+        (chunk, last property_id in it) of the filtered properties, keyset-paginated
+        on property_id from `job.cursor` on.
+        """
+        cursor, row = job.cursor, job.rows_done
+        while True:
+            db = self._session_factory()
+            try:
+                batch = (
+                    self._filter_query(db, job.filters or {})
+                    .filter(Property.property_id > cursor)
+                    .order_by(Property.property_id)
+                    .limit(self.chunk_rows)
+                    .all()
+                )
+            finally:
+                db.close()
+            if not batch:
+                return
+            chunk = []
+            for prop in batch:
+                row += 1
+                raw = dict(prop._mapping)
+                try:
+                    chunk.append((row, stream_scoring.parse_record(raw), None))
+                except ValueError as e:
+                    # keep the property_id on the error row
+                    chunk.append((row, {"property_id": raw["property_id"]}, str(e)))
+            cursor = batch[-1].property_id
+            yield chunk, cursor
+
+    # — running —
+
+    def _claim(self) -> Optional[Tuple[str, str]]:
+        """
+        Claim the oldest queued (or orphaned running) job.
+
+        Returns:
+            tuple: (job_id, claim token), or None if there is nothing to run.
+        """
+        now = time.time()
+        claimable = or_(
+            ScoringJob.status == "queued",
+            and_(ScoringJob.status == "running", ScoringJob.heartbeat_at < now - self.stale_after),
+        )
+        db = self._session_factory()
+        try:
+            candidates = db.query(ScoringJob.job_id).filter(claimable).order_by(ScoringJob.created_at).limit(5).all()
+            for (job_id,) in candidates:
+                token = uuid.uuid4().hex
+                claimed = db.query(ScoringJob).filter(ScoringJob.job_id == job_id, claimable).update(
+                    {
+                        "status": "running",
+                        "worker": token,
+                        "started_at": func.coalesce(ScoringJob.started_at, now),
+                        "resumed_at": now,
+                        "heartbeat_at": now,
+                        "rows_at_resume": ScoringJob.rows_done,
+                    },
+                    synchronize_session=False,
+                )
+                db.commit()
+                if claimed:
+                    return job_id, token
+            return None
+        finally:
+            db.close()
+
+    def _open_output(self, job: ScoringJob):
+        """
+        The results file, cut back to its last committed length.
+        """
+        path = self.output_path(job.job_id, job.output_format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        out = open(path, "r+b" if path.exists() else "wb")
+        out.truncate(job.output_bytes)
+        out.seek(job.output_bytes)
+        if job.output_bytes == 0:
+            out.write(stream_scoring.format_header(job.output_format).encode())
+        return out
+
+    @staticmethod
+    def _write_predictions(db, job: ScoringJob, rows: List[dict]) -> None:
+        """
+        Upsert the chunk's scored rows into `predictions`, one row per property.
+
+        Prices are rounded to whole units like the training script's output. The
+        table may come from `to_sql` without an ID default, so new rows get IDs
+        after the current maximum.
+        """
+        scored = {r["property_id"]: r for r in rows if r.get("error") is None and r.get("property_id") is not None}
+        if scored and job.source == "upload":
+            # uploaded property_ids need not exist in `properties`
+            known = {pid for (pid,) in db.query(Property.property_id).filter(Property.property_id.in_(scored))}
+            scored = {pid: r for pid, r in scored.items() if pid in known}
+        if not scored:
+            return
+        values = {
+            pid: {
+                "predicted_sell_price": int(round(r["predicted_sale_price"])),
+                "predicted_rent_price": int(round(r["predicted_rent_price"])),
+                "prob_sold_within_5_months": r["prob_sold_within_5_months"],
+            }
+            for pid, r in scored.items()
+        }
+        table = Prediction.__table__
+        existing = {
+            pid for (pid,) in db.query(Prediction.property_id).filter(Prediction.property_id.in_(values))
+        }
+        if existing:
+            db.execute(
+                table.update()
+                .where(table.c.property_id == bindparam("pid"))
+                .values({col: bindparam(col) for col in next(iter(values.values()))}),
+                [{"pid": pid, **values[pid]} for pid in existing],
+            )
+        new = [pid for pid in values if pid not in existing]
+        if new:
+            next_id = (db.query(func.max(Prediction.prediction_id)).scalar() or 0) + 1
+            db.execute(
+                table.insert(),
+                [{"prediction_id": next_id + i, "property_id": pid, **values[pid]} for i, pid in enumerate(new)],
+            )
+
+    def _commit(self, job: ScoringJob, token: str, rows: List[dict], cursor: int, output_bytes: int,
+                version: str, attempts: int = 3) -> bool:
+        """
+        Commit one chunk: its predictions rows and the job's progress, in one transaction.
+
+        Returns:
+            bool: False if the job was cancelled or claimed by another worker meanwhile
+            (nothing is committed).
+        """
+        failed = sum(1 for r in rows if r.get("error") is not None)
+        for attempt in range(attempts):
+            db = self._session_factory()
+            try:
+                if "predictions" in job.sinks:
+                    self._write_predictions(db, job, rows)
+                updated = db.query(ScoringJob).filter(
+                    ScoringJob.job_id == job.job_id, ScoringJob.worker == token, ScoringJob.status == "running"
+                ).update(
+                    {
+                        "rows_done": ScoringJob.rows_done + len(rows),
+                        "rows_failed": ScoringJob.rows_failed + failed,
+                        "chunks_done": ScoringJob.chunks_done + 1,
+                        "cursor": cursor,
+                        "output_bytes": output_bytes,
+                        "model_version": version,
+                        "heartbeat_at": time.time(),
+                    },
+                    synchronize_session=False,
+                )
+                if not updated:
+                    db.rollback()
+                    return False
+                db.commit()
+                return True
+            except IntegrityError:
+                # another job took the same new prediction_ids first
+                db.rollback()
+                if attempt == attempts - 1:
+                    raise
+            finally:
+                db.close()
+
+    def _finish(self, job_id: str, token: str, status: str, error: Optional[str] = None) -> None:
+        """
+        Move a job this worker holds to `status` ("queued" hands it back for another worker).
+        """
+        db = self._session_factory()
+        try:
+            db.query(ScoringJob).filter(
+                ScoringJob.job_id == job_id, ScoringJob.worker == token, ScoringJob.status == "running"
+            ).update(
+                {"status": status, "error": error, "finished_at": None if status == "queued" else time.time()},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _heartbeat(self, job_id: str, token: str) -> bool:
+        """
+        Refresh the heartbeat of a job this worker holds.
+
+        Returns:
+            bool: False if the job was cancelled or claimed by another worker meanwhile.
+        """
+        db = self._session_factory()
+        try:
+            updated = db.query(ScoringJob).filter(
+                ScoringJob.job_id == job_id, ScoringJob.worker == token, ScoringJob.status == "running"
+            ).update({"heartbeat_at": time.time()}, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def _keep_alive(self, job_id: str, token: str, finished: threading.Event) -> None:
+        """
+        Heartbeat a running job until `finished` is set, so a chunk that scores for
+        longer than `stale_after` is not taken for orphaned and claimed again.
+        """
+        while not finished.wait(self.stale_after / 4):
+            try:
+                if not self._heartbeat(job_id, token):
+                    # cancelled or taken over; the next commit finds out and stops
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat of job {job_id} failed: {e}")
+
+    def _run(self, job_id: str, token: str) -> None:
+        db = self._session_factory()
+        try:
+            job = db.get(ScoringJob, job_id)
+            db.expunge(job)
+        finally:
+            db.close()
+        if job.chunks_done:
+            logger.info(f"Resuming job {job_id} after chunk {job.chunks_done} ({job.rows_done}/{job.total_rows} rows)")
+
+        finished = threading.Event()
+        threading.Thread(
+            target=self._keep_alive, args=(job_id, token, finished),
+            name=f"{threading.current_thread().name}-heartbeat", daemon=True,
+        ).start()
+        out = None
+        try:
+            if "file" in job.sinks:
+                out = self._open_output(job)
+            chunks = self._upload_chunks(job) if job.source == "upload" else self._filter_chunks(job)
+            for chunk, cursor in chunks:
+                if self._stop.is_set():
+                    self._finish(job_id, token, "queued")
+                    logger.info(f"Job {job_id} released at chunk {job.chunks_done} for shutdown")
+                    return
+                rows, version = self._score_chunk(chunk)
+                output_bytes = 0
+                if out is not None:
+                    out.write(stream_scoring.format_rows(job.output_format, rows).encode())
+                    out.flush()
+                    os.fsync(out.fileno())
+                    output_bytes = out.tell()
+                if not self._commit(job, token, rows, cursor, output_bytes, version):
+                    logger.info(f"Job {job_id} was cancelled or taken over, stopping")
+                    return
+                job.chunks_done += 1
+            if out is not None:
+                out.close()
+                out = None
+            self._finish(job_id, token, "done")
+            logger.info(f"Job {job_id} done")
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed: {e}")
+            try:
+                self._finish(job_id, token, "failed", str(e))
+            except Exception as db_error:
+                # left "running": it goes stale and is resumed
+                logger.warning(f"Could not mark job {job_id} failed: {db_error}")
+        finally:
+            finished.set()
+            if out is not None:
+                out.close()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                logger.warning(f"Job claim failed: {e}")
+                claimed = None
+            if claimed is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._running_jobs.add(claimed[0])
+            try:
+                self._run(*claimed)
+            finally:
+                self._running_jobs.discard(claimed[0])
+
+    def start(self) -> None:
+        """
+        Start the job threads; orphaned jobs are resumed once they go stale.
+        """
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._stop.clear()
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._loop, name=f"scoring-job-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """
+        Stop the job threads. A running job is handed back to the queue after its
+        current chunk; if that takes too long it is resumed once it goes stale.
+        """
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._threads),
+            "running_jobs": sorted(self._running_jobs),
+            "chunk_rows": self.chunk_rows,
+            "stale_after_seconds": self.stale_after,
+        }
@@ -0,0 +1,88 @@
+# backend/launcher.py
+
+"""
+Pre-fork server entry point.
+
+The master process imports `main` (and with it `prediction_router`, which
+loads the model artifacts) once, then forks `WEB_CONCURRENCY` uvicorn
+workers. The workers share the master's model memory copy-on-write; `gc.freeze()`
+before forking keeps the garbage collector from touching (and so copying)
+those pages. Each worker runs the app lifespan, which starts the background
+services and scores a warm-up batch before the worker accepts connections;
+`/readyz` reports the result.
+
+Usage (from the `api/` directory):
+    $ WEB_CONCURRENCY=4 python launcher.py
+"""
+
+import gc
+import os
+import shutil
+import tempfile
+
+from loguru import logger
+
+# Must be set before prometheus_client is imported anywhere (see metrics.render)
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+else:
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+
+
+def _when_ready(server) -> None:
+    # everything imported so far is long-lived; keep it out of GC passes in the workers
+    gc.freeze()
+    logger.info(f"Models loaded in master {os.getpid()}, forking {server.cfg.workers} workers")
+
+
+def _post_fork(server, worker) -> None:
+    # connections opened by the master (create_all at import) must not be shared
+    from database.engine import async_engine, engine
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
+def _child_exit(server, worker) -> None:
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+class Launcher(BaseApplication):
+    """
+    gunicorn application that preloads `main:app` in the master.
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+        return app
+
+
+def options_from_env() -> dict:
+    return {
+        "bind": f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}",
+        "workers": int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+        "worker_class": "uvicorn_worker.UvicornWorker",
+        "preload_app": True,
+        # model load + warm-up happen before a worker answers its first heartbeat
+        "timeout": int(os.getenv("WEB_TIMEOUT", "120")),
+        "graceful_timeout": int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30")),
+        "keepalive": 5,
+        "when_ready": _when_ready,
+        "post_fork": _post_fork,
+        "child_exit": _child_exit,
+    }
+
+
+if __name__ == "__main__":
+    Launcher(options_from_env()).run()
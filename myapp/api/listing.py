@@ -0,0 +1,190 @@
+# backend/listing.py
+
+import base64
+import binascii
+import json
+import os
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Location, Property
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Page sizes of `GET /properties`
+# ────────────────────────────────────────────────────────────────────────────────
+PROPERTIES_DEFAULT_LIMIT = int(os.getenv("PROPERTIES_DEFAULT_LIMIT", "50"))
+PROPERTIES_MAX_LIMIT = int(os.getenv("PROPERTIES_MAX_LIMIT", "500"))
+
+# Sort keys of `GET /properties`; a leading "-" sorts descending and
+# `property_id` breaks ties. Each has a matching `(deal_type, <key>,
+# property_id)` index on `properties` (see `database.models.Property`); the
+# default order also has one without `deal_type` and one led by `location_id`.
+SORT_COLUMNS = {
+    "post_date": Property.post_date,
+    "size_sqm": Property.size_sqm,
+    "estimated_saleprice": Property.estimated_saleprice,
+    "estimated_rentprice": Property.estimated_rentprice,
+}
+DEFAULT_SORT = "-post_date"
+
+
+class InvalidCursor(ValueError):
+    """
+    A `cursor` that was not returned by the same listing query.
+    """
+
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    """
+    Split a sort parameter into (column key, descending).
+
+    Raises:
+        ValueError: Unknown sort key.
+    """
+    key, descending = (sort[1:], True) if sort.startswith("-") else (sort, False)
+    if key not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort {sort!r}; expected one of {sorted(SORT_COLUMNS)}, optionally prefixed with '-'")
+    return key, descending
+
+
+def encode_cursor(sort: str, value, property_id: int) -> str:
+    """
+    Opaque cursor pointing just after the row with sort value `value` and `property_id`.
+    """
+    if isinstance(value, date):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, property_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str):
+    """
+    (sort value, property_id) of a cursor made by `encode_cursor` for `sort`.
+
+    Raises:
+        InvalidCursor: Malformed cursor, or one issued for another sort order.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, property_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if cursor_sort != sort or not isinstance(property_id, int):
+        raise InvalidCursor("Cursor does not belong to this sort order")
+    if SORT_COLUMNS[parse_sort(sort)[0]] is Property.post_date:
+        try:
+            value = date.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise InvalidCursor("Malformed cursor")
+    elif not isinstance(value, (int, float)):
+        raise InvalidCursor("Malformed cursor")
+    return value, property_id
+
+
+def listing_statement(
+    limit: int,
+    sort: str = DEFAULT_SORT,
+    cursor: Optional[str] = None,
+    location_id: Optional[List[int]] = None,
+    district: Optional[List[str]] = None,
+    deal_type: Optional[str] = None,
+    type_id: Optional[List[int]] = None,
+    renovation_status: Optional[List[str]] = None,
+    min_size_sqm: Optional[float] = None,
+    max_size_sqm: Optional[float] = None,
+    min_sale_price: Optional[int] = None,
+    max_sale_price: Optional[int] = None,
+    min_rent_price: Optional[int] = None,
+    max_rent_price: Optional[int] = None,
+    posted_after: Optional[date] = None,
+    posted_before: Optional[date] = None,
+) -> Select:
+    """
+    Query of one page of properties matching every given filter, in `sort`
+    order, plus one row telling whether another page follows (see `page`).
+
+    Keyset pagination: the page starts strictly after the `(sort value,
+    property_id)` encoded in `cursor`, so with the matching index the database
+    seeks straight to it and reads `limit + 1` rows, whatever the page depth.
+    Rows whose sort value is NULL are not listed for that sort.
+
+    Args:
+        limit (int): Page size.
+        sort (str): Sort key from `SORT_COLUMNS`, "-" prefixed for descending.
+        cursor (str): `next_cursor` of the previous page; None for the first page.
+        location_id, district, type_id, renovation_status: Match any of the values.
+        deal_type (str): "Sale" or "Rent".
+        min_*/max_*: Inclusive bounds on size and estimated prices.
+        posted_after, posted_before (date): Inclusive `post_date` window.
+
+    Returns:
+        Select: Statement selecting `Property` rows.
+
+    Raises:
+        ValueError: Unknown sort key.
+        InvalidCursor: Cursor issued for another sort order, or malformed.
+    """
+    key, descending = parse_sort(sort)
+    column = SORT_COLUMNS[key]
+    query = select(Property).where(column.isnot(None))
+
+    if location_id:
+        query = query.where(Property.location_id.in_(location_id))
+    if district:
+        # resolved to location_ids in the database: for the post_date sort, the
+        # planner reads one range of `ix_properties_location_deal_post_date` per
+        # location and merges and sorts them, not a single ordered index scan
+        # (slower for large districts)
+        query = query.where(Property.location_id.in_(
+            select(Location.location_id).where(Location.district.in_(district))
+        ))
+    if deal_type is not None:
+        query = query.where(Property.deal_type == deal_type)
+    if type_id:
+        query = query.where(Property.type_id.in_(type_id))
+    if renovation_status:
+        query = query.where(Property.renovation_status.in_(renovation_status))
+    for col, low, high in (
+        (Property.size_sqm, min_size_sqm, max_size_sqm),
+        (Property.estimated_saleprice, min_sale_price, max_sale_price),
+        (Property.estimated_rentprice, min_rent_price, max_rent_price),
+        (Property.post_date, posted_after, posted_before),
+    ):
+        if low is not None:
+            query = query.where(col >= low)
+        if high is not None:
+            query = query.where(col <= high)
+
+    keyset = tuple_(column, Property.property_id)
+    if cursor is not None:
+        after = tuple_(*decode_cursor(cursor, sort))
+        query = query.where(keyset < after if descending else keyset > after)
+    if descending:
+        query = query.order_by(column.desc(), Property.property_id.desc())
+    else:
+        query = query.order_by(column.asc(), Property.property_id.asc())
+
+    return query.limit(limit + 1)
+
+
+def page(rows: List[Property], limit: int, sort: str = DEFAULT_SORT) -> Tuple[List[Property], Optional[str]]:
+    """
+    Split the rows of a `listing_statement` into (page, next_cursor); `next_cursor` is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(sort, getattr(last, parse_sort(sort)[0]), last.property_id)
+
+
+async def list_properties(
+    db: AsyncSession, limit: int, sort: str = DEFAULT_SORT, cursor: Optional[str] = None, **filters
+) -> Tuple[List[Property], Optional[str]]:
+    """
+    One page of properties and the cursor of the next one; see `listing_statement`.
+    """
+    rows = (await db.scalars(listing_statement(limit, sort, cursor, **filters))).all()
+    return page(list(rows), limit, sort)
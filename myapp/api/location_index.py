@@ -0,0 +1,165 @@
+# backend/location_index.py
+
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from loguru import logger
+from sqlalchemy import select
+
+from database.models import Location
+
+
+class LocationIndex:
+    """
+    In-memory `location_id -> district` map, so predictions do not need a DB query.
+
+    The `locations` table is small and rarely changes, so it is loaded whole at
+    startup and refreshed by a background thread. A lookup for an unknown ID
+    triggers an on-demand refresh (rate limited), which picks up newly added
+    locations without waiting for the next periodic refresh. When the database
+    is slow or unreachable the last successfully loaded map keeps being served.
+    """
+
+    def __init__(self, session_factory, refresh_interval: float, min_refresh_gap: float = 5.0,
+                 async_session_factory=None):
+        """
+        Args:
+            session_factory: Callable returning a SQLAlchemy session (e.g. `SessionLocal`).
+            refresh_interval (float): Seconds between periodic refreshes; 0 disables them.
+            min_refresh_gap (float): Minimum seconds between on-demand refreshes.
+            async_session_factory: Callable returning an `AsyncSession` (e.g.
+                `AsyncSessionLocal`), used by `lookup_async`.
+        """
+        self._session_factory = session_factory
+        self._async_session_factory = async_session_factory
+        self.refresh_interval = refresh_interval
+        self.min_refresh_gap = min_refresh_gap
+        self._districts: Dict[int, str] = {}
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.loaded = False
+        self.last_refresh: Optional[float] = None
+        self.last_attempt = 0.0
+        self.last_error: Optional[str] = None
+
+    def refresh(self, blocking: bool = True) -> bool:
+        """
+        Reload the whole table and swap the map in one assignment.
+
+        Args:
+            blocking (bool): If False and another refresh is already running,
+                return immediately instead of queueing behind it.
+
+        Returns:
+            bool: True if the map was reloaded, False if the query failed
+            (the previous map is kept) or a refresh was already running.
+        """
+        if not self._refresh_lock.acquire(blocking=blocking):
+            return False
+        try:
+            self.last_attempt = time.monotonic()
+            db = None
+            try:
+                db = self._session_factory()
+                rows = db.query(Location.location_id, Location.district).all()
+            except Exception as e:
+                return self._failed(e)
+            finally:
+                if db is not None:
+                    db.close()
+            return self._swap(rows)
+        finally:
+            self._refresh_lock.release()
+
+    async def refresh_async(self) -> bool:
+        """
+        `refresh(blocking=False)` through the async session factory, awaited on
+        the event loop instead of holding a thread.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            self.last_attempt = time.monotonic()
+            try:
+                async with self._async_session_factory() as db:
+                    rows = (await db.execute(select(Location.location_id, Location.district))).all()
+            except Exception as e:
+                return self._failed(e)
+            return self._swap(rows)
+        finally:
+            self._refresh_lock.release()
+
+    def _swap(self, rows) -> bool:
+        self._districts = {location_id: district for location_id, district in rows}
+        self.loaded = True
+        self.last_refresh = time.time()
+        self.last_error = None
+        return True
+
+    def _failed(self, error: Exception) -> bool:
+        self.last_error = str(error)
+        logger.warning(f"Location index refresh failed, keeping {len(self._districts)} cached rows: {error}")
+        return False
+
+    def lookup(self, location_ids: Iterable[int], refresh_on_miss: bool = True) -> Dict[int, str]:
+        """
+        Resolve location IDs to districts from memory.
+
+        Unknown IDs trigger one on-demand refresh unless one ran within
+        `min_refresh_gap` seconds.
+
+        Args:
+            location_ids (Iterable[int]): IDs to resolve (duplicates allowed).
+            refresh_on_miss (bool): If False, never query the database, only read memory.
+
+        Returns:
+            Dict[int, str]: Mapping for the IDs that exist; unknown IDs are absent.
+        """
+        wanted = set(location_ids)
+        districts = self._districts
+        if refresh_on_miss and not wanted <= districts.keys():
+            if time.monotonic() - self.last_attempt >= self.min_refresh_gap:
+                self.refresh(blocking=False)
+                districts = self._districts
+        return {i: districts[i] for i in wanted if i in districts}
+
+    async def lookup_async(self, location_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        `lookup` whose on-demand refresh is an async query (see `refresh_async`).
+        """
+        wanted = set(location_ids)
+        if not wanted <= self._districts.keys() and time.monotonic() - self.last_attempt >= self.min_refresh_gap:
+            await self.refresh_async()
+        districts = self._districts
+        return {i: districts[i] for i in wanted if i in districts}
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def start(self) -> None:
+        """
+        Load the table and start the periodic refresh thread.
+        """
+        self.refresh()
+        if self.refresh_interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="location-index", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._districts),
+            "loaded": self.loaded,
+            "last_refresh": self.last_refresh,
+            "last_error": self.last_error,
+            "refresh_interval_seconds": self.refresh_interval,
+        }
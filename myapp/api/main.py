@@ -1,131 +1,354 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from contextlib import asynccontextmanager
+
+from datetime import date
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse
+from loguru import logger
+from sqlalchemy import exc as db_errors, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from typing import List, Optional
 
 # Database dependencies
-from database.database import get_db
+from database.database import get_async_db
 from database.models import User, Location, PropertyType, Property, Image, Prediction
-from database.schema import UserBase, PropertyBase, PropertyTypeBase, LocationBase, ImageBase
+from database.schema import UserBase, PropertyBase, PropertyTypeBase, LocationBase, ImageBase, PredictionBase, CompsResponse, PropertyPage, PropertyFull
+import http_cache
+import listing
 
 # ML Prediction Router
+import metrics
+import prediction_router as prediction
 from prediction_router import router as prediction_router
+import job_router as jobs
 
 # SQLAlchemy setup
-from database.engine import engine
+from database.engine import async_engine, engine, is_statement_timeout
 from database.models import Base
 
 # Automatically create tables in the database (if not exist)
 Base.metadata.create_all(bind=engine)
 
+# create_all skips tables that already exist (e.g. created by the ETL), indexes included
+for index in Property.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start background services on startup and stop them on shutdown.
+    """
+    prediction.startup()
+    jobs.startup()
+    yield
+    jobs.shutdown()
+    prediction.shutdown()
+    await async_engine.dispose()
+
+
 # Initialize FastAPI app with metadata for Swagger UI
 app = FastAPI(
     title="Marketing-Analytics API",
     description="CRUD operations + House Price Prediction (Rent/Sale/Survival)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Register the ML prediction router (prefix: /predict)
 app.include_router(prediction_router)
 
+# Register the asynchronous scoring job router (prefix: /jobs)
+app.include_router(jobs.router)
+
+
+@app.exception_handler(db_errors.TimeoutError)
+async def pool_timeout_handler(request: Request, error: db_errors.TimeoutError):
+    """
+    Every pooled DB connection stayed busy for DB_POOL_TIMEOUT: ask the client to retry.
+    """
+    return JSONResponse(status_code=503, content={"detail": "Database busy, retry later"}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(db_errors.DBAPIError)
+async def statement_timeout_handler(request: Request, error: db_errors.DBAPIError):
+    """
+    A query ran longer than DB_STATEMENT_TIMEOUT_MS and was cancelled by the server;
+    any other database error is logged and answered with a plain 500.
+    """
+    if not is_statement_timeout(error):
+        # re-raising here would surface as an error inside the exception handler
+        logger.opt(exception=error).error(f"Database error on {request.method} {request.url.path}")
+        return JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+    return JSONResponse(status_code=504, content={"detail": "Database query timed out"})
+
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """
+    Liveness probe: the worker's event loop is responsive.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz(response: Response):
+    """
+    Readiness probe: 200 once models are loaded and warmed up and the location
+    index is loaded, 503 (with the failing checks) otherwise.
+    """
+    checks = prediction.readiness()
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, **checks}
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, request counters
+    and in-flight gauges of the prediction path.
+    """
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 # ------------------- USER -------------------
 
 @app.get("/users/{user_id}", response_model=UserBase)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Get user information by user ID.
     
     Args:
         user_id (int): ID of the user.
-        db (Session): SQLAlchemy DB session.
+        db (AsyncSession): SQLAlchemy async DB session.
 
     Returns:
         UserBase: Pydantic model with user details.
     """
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return http_cache.cached(request, UserBase, user, private=True)
 
 # ------------------- LOCATION -------------------
 
 @app.get("/locations/{location_id}", response_model=LocationBase)
-def get_location(location_id: int, db: Session = Depends(get_db)):
+async def get_location(location_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Get location details by location ID.
     
     Args:
         location_id (int): ID of the location.
-        db (Session): SQLAlchemy DB session.
+        db (AsyncSession): SQLAlchemy async DB session.
 
     Returns:
         LocationBase: Pydantic model with location data.
     """
-    loc = db.query(Location).filter(Location.location_id == location_id).first()
+    loc = await db.get(Location, location_id)
     if not loc:
         raise HTTPException(status_code=404, detail="Location not found")
-    return loc
+    return http_cache.cached(request, LocationBase, loc)
 
 # ------------------- PROPERTY TYPE -------------------
 
 @app.get("/property_types/{type_id}", response_model=PropertyTypeBase)
-def get_property_type(type_id: int, db: Session = Depends(get_db)):
+async def get_property_type(type_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve property details by ID.
 
     Args:
         property_id (int): ID of the property.
-        db (Session): SQLAlchemy DB session.
+        db (AsyncSession): SQLAlchemy async DB session.
 
     Returns:
         PropertyBase: Property details.
     """
-    pt = db.query(PropertyType).filter(PropertyType.type_id == type_id).first()
+    pt = await db.get(PropertyType, type_id)
     if not pt:
         raise HTTPException(status_code=404, detail="Property type not found")
-    return pt
+    return http_cache.cached(request, PropertyTypeBase, pt)
 
 # ------------------- PROPERTY -------------------
 
+@app.get("/properties", response_model=PropertyPage)
+async def list_properties(
+    location_id: Optional[List[int]] = Query(None, description="Any of these locations"),
+    district: Optional[List[str]] = Query(None, description="Any of these districts"),
+    deal_type: Optional[str] = Query(None, description="Sale or Rent"),
+    type_id: Optional[List[int]] = Query(None),
+    renovation_status: Optional[List[str]] = Query(None),
+    min_size_sqm: Optional[float] = Query(None),
+    max_size_sqm: Optional[float] = Query(None),
+    min_sale_price: Optional[int] = Query(None, description="Bounds on estimated_saleprice"),
+    max_sale_price: Optional[int] = Query(None),
+    min_rent_price: Optional[int] = Query(None, description="Bounds on estimated_rentprice"),
+    max_rent_price: Optional[int] = Query(None),
+    posted_after: Optional[date] = Query(None, description="post_date on or after"),
+    posted_before: Optional[date] = Query(None, description="post_date on or before"),
+    sort: str = Query(listing.DEFAULT_SORT, description=f"One of {sorted(listing.SORT_COLUMNS)}; '-' prefix for descending"),
+    limit: int = Query(listing.PROPERTIES_DEFAULT_LIMIT, ge=1, le=listing.PROPERTIES_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    List properties matching all given filters, one page at a time.
+
+    Pages are keyset-paginated: follow `next_cursor` (with the same filters and
+    sort) until it is null. Every page costs the same as the first, and rows
+    inserted meanwhile do not shift the pages.
+
+    Returns:
+        PropertyPage: The page's properties and the cursor of the next page.
+    """
+    try:
+        items, next_cursor = await listing.list_properties(
+            db, limit, sort, cursor,
+            location_id=location_id, district=district, deal_type=deal_type, type_id=type_id,
+            renovation_status=renovation_status, min_size_sqm=min_size_sqm, max_size_sqm=max_size_sqm,
+            min_sale_price=min_sale_price, max_sale_price=max_sale_price,
+            min_rent_price=min_rent_price, max_rent_price=max_rent_price,
+            posted_after=posted_after, posted_before=posted_before,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+# Everything `/properties/{id}/full` returns, in three queries whatever the number
+# of properties: one with the many-to-one relationships joined in, then one
+# `IN (...)` query each for images and predictions.
+FULL_PROPERTY_OPTIONS = (
+    joinedload(Property.type),
+    joinedload(Property.user),
+    joinedload(Property.location),
+    selectinload(Property.images),
+    selectinload(Property.predictions),
+)
+
+
+def _full_property(prop: Property) -> dict:
+    return {
+        **PropertyBase.model_validate(prop).model_dump(),
+        "type": prop.type,
+        "user": prop.user,
+        "location": prop.location,
+        "images": prop.images,
+        # same row as `/prediction/` (the oldest when there are several)
+        "prediction": prop.predictions[0] if prop.predictions else None,
+    }
+
+
+@app.get("/properties/full", response_model=List[PropertyFull])
+async def get_properties_full(
+    property_id: List[int] = Query(..., max_length=listing.PROPERTIES_MAX_LIMIT, description="Repeat for each property"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Batch variant of `/properties/{property_id}/full`.
+
+    Args:
+        property_id (List[int]): Properties to load.
+        db (AsyncSession): SQLAlchemy async DB session.
+
+    Returns:
+        List[PropertyFull]: In request order; unknown IDs are left out.
+    """
+    ids = list(dict.fromkeys(property_id))
+    props = (await db.scalars(
+        select(Property).options(*FULL_PROPERTY_OPTIONS).where(Property.property_id.in_(ids))
+    )).all()
+    by_id = {prop.property_id: prop for prop in props}
+    return [_full_property(by_id[pid]) for pid in ids if pid in by_id]
+
+
+@app.get("/properties/{property_id}/full", response_model=PropertyFull)
+async def get_property_full(property_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    A property with its type, owner, location, images and stored prediction,
+    i.e. everything needed to render the listing, in one call.
+
+    Args:
+        property_id (int): ID of the property.
+        db (AsyncSession): SQLAlchemy async DB session.
+
+    Returns:
+        PropertyFull: The property and its related records.
+    """
+    prop = await db.get(Property, property_id, options=FULL_PROPERTY_OPTIONS)
+    if not prop:
+        raise HTTPException(status_code=404, detail="Property not found")
+    return _full_property(prop)
+
+
 @app.get("/properties/{property_id}", response_model=PropertyBase)
-def get_property(property_id: int, db: Session = Depends(get_db)):
+async def get_property(property_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve a saved prediction for a property.
 
     Args:
         property_id (int): Property ID to retrieve prediction for.
-        db (Session): SQLAlchemy DB session.
+        db (AsyncSession): SQLAlchemy async DB session.
 
     Returns:
         dict: Prediction record (schema not enforced here).
     """
-    prop = db.query(Property).filter(Property.property_id == property_id).first()
+    prop = await db.get(Property, property_id)
     if not prop:
         raise HTTPException(status_code=404, detail="Property not found")
-    return prop
+    return http_cache.cached(request, PropertyBase, prop)
+
+# Plain `def` (threadpool), unlike its neighbours: a miss in the comps index runs
+# its incremental refresh, a blocking query on the sync engine, in the request.
+@app.get("/properties/{property_id}/comps", response_model=CompsResponse)
+def get_property_comps(property_id: int, k: int = Query(prediction.COMPS_DEFAULT_K)):
+    """
+    The `k` listings most comparable to a property: same district and type,
+    nearest in size, rooms, year built and renovation.
+
+    Served from the in-memory comps index; a property added since the last
+    refresh triggers an incremental refresh.
+
+    Args:
+        property_id (int): Property to find comps for.
+        k (int): Number of comps.
+
+    Returns:
+        CompsResponse: Comps nearest first, with their estimated prices.
+    """
+    prediction.check_comps_k(k)
+    subject = prediction.comps_index.get(property_id)
+    if subject is None:
+        if not prediction.comps_index.loaded:
+            raise HTTPException(status_code=503, detail="Comps index not loaded yet")
+        raise HTTPException(status_code=404, detail="Property not found")
+    return {"property_id": property_id, "comps": prediction.comps_index.query(subject, k, exclude_id=property_id)}
 
-@app.get("/prediction/")
-def get_prediction(property_id: int, db: Session = Depends(get_db)):
+@app.get("/prediction/", response_model=PredictionBase)
+async def get_prediction(property_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve an image record by its ID.
 
     Args:
         image_id (int): ID of the image.
-        db (Session): SQLAlchemy DB session.
+        db (AsyncSession): SQLAlchemy async DB session.
 
     Returns:
         ImageBase: Image metadata and storage reference.
     """
-    prop = db.query(Prediction).filter(Prediction.property_id == property_id).first()
+    prop = (await db.scalars(
+        select(Prediction).where(Prediction.property_id == property_id).order_by(Prediction.prediction_id).limit(1)
+    )).first()
     if not prop:
         raise HTTPException(status_code=404, detail="Prediction not found")
-    return prop
+    return http_cache.cached(request, PredictionBase, prop)
 
 # ------------------- IMAGE -------------------
 
 @app.get("/images/{image_id}", response_model=ImageBase)
-def get_image(image_id: int, db: Session = Depends(get_db)):
-    img = db.query(Image).filter(Image.image_id == image_id).first()
+async def get_image(image_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    img = await db.get(Image, image_id)
     if not img:
         raise HTTPException(status_code=404, detail="Image not found")
-    return img
\ No newline at end of file
+    return http_cache.cached(request, ImageBase, img)
\ No newline at end of file
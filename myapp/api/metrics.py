@@ -0,0 +1,189 @@
+# backend/metrics.py
+
+"""
+Prometheus instrumentation of the prediction path and the database pool.
+
+Model stages may run in another process (see `inference_pool.py`), so they
+are not observed where they run: `run_models` fills a `StageTimings` and the
+API process calls `observe_stages` with it once the result is back.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from fastapi import HTTPException
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Sub-millisecond resolution: single-row stages take tens of microseconds
+STAGE_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+STAGE_SECONDS = Histogram(
+    "prediction_stage_seconds",
+    "Time spent in one stage of the prediction path.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "prediction_request_seconds",
+    "End-to-end handler time of prediction requests.",
+    ["endpoint"],
+    buckets=STAGE_BUCKETS,
+)
+REQUESTS_TOTAL = Counter(
+    "prediction_requests_total",
+    "Prediction requests by endpoint and response status.",
+    ["endpoint", "status"],
+)
+IN_PROGRESS = Gauge(
+    "prediction_requests_in_progress",
+    "Prediction requests currently being handled.",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+ROWS_TOTAL = Counter(
+    "prediction_rows_total",
+    "Scored rows by where the result came from (cache, model or fallback).",
+    ["source"],
+)
+
+# Checkouts wait up to DB_POOL_TIMEOUT (30 s by default)
+POOL_CHECKOUT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# `engine` label: "sync" (threadpool handlers, background threads) or "async"
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time a request waited for a pooled database connection (including connecting).",
+    ["engine"],
+    buckets=POOL_CHECKOUT_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Open pooled database connections by state (checked_out or idle).",
+    ["engine", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured pool size (connections kept open, overflow excluded).",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_TIMEOUTS_TOTAL = Counter(
+    "db_timeouts_total",
+    "Pool checkouts that gave up waiting (pool) and statements cancelled by the server (statement).",
+    ["engine", "kind"],
+)
+
+
+class StageTimings(dict):
+    """
+    `stage name -> seconds` collected while scoring one batch; picklable, so
+    it can travel back from a worker process with the results.
+    """
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[name] = self.get(name, 0.0) + time.perf_counter() - start
+
+
+def observe_stages(timings: Optional[Dict[str, float]]) -> None:
+    if METRICS_ENABLED and timings:
+        for name, seconds in timings.items():
+            STAGE_SECONDS.labels(name).observe(seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a block of the API process directly into `prediction_stage_seconds`.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def count_rows(cached: int = 0, scored: int = 0, fallback: int = 0) -> None:
+    if METRICS_ENABLED:
+        if cached:
+            ROWS_TOTAL.labels("cache").inc(cached)
+        if scored:
+            ROWS_TOTAL.labels("model").inc(scored)
+        if fallback:
+            ROWS_TOTAL.labels("fallback").inc(fallback)
+
+
+def observe_pool_checkout(engine: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        DB_POOL_CHECKOUT_SECONDS.labels(engine).observe(seconds)
+
+
+def set_pool_occupancy(engine: str, checked_out: int, idle: int, size: int) -> None:
+    if METRICS_ENABLED:
+        DB_POOL_CONNECTIONS.labels(engine, "checked_out").set(checked_out)
+        DB_POOL_CONNECTIONS.labels(engine, "idle").set(idle)
+        DB_POOL_SIZE.labels(engine).set(size)
+
+
+def count_db_timeout(engine: str, kind: str) -> None:
+    if METRICS_ENABLED:
+        DB_TIMEOUTS_TOTAL.labels(engine, kind).inc()
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[None]:
+    """
+    Count a prediction request, its status and duration, and keep the in-flight gauge.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    status = "200"
+    start = time.perf_counter()
+    IN_PROGRESS.labels(endpoint).inc()
+    try:
+        yield
+    except HTTPException as e:
+        status = str(e.status_code)
+        raise
+    except Exception:
+        status = "500"
+        raise
+    finally:
+        IN_PROGRESS.labels(endpoint).dec()
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        REQUESTS_TOTAL.labels(endpoint, status).inc()
+
+
+def render() -> tuple:
+    """
+    Under the pre-fork launcher (`PROMETHEUS_MULTIPROC_DIR` set) every worker
+    writes its samples to that directory and any worker renders the sum.
+
+    Returns:
+        tuple: (body, content type) of the Prometheus text exposition.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,226 @@
+# backend/micro_batcher.py
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import numpy as np
+from loguru import logger
+
+
+class _Pending:
+    """
+    One request waiting in the queue: its rows, the model bundle it was
+    admitted with, and the future its caller is blocked on.
+    """
+
+    __slots__ = ("bundle", "records", "future", "enqueued")
+
+    def __init__(self, bundle, records: List[dict]):
+        self.bundle = bundle
+        self.records = records
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent scoring requests into one model call.
+
+    A single worker thread takes the first waiting request, keeps collecting
+    requests until `window_ms` has passed since that first one arrived or
+    `max_rows` rows are gathered, runs `score_fn` once on the stacked rows, and
+    resolves every caller's future with its own slice of the result. While a
+    batch is being scored, new requests queue up and form the next batch.
+
+    `score_fn` may instead return a `Future` of its output (e.g. a batch sent to
+    a worker process); the callers are then resolved from its done-callback,
+    and up to `max_in_flight` batches are scored at once.
+    """
+
+    # upper bounds of the batch-size histogram (rows per model call)
+    SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+    def __init__(self, score_fn: Callable, window_ms: float, max_rows: int, max_in_flight: int = 1):
+        """
+        Args:
+            score_fn (Callable): `score_fn(bundle, records)` returning a tuple of
+                arrays aligned with `records`, or a `Future` of one.
+            window_ms (float): Maximum time the first request of a batch waits for company.
+            max_rows (int): Batch is dispatched as soon as it holds this many rows.
+            max_in_flight (int): Batches whose `Future` may be pending at once;
+                the worker thread waits for a free slot before dispatching more.
+        """
+        self.score_fn = score_fn
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.max_in_flight = max(1, max_in_flight)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.max_batch_rows = 0
+        self.queue_delay_sum = 0.0
+        self.queue_delay_max = 0.0
+        self.size_histogram = [0] * (len(self.SIZE_BUCKETS) + 1)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def submit(self, bundle, records: List[dict]) -> Future:
+        """
+        Queue rows for the next batch.
+
+        Returns:
+            Future: Resolves to the `score_fn` output for exactly these rows.
+        """
+        pending = _Pending(bundle, records)
+        self._queue.put(pending)
+        return pending.future
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        items = [first]
+        rows = len(first.records)
+        deadline = first.enqueued + self.window
+        while rows < self.max_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                # past the window, still take whatever queued up during the last batch
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # keep the stop sentinel for the main loop
+                self._queue.put(None)
+                break
+            items.append(item)
+            rows += len(item.records)
+        return items
+
+    def _dispatch(self, items: List[_Pending]) -> None:
+        started = time.monotonic()
+        # requests admitted under different model versions are scored separately
+        groups = {}
+        for item in items:
+            groups.setdefault(id(item.bundle), []).append(item)
+
+        for group in groups.values():
+            stacked = [r for item in group for r in item.records]
+            delays = [started - item.enqueued for item in group]
+            self._slots.acquire()
+            try:
+                outputs = self.score_fn(group[0].bundle, stacked)
+            except Exception as e:
+                self._slots.release()
+                for item in group:
+                    item.future.set_exception(e)
+                continue
+            if isinstance(outputs, Future):
+                outputs.add_done_callback(lambda done, group=group, delays=delays: self._resolve(group, done, delays))
+            else:
+                self._slots.release()
+                self._split(group, outputs, delays)
+
+    def _resolve(self, group: List[_Pending], done: Future, delays: List[float]) -> None:
+        self._slots.release()
+        try:
+            outputs = done.result()
+        except BaseException as e:
+            for item in group:
+                item.future.set_exception(e)
+            return
+        try:
+            self._split(group, outputs, delays)
+        except Exception as e:
+            logger.exception(f"Micro-batch dispatch failed: {e}")
+            for item in group:
+                if not item.future.done():
+                    item.future.set_exception(e)
+
+    def _split(self, group: List[_Pending], outputs, delays: List[float]) -> None:
+        outputs = [np.asarray(out) for out in outputs]
+        offset = 0
+        for item in group:
+            n = len(item.records)
+            item.future.set_result(tuple(out[offset:offset + n] for out in outputs))
+            offset += n
+        self._record(len(group), offset, delays)
+
+    def _record(self, n_requests: int, n_rows: int, delays: List[float]) -> None:
+        with self._stats_lock:
+            self.batches += 1
+            self.requests += n_requests
+            self.rows += n_rows
+            self.max_batch_rows = max(self.max_batch_rows, n_rows)
+            self.queue_delay_sum += sum(delays)
+            self.queue_delay_max = max(self.queue_delay_max, max(delays))
+            for i, bound in enumerate(self.SIZE_BUCKETS):
+                if n_rows <= bound:
+                    self.size_histogram[i] += 1
+                    break
+            else:
+                self.size_histogram[-1] += 1
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            items = self._collect(first)
+            try:
+                self._dispatch(items)
+            except Exception as e:
+                logger.exception(f"Micro-batch dispatch failed: {e}")
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+        # fail whatever was still queued instead of leaving callers blocked
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and not item.future.done():
+                item.future.set_exception(RuntimeError("Micro-batcher stopped"))
+
+    def stats(self) -> dict:
+        """
+        Batch-size distribution and queueing delay since startup.
+        """
+        with self._stats_lock:
+            labels = [f"<={b}" for b in self.SIZE_BUCKETS] + [f">{self.SIZE_BUCKETS[-1]}"]
+            return {
+                "running": self.running,
+                "window_ms": self.window * 1000,
+                "max_rows": self.max_rows,
+                "max_in_flight": self.max_in_flight,
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "requests": self.requests,
+                "rows": self.rows,
+                "avg_batch_rows": self.rows / self.batches if self.batches else 0.0,
+                "max_batch_rows": self.max_batch_rows,
+                "avg_queue_delay_ms": 1000 * self.queue_delay_sum / self.requests if self.requests else 0.0,
+                "max_queue_delay_ms": 1000 * self.queue_delay_max,
+                "batch_rows_histogram": dict(zip(labels, self.size_histogram)),
+            }
@@ -0,0 +1,330 @@
+# backend/model_registry.py
+
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import joblib
+import pandas as pd
+from loguru import logger
+
+import flat_artifacts
+from cox_scorer import CoxScorer, max_abs_difference
+from forest_engine import FlatPipeline
+
+# Artifact files that make up one model version
+RENT_FILE = "rent_price_model.pkl"
+SALE_FILE = "sell_price_model.pkl"
+COX_FILE  = "cox_model.pkl"
+MODEL_FILES = [RENT_FILE, SALE_FILE, COX_FILE]
+
+# "pickle": the three .pkl files above; "npy": a `flat_artifacts` directory
+ARTIFACT_FORMATS = ("pickle", "npy")
+
+# Raw columns the price models may be trained on (PropertyBase fields + district)
+PRICE_INPUT_COLUMNS = {"size_sqm", "rooms", "floor", "year_built", "district", "renovation_status"}
+
+# Numeric Cox covariates that are not one-hot dummies
+COX_NUMERIC_COLUMNS = {"size_sqm", "rooms", "floor", "year_built", "predicted_sell_price", "predicted_rent_price"}
+
+
+def _get_features(m) -> List[str]:
+    """
+    Extract the list of feature names used by the trained sklearn model.
+
+    Raises:
+        AttributeError: If the model does not contain the `feature_names_in_` attribute.
+    """
+    if hasattr(m, "feature_names_in_"):
+        return list(m.feature_names_in_)
+    raise AttributeError("Model missing `feature_names_in_`. Retrain with sklearn>=1.0.")
+
+
+def _fingerprint(model_dir: Path, files: Sequence[str] = MODEL_FILES) -> Optional[tuple]:
+    """
+    Cheap change detector: (name, size, mtime) of every artifact, or None if one is missing.
+    """
+    stats = []
+    for name in files:
+        path = model_dir / name
+        if not path.exists():
+            return None
+        st = path.stat()
+        stats.append((name, st.st_size, st.st_mtime_ns))
+    return tuple(stats)
+
+
+def _content_version(model_dir: Path) -> str:
+    """
+    Version id of an artifact set: SHA-256 over the file contents, shortened.
+    """
+    digest = hashlib.sha256()
+    for name in MODEL_FILES:
+        with open(model_dir / name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class ModelBundle:
+    """
+    One loaded, validated artifact set plus the engines compiled from it.
+
+    Requests take a reference to a bundle once and use it throughout, so a
+    reload never changes the models underneath an in-flight request.
+
+    Bundles loaded from memory-mapped artifacts (`from_flat`) have no sklearn
+    or lifelines objects: `rent_model`, `sales_model` and `cox_model` are None
+    and only the flat/numpy engines can score them.
+    """
+
+    def __init__(self, version: str, path: Path, rent_flat: FlatPipeline, sales_flat: FlatPipeline,
+                 cox_scorer: CoxScorer, rent_features: Sequence[str], sale_features: Sequence[str],
+                 categorical: Sequence[str], rent_model=None, sales_model=None, cox_model=None,
+                 artifact_format: str = "pickle"):
+        self.version = version
+        self.path = str(path)
+        self.artifact_format = artifact_format
+        self.loaded_at = time.time()
+
+        self.rent_model = rent_model
+        self.sales_model = sales_model
+        self.cox_model = cox_model
+
+        self.rent_features = list(rent_features)
+        self.sale_features = list(sale_features)
+        self.cox_features = list(cox_scorer.features)
+
+        self.rent_flat = rent_flat
+        self.sales_flat = sales_flat
+        self.cox_scorer = cox_scorer
+
+        # Every raw column that feeds any model; used as the prediction cache key
+        cox_raw = (COX_NUMERIC_COLUMNS - {"predicted_sell_price", "predicted_rent_price"}) | set(categorical)
+        self.model_input_columns = sorted(set(self.rent_features) | set(self.sale_features) | cox_raw)
+
+    @classmethod
+    def from_models(cls, version: str, path: Path, rent_model, sales_model, cox_model,
+                    categorical: Sequence[str], horizons: Sequence[float]) -> "ModelBundle":
+        """
+        Bundle unpickled sklearn pipelines and lifelines model, compiling the fast engines.
+        """
+        rent_flat = FlatPipeline.from_pipeline(rent_model)
+        sales_flat = FlatPipeline.from_pipeline(sales_model)
+        # per-branch value deltas for `/predict/explain`; memory-mapped bundles build them on first use
+        for flat in (rent_flat, sales_flat):
+            flat.forest.child_delta
+        return cls(
+            version=version,
+            path=path,
+            rent_flat=rent_flat,
+            sales_flat=sales_flat,
+            cox_scorer=CoxScorer(cox_model, categorical, horizons=horizons),
+            rent_features=_get_features(rent_model),
+            sale_features=_get_features(sales_model),
+            categorical=categorical,
+            rent_model=rent_model,
+            sales_model=sales_model,
+            cox_model=cox_model,
+        )
+
+    @classmethod
+    def from_flat(cls, artifact_dir: Path, categorical: Sequence[str], horizons: Sequence[float]) -> "ModelBundle":
+        """
+        Bundle the version currently published in a `flat_artifacts` directory, memory-mapped.
+        """
+        version_dir = Path(artifact_dir) / flat_artifacts.read_current(artifact_dir)
+        loaded = flat_artifacts.load(version_dir, categorical, horizons)
+        manifest = loaded["manifest"]
+        return cls(
+            version=loaded["version"],
+            path=version_dir,
+            rent_flat=loaded["rent_flat"],
+            sales_flat=loaded["sales_flat"],
+            cox_scorer=loaded["cox_scorer"],
+            rent_features=manifest["rent"]["features"],
+            sale_features=manifest["sale"]["features"],
+            categorical=categorical,
+            artifact_format="npy",
+        )
+
+    def validate(self, categorical: Sequence[str], verify_cox: bool) -> None:
+        """
+        Check the feature lists are ones the API can build, and optionally that the
+        closed-form Cox scorer agrees with lifelines.
+
+        Raises:
+            ValueError: If a feature list or the Cox check does not pass.
+        """
+        for name, features in (("rent", self.rent_features), ("sale", self.sale_features)):
+            unknown = set(features) - PRICE_INPUT_COLUMNS
+            if unknown:
+                raise ValueError(f"{name} model expects unknown features {sorted(unknown)}")
+
+        prefixes = tuple(f"{col}_" for col in categorical)
+        unknown = [f for f in self.cox_features if f not in COX_NUMERIC_COLUMNS and not f.startswith(prefixes)]
+        if unknown:
+            raise ValueError(f"Cox model expects unknown covariates {unknown}")
+
+        # memory-mapped sets were checked against the source models when converted
+        if verify_cox and self.cox_model is not None:
+            probe = pd.DataFrame(
+                [self.cox_model._norm_mean + k * self.cox_model._norm_std for k in (-1, 0, 1)]
+            )[self.cox_features]
+            diff = max_abs_difference(self.cox_scorer, self.cox_model, probe)
+            if diff > 1e-9:
+                raise ValueError(f"NumPy Cox scorer deviates from lifelines by {diff:.3g}")
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "format": self.artifact_format,
+            "loaded_at": self.loaded_at,
+            "rent_features": self.rent_features,
+            "sale_features": self.sale_features,
+            "cox_features": self.cox_features,
+        }
+
+
+class ModelRegistry:
+    """
+    Holds the active `ModelBundle` and hot-swaps it when the artifacts change.
+
+    A background thread polls the model directory; once a changed artifact set
+    has been stable for one poll interval it is loaded and validated off the
+    request path, then published with a single reference assignment. A set
+    that fails to load or validate is logged and the active bundle stays.
+    """
+
+    def __init__(self, model_dir: Path, poll_interval: float, categorical: Sequence[str],
+                 horizons: Sequence[float], verify_cox: bool = False, artifact_format: str = "pickle"):
+        """
+        Args:
+            model_dir (Path): Directory holding the three `.pkl` artifacts, or a
+                `flat_artifacts` directory when `artifact_format` is "npy".
+            poll_interval (float): Seconds between directory checks; 0 disables watching.
+            categorical (Sequence[str]): Raw categorical columns of the Cox model.
+            horizons (Sequence[float]): Horizons (days) precompiled into the Cox scorer.
+            verify_cox (bool): Reject artifact sets whose NumPy Cox scorer disagrees with lifelines.
+            artifact_format (str): "pickle" or "npy" (see `ARTIFACT_FORMATS`).
+        """
+        if artifact_format not in ARTIFACT_FORMATS:
+            raise ValueError(f"Unknown artifact format {artifact_format!r}; expected one of {ARTIFACT_FORMATS}.")
+        self.model_dir = Path(model_dir)
+        self.poll_interval = poll_interval
+        self.categorical = list(categorical)
+        self.horizons = list(horizons)
+        self.verify_cox = verify_cox
+        self.artifact_format = artifact_format
+        # npy sets are published by replacing current.json, so that is all there is to watch
+        self._files = MODEL_FILES if artifact_format == "pickle" else [flat_artifacts.CURRENT_FILE]
+
+        self._bundle: Optional[ModelBundle] = None
+        self._fingerprint: Optional[tuple] = None
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.previous_version: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    def current(self) -> ModelBundle:
+        """
+        The active bundle. Take it once per request and keep using that reference.
+        """
+        if self._bundle is None:
+            raise RuntimeError("No model bundle loaded")
+        return self._bundle
+
+    def _load(self) -> ModelBundle:
+        fingerprint = _fingerprint(self.model_dir, self._files)
+        if fingerprint is None:
+            raise FileNotFoundError(f"Missing model artifacts in {self.model_dir}")
+        if self.artifact_format == "npy":
+            bundle = ModelBundle.from_flat(self.model_dir, self.categorical, self.horizons)
+        else:
+            bundle = self._load_pickles()
+        bundle.validate(self.categorical, self.verify_cox)
+        self._fingerprint = fingerprint
+        return bundle
+
+    def _load_pickles(self) -> ModelBundle:
+        return ModelBundle.from_models(
+            version=_content_version(self.model_dir),
+            path=self.model_dir,
+            rent_model=joblib.load(self.model_dir / RENT_FILE),
+            sales_model=joblib.load(self.model_dir / SALE_FILE),
+            cox_model=joblib.load(self.model_dir / COX_FILE),
+            categorical=self.categorical,
+            horizons=self.horizons,
+        )
+
+    def reload(self) -> bool:
+        """
+        Load the artifact set currently on disk and publish it if it is valid.
+
+        Returns:
+            bool: True if a new bundle was published, False if loading failed or
+            the artifacts are unchanged.
+        """
+        with self._load_lock:
+            try:
+                bundle = self._load()
+            except Exception as e:
+                self.last_error = str(e)
+                if self._bundle is None:
+                    raise
+                logger.error(f"Model reload from {self.model_dir} failed, keeping {self._bundle.version}: {e}")
+                return False
+
+            self.last_error = None
+            if self._bundle is not None and bundle.version == self._bundle.version:
+                return False
+            if self._bundle is not None:
+                self.previous_version = self._bundle.version
+            self._bundle = bundle
+            logger.info(f"Serving model version {bundle.version} from {self.model_dir}")
+            return True
+
+    def _run(self) -> None:
+        pending = None
+        while not self._stop.wait(self.poll_interval):
+            fingerprint = _fingerprint(self.model_dir, self._files)
+            if fingerprint is None or fingerprint == self._fingerprint:
+                pending = None
+                continue
+            # only load once the files stopped changing (copy finished)
+            if fingerprint != pending:
+                pending = fingerprint
+                continue
+            pending = None
+            if not self.reload():
+                # do not retry the same broken set every poll
+                self._fingerprint = fingerprint
+
+    def start(self) -> None:
+        """
+        Start watching the model directory (the initial load happens in `reload`).
+        """
+        if self.poll_interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="model-registry", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self) -> dict:
+        bundle = self._bundle
+        return {
+            **(bundle.info() if bundle is not None else {}),
+            "previous_version": self.previous_version,
+            "last_error": self.last_error,
+            "watching": self._thread is not None,
+            "poll_interval_seconds": self.poll_interval,
+        }
@@ -1,47 +1,180 @@
 # backend/prediction_router.py
 
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
 
-import joblib
-import pandas as pd
-from fastapi import APIRouter, HTTPException, Depends
-from database.database import get_db
-from sqlalchemy.orm import Session
-from database.models import Location, User, PropertyType
-from database.schema import PropertyBase, CoxPredictionBase, PredictionBase, PricePrediction,SaleCoxPrediction ,RentCoxPrediction
+import numpy as np
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from database.database import AsyncSessionLocal, SessionLocal
+from database.schema import PropertyBase, SaleCoxPrediction, RentCoxPrediction, BatchPrediction
+from database.schema import SurvivalCurveRequest, SurvivalCurveResponse, WhatIfRequest, WhatIfResponse, ExplainPrediction
+from database.schema import PredictionWithComps
+from model_registry import ModelBundle, ModelRegistry
+from prediction_cache import PredictionCache
+from location_index import LocationIndex
+from comps_index import CompsIndex
+from deadline import CostModel
+import stream_scoring
+from micro_batcher import MicroBatcher
+from inference_pool import InferencePool, PoolUnavailable, default_workers
+import metrics
+import scoring
+from metrics import StageTimings
+from scoring import (
+    CATEGORICAL_FEATURES, COX_ENGINE, PRICE_ENGINE, SALE_HORIZON_DAYS
+)
 
 # ────────────────────────────────────────────────────────────────────────────────
 # Load trained model artifacts for rent price, sale price, and Cox model.
-# These files are expected to be mounted by Docker into the container.
+# These files are expected to be mounted by Docker into the container; the
+# registry watches the directory and hot-swaps a new, validated set.
 # ────────────────────────────────────────────────────────────────────────────────
 BASE_DIR  = Path(__file__).resolve().parent
-PKL_DIR   = BASE_DIR / "models"
+MODEL_DIR = Path(os.getenv("MODEL_DIR", BASE_DIR / "models"))
+
+# "pickle" loads the .pkl files; "npy" memory-maps a directory built by
+# `python flat_artifacts.py`, shared by every worker on the host.
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "pickle").lower()
+if MODEL_FORMAT == "npy" and (PRICE_ENGINE, COX_ENGINE) != ("flat", "numpy"):
+    raise ValueError("MODEL_FORMAT=npy holds no sklearn/lifelines models; set PRICE_ENGINE=flat and COX_ENGINE=numpy.")
+
+registry = ModelRegistry(
+    MODEL_DIR,
+    poll_interval=float(os.getenv("MODEL_POLL_SECONDS", "30")),
+    categorical=CATEGORICAL_FEATURES,
+    horizons=[SALE_HORIZON_DAYS],
+    verify_cox=COX_ENGINE == "numpy",
+    artifact_format=MODEL_FORMAT,
+)
+registry.reload()
+
+# ────────────────────────────────────────────────────────────────────────────────
+# In-process cache of (rent, sale, prob_sold) keyed on the model inputs only
+# (title, post_date, ... do not affect predictions). 0 entries disables it.
+# ────────────────────────────────────────────────────────────────────────────────
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("PREDICTION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL", "600")),
+)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# location_id -> district map kept in memory; loaded and refreshed from the
+# app lifespan (see main.py) so the predict path never waits on the DB.
+# ────────────────────────────────────────────────────────────────────────────────
+location_index = LocationIndex(
+    SessionLocal,
+    refresh_interval=float(os.getenv("LOCATION_REFRESH_SECONDS", "300")),
+    async_session_factory=AsyncSessionLocal,
+)
 
-rent_model  = joblib.load(PKL_DIR / "rent_price_model.pkl")
-sales_model = joblib.load(PKL_DIR / "sell_price_model.pkl")
-cox_model   = joblib.load(PKL_DIR / "cox_model.pkl")
+# ────────────────────────────────────────────────────────────────────────────────
+# Nearest-neighbour index of existing listings for comparable-listings queries;
+# refreshed incrementally (new property_ids only) from the app lifespan.
+# ────────────────────────────────────────────────────────────────────────────────
+comps_index = CompsIndex(
+    SessionLocal,
+    refresh_interval=float(os.getenv("COMPS_REFRESH_SECONDS", "60")),
+    full_refresh_every=int(os.getenv("COMPS_FULL_REFRESH_EVERY", "60")),
+)
+COMPS_DEFAULT_K = int(os.getenv("COMPS_DEFAULT_K", "10"))
+COMPS_MAX_K = int(os.getenv("COMPS_MAX_K", "100"))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Optional micro-batching: concurrent requests arriving within a few ms are
+# scored by one model call (see `micro_batcher` below `request_deadline`).
+# ────────────────────────────────────────────────────────────────────────────────
+MICRO_BATCH_ENABLED  = os.getenv("MICRO_BATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", "3"))
+MICRO_BATCH_MAX_ROWS  = int(os.getenv("MICRO_BATCH_MAX_ROWS", "256"))
 
 # ────────────────────────────────────────────────────────────────────────────────
-# Extract features used during training from the models
+# Where inference runs: "inline" scores in the API process (threadpool),
+# "process" ships rows to a pool of worker processes with preloaded models.
 # ────────────────────────────────────────────────────────────────────────────────
-def _get_features(m) -> List[str]:
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "inline").lower()
+if INFERENCE_MODE not in ("inline", "process"):
+    raise ValueError(f"Unknown INFERENCE_MODE {INFERENCE_MODE!r}; expected 'inline' or 'process'.")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(default_workers())))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Deadlines: a prediction request may carry a latency budget (`?deadline_ms=` or
+# the `X-Deadline-Ms` header). When the model work queued ahead of it plus the
+# expected full-model time would overrun it, the rows are scored by the cheap
+# fallback (see `scoring.run_fallback`) and the response says so in `scored_by`.
+# ────────────────────────────────────────────────────────────────────────────────
+FALLBACK_ENABLED = os.getenv("FALLBACK_ENABLED", "true").lower() in ("1", "true", "yes")
+# Fallback calls over at most this many rows run on the event loop (cheaper than
+# a thread hop); larger ones run in the threadpool so they do not stall other requests.
+FALLBACK_INLINE_MAX_ROWS = int(os.getenv("FALLBACK_INLINE_MAX_ROWS", "64"))
+cost_model = CostModel(capacity=INFERENCE_WORKERS if INFERENCE_MODE == "process" else 1)
+
+
+def _observe_model_call(fn: str, rows: int, timings: StageTimings) -> None:
     """
-    Extract the list of feature names used by the trained sklearn model.
-    
-    Raises:
-        AttributeError: If the model does not contain the `feature_names_in_` attribute.
+    Record the stage timings of a scoring call; full-model calls also feed `cost_model`.
     """
-    if hasattr(m, "feature_names_in_"):
-        return list(m.feature_names_in_)
-    raise AttributeError("Model missing `feature_names_in_`. Retrain with sklearn>=1.0.")
+    metrics.observe_stages(timings)
+    if fn == "run_models":
+        cost_model.observe(rows, sum(timings.values()))
+
+
+inference_pool = InferencePool(
+    INFERENCE_WORKERS,
+    MODEL_DIR,
+    categorical=CATEGORICAL_FEATURES,
+    horizons=[SALE_HORIZON_DAYS],
+    verify_cox=COX_ENGINE == "numpy",
+    artifact_format=MODEL_FORMAT,
+    on_timings=_observe_model_call,
+)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Warm-up: synthetic batches scored at startup, before the worker reports ready,
+# so the first real requests do not pay for lazy allocations in the models.
+# ────────────────────────────────────────────────────────────────────────────────
+WARMUP_BATCH_SIZES = [int(n) for n in os.getenv("WARMUP_BATCH_SIZES", "1,8,64").split(",") if n.strip()]
+
+_warmed_up = False
 
-RENT_FEATURES = _get_features(rent_model)
-SALE_FEATURES = _get_features(sales_model)
-COX_FEATURES  = list(cox_model.params_.index)
+# ────────────────────────────────────────────────────────────────────────────────
+# Survival curve: horizons (days) used when a request gives none, and the most
+# a single request may ask for.
+# ────────────────────────────────────────────────────────────────────────────────
+DEFAULT_CURVE_HORIZONS = [30.0, 60.0, 90.0, 150.0, 180.0, 365.0]
+MAX_CURVE_HORIZONS = int(os.getenv("MAX_CURVE_HORIZONS", "1000"))
 
-# Features that need one-hot encoding before passing to Cox model
-CATEGORICAL_FEATURES = ["district", "renovation_status"]
+# ────────────────────────────────────────────────────────────────────────────────
+# Prediction intervals: most quantiles of the per-tree prices one request may ask for.
+# ────────────────────────────────────────────────────────────────────────────────
+MAX_QUANTILES = 20
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Batch endpoints: most properties one request may carry. Larger portfolios go
+# through `/predict/stream` or a scoring job (`/jobs/score`).
+# ────────────────────────────────────────────────────────────────────────────────
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", "5000"))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Streamed bulk scoring: rows per model call (the first chunk is smaller so the
+# first results come back quickly) and the longest accepted input line.
+# ────────────────────────────────────────────────────────────────────────────────
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "2000"))
+STREAM_FIRST_CHUNK_ROWS = int(os.getenv("STREAM_FIRST_CHUNK_ROWS", "100"))
+STREAM_MAX_LINE_BYTES = 64 * 1024
+
+# ────────────────────────────────────────────────────────────────────────────────
+# What-if sweeps: model inputs that may be varied, and the largest grid.
+# ────────────────────────────────────────────────────────────────────────────────
+SWEEP_NUMERIC_FEATURES = ["size_sqm", "rooms", "floor", "year_built"]
+SWEEP_CATEGORICAL_FEATURES = ["renovation_status", "district"]
+MAX_SWEEP_POINTS = int(os.getenv("MAX_SWEEP_POINTS", "1000"))
 
 # ────────────────────────────────────────────────────────────────────────────────
 # FastAPI router definition for prediction endpoints
@@ -49,28 +182,434 @@ CATEGORICAL_FEATURES = ["district", "renovation_status"]
 router = APIRouter(prefix="/predict", tags=["Prediction"])
 
 
-def _to_df(item: PropertyBase) -> pd.DataFrame:
+def _to_record(item: PropertyBase, district: str) -> dict:
     """
-    Convert input Pydantic model into a one-row Pandas DataFrame.
-    The machine learning pipeline expects a DataFrame input.
-    
+    Convert input Pydantic model into the plain dict the models are scored on.
+
     Args:
         item (PropertyBase): Input data as a Pydantic model.
+        district (str): District resolved from `item.location_id`.
 
     Returns:
-        pd.DataFrame: One-row DataFrame for prediction.
+        dict: Property fields plus `district`.
+    """
+    record = item.dict()
+    record["district"] = district
+    return record
+
+
+def _check_districts(location_ids: List[int], districts: Dict[int, str]) -> Dict[int, str]:
+    """
+    Raise if any of `location_ids` was not resolved.
+
+    Raises:
+        HTTPException: 503 if the index could never be loaded,
+            400 if any location_id does not exist.
+    """
+    missing = sorted(set(location_ids) - districts.keys())
+    if missing:
+        if not location_index.loaded:
+            raise HTTPException(status_code=503, detail="Location index not loaded yet")
+        raise HTTPException(status_code=400, detail=f"Invalid location_id: {missing}")
+    return districts
+
+
+async def _lookup_districts_async(location_ids: List[int]) -> Dict[int, str]:
+    """
+    Resolve many location IDs to their district from the in-memory index; an
+    on-demand refresh of the index (a DB query) is awaited on the async engine.
+
+    Args:
+        location_ids (List[int]): Location IDs to resolve (duplicates allowed).
+
+    Returns:
+        Dict[int, str]: Mapping of location_id -> district.
+    """
+    with metrics.stage("location_lookup"):
+        districts = await location_index.lookup_async(location_ids)
+    return _check_districts(location_ids, districts)
+
+
+def _cache_key(bundle: ModelBundle, record: dict) -> tuple:
+    """
+    Canonical feature tuple for a record: model inputs only, numerics as floats.
+    """
+    return tuple(
+        float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+        for value in (record.get(col) for col in bundle.model_input_columns)
+    )
+
+
+def _split_cached(bundle: ModelBundle, records: List[dict]):
+    """
+    Fill what `prediction_cache` already holds.
+
+    Returns:
+        tuple: (results array, cache keys, indices of the records still to score).
+    """
+    results = np.empty((len(records), 3), dtype=float)
+    with metrics.stage("cache_lookup"):
+        keys = [_cache_key(bundle, r) for r in records]
+        missing = []
+        for i, key in enumerate(keys):
+            cached = prediction_cache.get(key, bundle.version)
+            if cached is None:
+                missing.append(i)
+            else:
+                results[i] = cached
+    return results, keys, missing
+
+
+def _store_scored(bundle: ModelBundle, results: np.ndarray, keys: list, missing: List[int], outputs) -> tuple:
+    """
+    Write model outputs for the missing records into `results` and the cache.
+
+    Returns:
+        tuple: (rent_prices, sale_prices, prob_sold) as NumPy arrays aligned with records.
+    """
+    if missing:
+        scored = np.column_stack(outputs)
+        results[missing] = scored
+        for i, row in zip(missing, scored):
+            prediction_cache.put(keys[i], tuple(row), bundle.version)
+    return results[:, 0], results[:, 1], results[:, 2]
+
+
+def _use_batcher(rows: List[dict]) -> bool:
+    return micro_batcher.running and len(rows) < micro_batcher.max_rows
+
+
+def _run_inline(bundle: ModelBundle, rows: List[dict], fn: str = "run_models", **kwargs):
+    """
+    Run the scoring function `fn` of `scoring.py` over rows in this process,
+    recording the per-stage timings.
+    """
+    timings = StageTimings()
+    outputs = getattr(scoring, fn)(bundle, rows, timings=timings, **kwargs)
+    _observe_model_call(fn, len(rows), timings)
+    return outputs
+
+
+def _submit_to_pool(bundle: ModelBundle, rows: List[dict], fn: str = "run_models", **kwargs) -> Future:
+    """
+    `inference_pool.submit`, except that a call the pool cannot take (it is
+    restarting, or the worker serves another model version) is scored in this
+    process instead, on a thread of its own rather than waiting for the pool.
+    """
+    future: Future = Future()
+
+    def run_inline() -> None:
+        try:
+            future.set_result(_run_inline(bundle, rows, fn, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def resolve(done: Future) -> None:
+        try:
+            future.set_result(done.result())
+        except PoolUnavailable as e:
+            logger.warning(f"Scoring {len(rows)} rows in the API process: {e}")
+            threading.Thread(target=run_inline, name="inline-scoring", daemon=True).start()
+        except BaseException as e:
+            future.set_exception(e)
+
+    inference_pool.submit(bundle, rows, fn, **kwargs).add_done_callback(resolve)
+    return future
+
+
+def _run_models(bundle: ModelBundle, rows: List[dict]):
+    """
+    Score rows where `INFERENCE_MODE` says: a worker process or this process.
     """
-    return pd.DataFrame([item.dict()])
+    with cost_model.pending(len(rows)):
+        if inference_pool.running:
+            return _submit_to_pool(bundle, rows).result()
+        return _run_inline(bundle, rows)
+
+
+def _submit_models(bundle: ModelBundle, rows: List[dict]) -> Future:
+    """
+    `_run_models` for the micro-batcher: in process mode the batch is sent to a
+    worker without blocking the batcher, so batches run on all workers at once.
+    """
+    if not inference_pool.running:
+        future: Future = Future()
+        try:
+            future.set_result(_run_models(bundle, rows))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    cost = cost_model.enqueue(len(rows))
+    try:
+        future = _submit_to_pool(bundle, rows)
+    except BaseException:
+        cost_model.dequeue(cost)
+        raise
+    future.add_done_callback(lambda _: cost_model.dequeue(cost))
+    return future
+
+
+def _needs_fallback(deadline: Optional[float], rows: int) -> bool:
+    """
+    Whether a full-model call over `rows` rows started now is expected to finish
+    after `deadline` (a `time.monotonic()` value; None means no deadline).
+    """
+    if deadline is None or not FALLBACK_ENABLED:
+        return False
+    expected = cost_model.expected_seconds(rows)
+    return expected is not None and time.monotonic() + expected > deadline
+
+
+def _run_fallback(bundle: ModelBundle, rows: List[dict], quantiles: Optional[List[float]] = None):
+    """
+    Score rows with `scoring.run_fallback`, recording its stage timings.
+    """
+    timings = StageTimings()
+    outputs = scoring.run_fallback(bundle, rows, quantiles, timings)
+    metrics.observe_stages(timings)
+    metrics.count_rows(fallback=len(rows))
+    return outputs
+
+
+async def _run_fallback_async(bundle: ModelBundle, rows: List[dict], quantiles: Optional[List[float]] = None):
+    """
+    `_run_fallback` outside the model queue it is avoiding: small calls right on
+    the event loop, those over `FALLBACK_INLINE_MAX_ROWS` rows in the threadpool.
+    """
+    if len(rows) <= FALLBACK_INLINE_MAX_ROWS:
+        return _run_fallback(bundle, rows, quantiles)
+    return await run_in_threadpool(_run_fallback, bundle, rows, quantiles)
+
+
+def _check_batch_size(rows: int) -> None:
+    """
+    Raises:
+        HTTPException: 400 if a request carries more than `MAX_BATCH_ROWS` properties.
+    """
+    if rows > MAX_BATCH_ROWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_ROWS} properties per request; use /predict/stream or /jobs/score for more",
+        )
+
+
+async def _score_records_async(records: List[dict], deadline: Optional[float] = None):
+    """
+    Score records, serving repeated feature combinations from `prediction_cache`.
+
+    Only the cache misses are passed to the models, still in a single call; the
+    event loop only does cache lookups and waits on the micro-batcher, the
+    worker pool or the threadpool for the rest.
+
+    If the full models are not expected to score the cache misses before
+    `deadline`, the fallback scores them instead; its results are not cached.
+
+    Returns:
+        tuple: (rent_prices, sale_prices, prob_sold, fallback) where `fallback`
+        is a boolean array marking the rows scored by the fallback.
+    """
+    # one bundle for the whole request, even if a reload happens meanwhile
+    bundle = registry.current()
+    results, keys, missing = _split_cached(bundle, records)
+    fallback = np.zeros(len(records), dtype=bool)
+    outputs = None
+    if missing:
+        rows = [records[i] for i in missing]
+        if _needs_fallback(deadline, len(rows)):
+            metrics.count_rows(cached=len(records) - len(missing), scored=0)
+            results[missing] = np.column_stack((await _run_fallback_async(bundle, rows))[:3])
+            fallback[missing] = True
+            return results[:, 0], results[:, 1], results[:, 2], fallback
+        # queueing, process hand-off and model time together; the model stages are recorded separately
+        with metrics.stage("inference"):
+            if _use_batcher(rows):
+                outputs = await asyncio.wrap_future(micro_batcher.submit(bundle, rows))
+            elif inference_pool.running:
+                with cost_model.pending(len(rows)):
+                    outputs = await asyncio.wrap_future(_submit_to_pool(bundle, rows))
+            else:
+                with cost_model.pending(len(rows)):
+                    outputs = await run_in_threadpool(_run_inline, bundle, rows)
+    metrics.count_rows(cached=len(records) - len(missing), scored=len(missing))
+    return (*_store_scored(bundle, results, keys, missing, outputs), fallback)
+
+
+async def _infer(bundle: ModelBundle, fn: str, rows: List[dict], **kwargs):
+    """
+    Run the scoring function `fn` of `scoring.py` over rows in the inference
+    pool if it is running, else in the threadpool; bypasses cache and batcher.
+    """
+    with cost_model.pending(len(rows)):
+        if inference_pool.running:
+            return await asyncio.wrap_future(_submit_to_pool(bundle, rows, fn, **kwargs))
+        return await run_in_threadpool(_run_inline, bundle, rows, fn, **kwargs)
+
+def _parse_quantiles(raw: Optional[str]) -> Optional[List[float]]:
+    """
+    Parse the `quantiles` query parameter ("0.1,0.5,0.9").
+
+    Raises:
+        HTTPException: 400 if a value is not a number in [0, 1] or there are
+            more than `MAX_QUANTILES`.
+    """
+    if raw is None:
+        return None
+    try:
+        quantiles = sorted({float(q) for q in raw.split(",") if q.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid quantiles {raw!r}; expected e.g. 0.1,0.5,0.9")
+    if not quantiles or quantiles[0] < 0 or quantiles[-1] > 1:
+        raise HTTPException(status_code=400, detail="Quantiles must be numbers in [0, 1]")
+    if len(quantiles) > MAX_QUANTILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUANTILES} quantiles per request")
+    return quantiles
+
+
+def _quantile_map(quantiles: List[float], values: np.ndarray) -> Dict[str, float]:
+    """
+    Label quantiles of one row as "p10", "p50", "p97.5", ...
+    """
+    return {f"p{q * 100:g}": float(v) for q, v in zip(quantiles, values)}
+
+
+async def _score_with_intervals(records: List[dict], quantiles: Optional[List[float]],
+                                deadline: Optional[float] = None):
+    """
+    `_score_records_async`, plus per-tree price quantiles when `quantiles` is given
+    (those requests are scored directly, without the prediction cache).
+
+    Returns:
+        tuple: (rent_prices, sale_prices, prob_sold, rent_quantiles, sale_quantiles, fallback);
+        the quantile arrays are None without `quantiles`.
+    """
+    if quantiles is None:
+        rent_prices, sale_prices, prob_sold, fallback = await _score_records_async(records, deadline)
+        return rent_prices, sale_prices, prob_sold, None, None, fallback
+    bundle = registry.current()
+    if _needs_fallback(deadline, len(records)):
+        return (*(await _run_fallback_async(bundle, records, quantiles)), np.ones(len(records), dtype=bool))
+    with metrics.stage("inference"):
+        outputs = await _infer(bundle, "run_intervals", records, quantiles=quantiles)
+    return (*outputs, np.zeros(len(records), dtype=bool))
+
+
+def _scored_by(fallback: bool) -> str:
+    return "fallback" if fallback else "full"
+
+
+def request_deadline(
+    deadline_ms: Optional[float] = Query(
+        None, gt=0, description="Latency budget in ms; past it the fallback model is used"
+    ),
+    x_deadline_ms: Optional[float] = Header(None, gt=0, description="Same as `deadline_ms`"),
+) -> Optional[float]:
+    """
+    Absolute deadline (`time.monotonic()`) of a request, from the `deadline_ms`
+    query parameter or the `X-Deadline-Ms` header; None without either.
+    """
+    budget = deadline_ms if deadline_ms is not None else x_deadline_ms
+    return None if budget is None else time.monotonic() + budget / 1000.0
+
+
+# in process mode, one batch in flight per worker (while they are all busy, requests queue up for the next batches)
+micro_batcher = MicroBatcher(
+    _submit_models, window_ms=MICRO_BATCH_WINDOW_MS, max_rows=MICRO_BATCH_MAX_ROWS,
+    max_in_flight=INFERENCE_WORKERS if INFERENCE_MODE == "process" else 1,
+)
+
+
+def _synthetic_records(bundle: ModelBundle, n: int) -> List[dict]:
+    """
+    Deterministic model inputs cycling through the fitted categories.
+    """
+    categories = bundle.rent_flat.encoder.categories
+    return [
+        {
+            "size_sqm": 30.0 + (i * 7) % 150,
+            "rooms": 1 + i % 5,
+            "floor": 1 + i % 12,
+            "year_built": 1970 + (i * 3) % 55,
+            **{col: values[i % len(values)] for col, values in categories.items()},
+        }
+        for i in range(n)
+    ]
+
+
+def warm_up() -> None:
+    """
+    Score synthetic batches through the configured engines (and every inference
+    worker) without touching the prediction cache.
+    """
+    global _warmed_up
+    bundle = registry.current()
+    started = time.perf_counter()
+    for n in WARMUP_BATCH_SIZES:
+        records = _synthetic_records(bundle, n)
+        if inference_pool.running:
+            for future in [inference_pool.submit(bundle, records) for _ in range(inference_pool.workers)]:
+                future.result()
+        else:
+            _run_inline(bundle, records)
+    _warmed_up = True
+    logger.info(f"Warm-up done in {time.perf_counter() - started:.2f}s (batch sizes {WARMUP_BATCH_SIZES})")
+
+
+def readiness() -> Dict[str, bool]:
+    """
+    Individual readiness checks of the prediction path; ready when all are True.
+    """
+    return {
+        "models_loaded": registry.status().get("version") is not None,
+        "locations_loaded": location_index.loaded,
+        "inference_pool": INFERENCE_MODE != "process" or inference_pool.running,
+        "warmed_up": _warmed_up,
+    }
+
+
+def startup() -> None:
+    """
+    Start the background services of the prediction path and warm the models
+    up (called from the app lifespan).
+    """
+    location_index.start()
+    comps_index.start()
+    registry.start()
+    if INFERENCE_MODE == "process":
+        inference_pool.start()
+    if MICRO_BATCH_ENABLED:
+        micro_batcher.start()
+    try:
+        warm_up()
+    except Exception as e:
+        # keep serving; /readyz reports the worker as not ready
+        logger.exception(f"Warm-up failed: {e}")
+
+
+def shutdown() -> None:
+    """
+    Stop the background services started by `startup`.
+    """
+    global _warmed_up
+    _warmed_up = False
+    micro_batcher.stop()
+    inference_pool.stop()
+    registry.stop()
+    comps_index.stop()
+    location_index.stop()
 
 
 @router.post(
     "/rent-cox",
     response_model=RentCoxPrediction,
+    response_model_exclude_none=True,
     summary="Predict monthly rent and probability of sale"
 )
-def predict_rent_and_cox(
+async def predict_rent_and_cox(
     data: PropertyBase,
-    db: Session = Depends(get_db)
+    quantiles: Optional[str] = Query(
+        None, description="Comma-separated quantiles of the per-tree price predictions, e.g. 0.1,0.5,0.9"
+    ),
+    deadline: Optional[float] = Depends(request_deadline),
 ):
     """
     Predicts:
@@ -79,61 +618,51 @@ def predict_rent_and_cox(
     
     The prediction relies on features like district, size, floor, renovation, etc.
 
+    With `?quantiles=0.1,0.5,0.9` the spread of the forest's trees is returned too.
+    With `?deadline_ms=` (or `X-Deadline-Ms`) the fallback model answers if the
+    full models are not expected to make it; `scored_by` says which one did.
+
     Returns:
         dict: Contains predicted rent price and probability of sale.
     """
-    try:
-        # — prepare X for price models —
-        X = _to_df(data)
-        loc = db.query(Location).filter(Location.location_id == data.location_id).first()
-        if not loc:
-            raise HTTPException(status_code=400, detail="Invalid location_id")
-        X["district"] = loc.district
-
-        # — predict both rent & sale for Cox inputs —
-        rent_price = float(rent_model.predict(X)[0])
-        sell_price = float(sales_model.predict(X)[0])
-
-        # — build the Cox input frame —
-        df_cox = pd.DataFrame([data.dict()])[[
-            "size_sqm", "rooms", "floor", "year_built"
-        ]].copy()
-        df_cox["district"] = loc.district
-        df_cox["renovation_status"] = data.renovation_status
-        df_cox["predicted_sell_price"] = sell_price
-        df_cox["predicted_rent_price"] = rent_price
-
-        # — one-hot encode and align to model covariates —
-        df_encoded = pd.get_dummies(
-            df_cox,
-            columns=CATEGORICAL_FEATURES,
-            drop_first=True
-        )
-        df_ready = df_encoded.reindex(columns=COX_FEATURES, fill_value=0)
+    with metrics.track_request("rent-cox"):
+        try:
+            qs = _parse_quantiles(quantiles)
 
-        # — predict survival → probability sold by t=150 days —
-        surv = cox_model.predict_survival_function(df_ready, times=[150])
-        prob = float(1 - surv.loc[150].values[0])
+            # — prepare the model input —
+            district = (await _lookup_districts_async([data.location_id]))[data.location_id]
 
-        return {
-            "predicted_rent_price": rent_price,
-            "prob_sold_within_5_months": prob
-        }
+            rent_prices, _, prob_sold, rent_q, _, fallback = await _score_with_intervals(
+                [_to_record(data, district)], qs, deadline
+            )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+            result = {
+                "predicted_rent_price": float(rent_prices[0]),
+                "prob_sold_within_5_months": float(prob_sold[0]),
+                "scored_by": _scored_by(fallback[0]),
+            }
+            if qs is not None:
+                result["predicted_rent_price_quantiles"] = _quantile_map(qs, rent_q[0])
+            return result
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post(
     "/sale-cox",
     response_model=SaleCoxPrediction,
+    response_model_exclude_none=True,
     summary="Predict sale price and probability of sale"
 )
-def predict_sale_and_cox(
+async def predict_sale_and_cox(
     data: PropertyBase,
-    db: Session = Depends(get_db)
+    quantiles: Optional[str] = Query(
+        None, description="Comma-separated quantiles of the per-tree price predictions, e.g. 0.1,0.5,0.9"
+    ),
+    deadline: Optional[float] = Depends(request_deadline),
 ):
     """
     Predicts:
@@ -142,48 +671,692 @@ def predict_sale_and_cox(
     
     The prediction incorporates price, location, size, and property condition.
 
+    With `?quantiles=0.1,0.5,0.9` the spread of the forest's trees is returned too.
+    With `?deadline_ms=` (or `X-Deadline-Ms`) the fallback model answers if the
+    full models are not expected to make it; `scored_by` says which one did.
+
     Returns:
         dict: Contains predicted sale price and probability of sale.
     """
-    try:
-        # — prepare X for price models —
-        X = _to_df(data)
-        loc = db.query(Location).filter(Location.location_id == data.location_id).first()
-        if not loc:
-            raise HTTPException(status_code=400, detail="Invalid location_id")
-        X["district"] = loc.district
-
-        # — predict both sale & rent for Cox inputs —
-        sell_price = float(sales_model.predict(X)[0])
-        rent_price = float(rent_model.predict(X)[0])
-
-        # — build the Cox input frame —
-        df_cox = pd.DataFrame([data.dict()])[[
-            "size_sqm", "rooms", "floor", "year_built"
-        ]].copy()
-        df_cox["district"] = loc.district
-        df_cox["renovation_status"] = data.renovation_status
-        df_cox["predicted_sell_price"] = sell_price
-        df_cox["predicted_rent_price"] = rent_price
-
-        # — one-hot encode and align to model covariates —
-        df_encoded = pd.get_dummies(
-            df_cox,
-            columns=CATEGORICAL_FEATURES,
-            drop_first=True
+    with metrics.track_request("sale-cox"):
+        try:
+            qs = _parse_quantiles(quantiles)
+
+            # — prepare the model input —
+            district = (await _lookup_districts_async([data.location_id]))[data.location_id]
+
+            _, sale_prices, prob_sold, _, sale_q, fallback = await _score_with_intervals(
+                [_to_record(data, district)], qs, deadline
+            )
+
+            result = {
+                "predicted_sale_price": float(sale_prices[0]),
+                "prob_sold_within_5_months": float(prob_sold[0]),
+                "scored_by": _scored_by(fallback[0]),
+            }
+            if qs is not None:
+                result["predicted_sale_price_quantiles"] = _quantile_map(qs, sale_q[0])
+            return result
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post(
+    "/batch",
+    response_model=List[BatchPrediction],
+    response_model_exclude_none=True,
+    summary="Predict rent, sale price and probability of sale for many properties"
+)
+async def predict_batch(
+    data: List[PropertyBase],
+    quantiles: Optional[str] = Query(
+        None, description="Comma-separated quantiles of the per-tree price predictions, e.g. 0.1,0.5,0.9"
+    ),
+    deadline: Optional[float] = Depends(request_deadline),
+):
+    """
+    Scores a whole portfolio in one call.
+
+    All `location_id`s are resolved in one pass over the location index and each model
+    (rent, sale, Cox) runs once over the stacked frame instead of once per row.
+    With `?quantiles=0.1,0.5,0.9` the spread of the forests' trees is returned too.
+    With `?deadline_ms=` (or `X-Deadline-Ms`) rows the full models are not expected
+    to score in time come from the fallback model; `scored_by` marks each row.
+
+    Returns:
+        List[dict]: One prediction per input property, in input order.
+    """
+    if not data:
+        return []
+    _check_batch_size(len(data))
+
+    with metrics.track_request("batch"):
+        try:
+            qs = _parse_quantiles(quantiles)
+
+            # — prepare the model inputs —
+            districts = await _lookup_districts_async([item.location_id for item in data])
+            records = [_to_record(item, districts[item.location_id]) for item in data]
+
+            rent_prices, sale_prices, prob_sold, rent_q, sale_q, fallback = await _score_with_intervals(
+                records, qs, deadline
+            )
+
+            results = [
+                {
+                    "property_id": item.property_id,
+                    "predicted_rent_price": float(rent),
+                    "predicted_sale_price": float(sale),
+                    "prob_sold_within_5_months": float(prob),
+                    "scored_by": _scored_by(used_fallback),
+                }
+                for item, rent, sale, prob, used_fallback in zip(data, rent_prices, sale_prices, prob_sold, fallback)
+            ]
+            if qs is not None:
+                for result, rent, sale in zip(results, rent_q, sale_q):
+                    result["predicted_rent_price_quantiles"] = _quantile_map(qs, rent)
+                    result["predicted_sale_price_quantiles"] = _quantile_map(qs, sale)
+            return results
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+def _curve_horizons(request: SurvivalCurveRequest) -> List[float]:
+    """
+    Horizons asked for by a survival-curve request, sorted and de-duplicated.
+
+    Raises:
+        HTTPException: 400 if both or neither forms are incomplete, a horizon is
+            not positive, or there are more than `MAX_CURVE_HORIZONS`.
+    """
+    grid = (request.horizon_start, request.horizon_stop, request.horizon_step)
+    if request.horizons is not None and any(v is not None for v in grid):
+        raise HTTPException(status_code=400, detail="Give either horizons or horizon_start/stop/step, not both")
+    if request.horizons is not None:
+        horizons = request.horizons
+    elif all(v is not None for v in grid):
+        start, stop, step = grid
+        if step <= 0 or stop < start:
+            raise HTTPException(status_code=400, detail="horizon_step must be > 0 and horizon_stop >= horizon_start")
+        if (stop - start) / step + 1 > MAX_CURVE_HORIZONS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_CURVE_HORIZONS} horizons per request")
+        # a small tolerance keeps `stop` in the grid despite floating point steps
+        horizons = np.arange(start, stop + step * 1e-9, step).tolist()
+    elif any(v is not None for v in grid):
+        raise HTTPException(status_code=400, detail="horizon_start, horizon_stop and horizon_step go together")
+    else:
+        horizons = DEFAULT_CURVE_HORIZONS
+
+    horizons = sorted(set(float(h) for h in horizons))
+    if not horizons or horizons[0] <= 0:
+        raise HTTPException(status_code=400, detail="Horizons must be a non-empty list of positive days")
+    if len(horizons) > MAX_CURVE_HORIZONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CURVE_HORIZONS} horizons per request")
+    return horizons
+
+
+@router.post(
+    "/survival-curve",
+    response_model=SurvivalCurveResponse,
+    summary="Probability of sale over many horizons and median days to sale"
+)
+async def predict_survival_curve(
+    request: SurvivalCurveRequest
+):
+    """
+    Returns, for one or many properties, the probability of being sold within each
+    requested horizon, the median expected days to sale, and the rent and sale prices.
+
+    The price forests and the Cox partial hazard are evaluated once per property; the
+    baseline cumulative hazard is then looked up for all horizons in one vectorized step.
+    Results are not cached.
+
+    Returns:
+        dict: `horizons` (sorted, in days) and one prediction per input property, in
+        input order, whose `prob_sold` is aligned with `horizons`.
+    """
+    with metrics.track_request("survival-curve"):
+        try:
+            horizons = _curve_horizons(request)
+            if not request.properties:
+                return {"horizons": horizons, "predictions": []}
+            _check_batch_size(len(request.properties))
+
+            # — prepare the model inputs —
+            data = request.properties
+            districts = await _lookup_districts_async([item.location_id for item in data])
+            records = [_to_record(item, districts[item.location_id]) for item in data]
+
+            bundle = registry.current()
+            with metrics.stage("inference"):
+                rent_prices, sale_prices, prob_sold, median_days = await _infer(
+                    bundle, "run_survival", records, horizons=horizons
+                )
+
+            return {
+                "horizons": horizons,
+                "predictions": [
+                    {
+                        "property_id": item.property_id,
+                        "predicted_rent_price": float(rent),
+                        "predicted_sale_price": float(sale),
+                        "median_days_to_sale": float(median) if np.isfinite(median) else None,
+                        "prob_sold": curve.tolist(),
+                    }
+                    for item, rent, sale, median, curve in zip(data, rent_prices, sale_prices, median_days, prob_sold)
+                ],
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+def _sweep_values(bundle: ModelBundle, request: WhatIfRequest) -> list:
+    """
+    Grid of values a what-if request sweeps `request.feature` over.
+
+    Numeric features take `values` or `start`/`stop`/`step`; categorical features take
+    `values` or default to every category the price models were fitted on.
+
+    Raises:
+        HTTPException: 400 on an unknown feature, an incomplete or empty grid,
+            non-numeric values for a numeric feature, or more than `MAX_SWEEP_POINTS`.
+    """
+    feature = request.feature
+    grid = (request.start, request.stop, request.step)
+    if feature not in SWEEP_NUMERIC_FEATURES + SWEEP_CATEGORICAL_FEATURES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot sweep {feature!r}; expected one of {SWEEP_NUMERIC_FEATURES + SWEEP_CATEGORICAL_FEATURES}",
         )
-        df_ready = df_encoded.reindex(columns=COX_FEATURES, fill_value=0)
+    if request.values is not None and any(v is not None for v in grid):
+        raise HTTPException(status_code=400, detail="Give either values or start/stop/step, not both")
+
+    if feature in SWEEP_CATEGORICAL_FEATURES:
+        if any(v is not None for v in grid):
+            raise HTTPException(status_code=400, detail=f"{feature} is categorical; give values")
+        values = request.values if request.values is not None else bundle.rent_flat.encoder.categories[feature]
+        values = [str(v) for v in values]
+    elif request.values is not None:
+        if any(isinstance(v, str) for v in request.values):
+            raise HTTPException(status_code=400, detail=f"{feature} is numeric; values must be numbers")
+        values = [float(v) for v in request.values]
+    elif all(v is not None for v in grid):
+        start, stop, step = grid
+        if step <= 0 or stop < start:
+            raise HTTPException(status_code=400, detail="step must be > 0 and stop >= start")
+        if (stop - start) / step + 1 > MAX_SWEEP_POINTS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_SWEEP_POINTS} points per sweep")
+        values = np.arange(start, stop + step * 1e-9, step).tolist()
+    else:
+        raise HTTPException(status_code=400, detail=f"Give values or start, stop and step for {feature}")
+
+    if not values:
+        raise HTTPException(status_code=400, detail="The sweep has no points")
+    if len(values) > MAX_SWEEP_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SWEEP_POINTS} points per sweep")
+    return values
+
+
+@router.post(
+    "/what-if",
+    response_model=WhatIfResponse,
+    summary="Sweep one feature of a property and predict every point"
+)
+async def predict_what_if(
+    request: WhatIfRequest
+):
+    """
+    Varies one model input of a base property over a set of values and returns
+    rent, sale price and probability of sale for each of them.
+
+    The location is resolved once and the grid is scored as one stacked batch (through
+    the prediction cache), so a sweep costs about as much as a few single predictions.
+
+    Returns:
+        dict: The swept feature and one point per value, in the order given.
+    """
+    with metrics.track_request("what-if"):
+        try:
+            base = request.base
+            bundle = registry.current()
+            values = _sweep_values(bundle, request)
+
+            # — prepare the model inputs —
+            district = (await _lookup_districts_async([base.location_id]))[base.location_id]
+            record = _to_record(base, district)
+            records = [{**record, request.feature: value} for value in values]
+
+            rent_prices, sale_prices, prob_sold, _ = await _score_records_async(records)
 
-        # — predict survival → probability sold by t=150 days —
-        surv = cox_model.predict_survival_function(df_ready, times=[150])
-        prob = float(1 - surv.loc[150].values[0])
+            return {
+                "property_id": base.property_id,
+                "feature": request.feature,
+                "points": [
+                    {
+                        "value": value,
+                        "predicted_rent_price": float(rent),
+                        "predicted_sale_price": float(sale),
+                        "prob_sold_within_5_months": float(prob)
+                    }
+                    for value, rent, sale, prob in zip(values, rent_prices, sale_prices, prob_sold)
+                ],
+            }
 
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+def _explanations(bundle: ModelBundle, data: List[PropertyBase], explained: dict) -> List[dict]:
+    """
+    Shape `run_explain` output into one `ExplainPrediction` dict per property.
+    """
+    def section(names: List[str], base: float, contributions: np.ndarray, prediction: float) -> dict:
         return {
-            "predicted_sale_price": sell_price,
-            "prob_sold_within_5_months": prob
+            "base_value": float(base),
+            "prediction": float(prediction),
+            "contributions": {name: float(c) for name, c in zip(names, contributions)},
         }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+    rent_names = bundle.rent_flat.encoder.raw_features
+    sale_names = bundle.sales_flat.encoder.raw_features
+    cox_names = bundle.cox_scorer.raw_features
+    (rent_base, rent_c), (sale_base, sale_c), (cox_base, cox_c) = (
+        explained["rent"], explained["sale"], explained["cox"]
+    )
+    return [
+        {
+            "property_id": item.property_id,
+            "prob_sold_within_5_months": float(explained["prob_sold"][i]),
+            "rent": section(rent_names, rent_base, rent_c[i], explained["rent_prices"][i]),
+            "sale": section(sale_names, sale_base, sale_c[i], explained["sale_prices"][i]),
+            "cox": section(cox_names, cox_base, cox_c[i], cox_base + cox_c[i].sum()),
+        }
+        for i, item in enumerate(data)
+    ]
+
+
+async def _explain(data: List[PropertyBase]) -> List[dict]:
+    """
+    Resolve locations and explain all properties in one `run_explain` call.
+    """
+    # — prepare the model inputs —
+    districts = await _lookup_districts_async([item.location_id for item in data])
+    records = [_to_record(item, districts[item.location_id]) for item in data]
+
+    bundle = registry.current()
+    with metrics.stage("inference"):
+        explained = await _infer(bundle, "run_explain", records)
+    return _explanations(bundle, data, explained)
+
+
+@router.post(
+    "/explain",
+    response_model=ExplainPrediction,
+    summary="Explain the rent, sale and Cox predictions of a property"
+)
+async def explain_prediction(
+    data: PropertyBase
+):
+    """
+    Per-feature contributions behind the predictions of `/predict/rent-cox` and `/predict/sale-cox`.
+
+    For the rent and sale forests, the change in node value at each split on a row's
+    path through each tree is credited to the split feature and averaged over trees, so
+    `base_value + sum(contributions)` is the predicted price. For the Cox model the
+    contributions are `x_i·β_i` on the log partial hazard. One-hot columns are summed
+    into their categorical feature.
+
+    Returns:
+        dict: Contributions of the three models and the probability of sale.
+    """
+    with metrics.track_request("explain"):
+        try:
+            return (await _explain([data]))[0]
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post(
+    "/explain/batch",
+    response_model=List[ExplainPrediction],
+    summary="Explain the predictions of many properties"
+)
+async def explain_batch(
+    data: List[PropertyBase]
+):
+    """
+    `/predict/explain` for a list of properties; all trees are walked once for the
+    whole batch.
+
+    Returns:
+        List[dict]: One explanation per input property, in input order.
+    """
+    if not data:
+        return []
+    _check_batch_size(len(data))
+
+    with metrics.track_request("explain-batch"):
+        try:
+            return await _explain(data)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+def check_comps_k(k: int) -> int:
+    """
+    Raises:
+        HTTPException: 400 unless 1 <= k <= `COMPS_MAX_K`.
+    """
+    if not 1 <= k <= COMPS_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {COMPS_MAX_K}")
+    return k
+
+
+@router.post(
+    "/comps",
+    response_model=PredictionWithComps,
+    response_model_exclude={
+        "prediction": {"predicted_rent_price_quantiles", "predicted_sale_price_quantiles", "scored_by"}
+    },
+    summary="Predict a property and list its most comparable listings"
+)
+async def predict_with_comps(
+    data: PropertyBase,
+    k: int = Query(COMPS_DEFAULT_K, description="Number of comparable listings")
+):
+    """
+    Rent, sale price and probability of sale of a property, together with the `k`
+    existing listings closest to it: same district and property type, nearest in size,
+    rooms, year built and renovation (each z-scored over all listings).
+
+    Comps come from an in-memory KD-tree per (district, type), so no table scan runs
+    per request.
+
+    Returns:
+        dict: `prediction` and `comps` (nearest first, with their estimated prices).
+    """
+    with metrics.track_request("comps"):
+        try:
+            check_comps_k(k)
+
+            # — prepare the model input —
+            district = (await _lookup_districts_async([data.location_id]))[data.location_id]
+            record = _to_record(data, district)
+
+            rent_prices, sale_prices, prob_sold, _ = await _score_records_async([record])
+            with metrics.stage("comps_query"):
+                comps = comps_index.query(record, k, exclude_id=data.property_id)
+
+            return {
+                "prediction": {
+                    "property_id": data.property_id,
+                    "predicted_rent_price": float(rent_prices[0]),
+                    "predicted_sale_price": float(sale_prices[0]),
+                    "prob_sold_within_5_months": float(prob_sold[0])
+                },
+                "comps": comps,
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/comps/index", summary="Comparable-listings index statistics")
+def get_comps_stats():
+    """
+    Returns size, partitioning and refresh state of the comps index.
+    """
+    return comps_index.stats()
+
+
+def _prepare_chunk(chunk: List[tuple], districts: Dict[int, str]):
+    """
+    Output rows for a chunk of parsed rows, with errors for bad rows and unknown
+    locations, and the model inputs of the rest.
+
+    Returns:
+        tuple: (output rows, [(index into output rows, record)] to score).
+    """
+    out, scorable = [], []
+    for row, record, error in chunk:
+        if error is None and record["location_id"] not in districts:
+            error = f"invalid location_id {record['location_id']}"
+        out.append({"row": row, "property_id": record.get("property_id") if record else None, "error": error})
+        if error is None:
+            scorable.append((len(out) - 1, {**record, "district": districts[record["location_id"]]}))
+    return out, scorable
+
+
+def _fill_chunk(out: List[dict], scorable: List[tuple], outputs) -> List[dict]:
+    for (i, _), rent, sale, prob in zip(scorable, *outputs):
+        out[i].update(
+            predicted_rent_price=float(rent),
+            predicted_sale_price=float(sale),
+            prob_sold_within_5_months=float(prob),
+        )
+    return out
+
+
+async def _score_chunk(bundle: ModelBundle, chunk: List[tuple]) -> List[dict]:
+    """
+    Score one chunk of parsed stream rows; bad rows and unknown locations become
+    error rows instead of failing the stream.
+    """
+    location_ids = [record["location_id"] for _, record, error in chunk if error is None]
+    districts = await location_index.lookup_async(location_ids)
+
+    out, scorable = _prepare_chunk(chunk, districts)
+    if scorable:
+        try:
+            outputs = await _infer(bundle, "run_models", [r for _, r in scorable])
+        except Exception as e:
+            logger.exception(f"Stream chunk of {len(scorable)} rows failed: {e}")
+            for i, _ in scorable:
+                out[i]["error"] = str(e)
+            return out
+        _fill_chunk(out, scorable, outputs)
+    return out
+
+
+def score_job_chunk(chunk: List[tuple]):
+    """
+    Blocking `_score_chunk` for the job threads (see `jobs.JobRunner`), with the
+    current models. A model failure raises instead of marking the rows.
+
+    Returns:
+        tuple: (output rows, model version).
+    """
+    bundle = registry.current()
+    location_ids = [record["location_id"] for _, record, error in chunk if error is None]
+    out, scorable = _prepare_chunk(chunk, location_index.lookup(location_ids))
+    if scorable:
+        _fill_chunk(out, scorable, _run_models(bundle, [r for _, r in scorable]))
+    return out, bundle.version
+
+
+@router.post(
+    "/stream",
+    summary="Score a CSV or NDJSON upload, streaming results back",
+    response_class=stream_scoring.UploadStreamingResponse,
+)
+async def predict_stream(
+    request: Request,
+    input_format: Optional[str] = Query(None, alias="input", description="csv or ndjson (default: from Content-Type)"),
+    output_format: Optional[str] = Query(None, alias="output", description="csv or ndjson (default: as the input)"),
+):
+    """
+    Scores an arbitrarily large upload with constant memory.
+
+    The request body (CSV with a header row, or one JSON object per line) is read
+    as it arrives and scored in chunks; each chunk's results are streamed back as
+    soon as it is done, while the next chunk is being read. Rows need `location_id`,
+    `size_sqm`, `rooms`, `floor`, `year_built` and `renovation_status`; `property_id`
+    is echoed if present. Rows that cannot be scored get an `error` instead of
+    predictions. Results bypass the prediction cache.
+
+    Returns:
+        UploadStreamingResponse: One output row per input row, in input order.
+    """
+    fmt = (input_format or stream_scoring.format_from_content_type(request.headers.get("content-type")) or "").lower()
+    if fmt not in stream_scoring.FORMATS:
+        raise HTTPException(status_code=400, detail="Send Content-Type text/csv or application/x-ndjson, or ?input=")
+    out_fmt = (output_format or fmt).lower()
+    if out_fmt not in stream_scoring.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown output format {out_fmt!r}")
+
+    bundle = registry.current()
+    parser = stream_scoring.RowParser(fmt)
+    chunks = stream_scoring.iter_chunks(
+        stream_scoring.iter_lines(request.stream(), STREAM_MAX_LINE_BYTES),
+        parser,
+        first_chunk_rows=STREAM_FIRST_CHUNK_ROWS,
+        chunk_rows=STREAM_CHUNK_ROWS,
+    )
+
+    # set when the client goes away, mid-upload or while results are streamed back
+    gone = asyncio.Event()
+
+    async def read_ahead(queue: asyncio.Queue) -> None:
+        # parses the next chunk while the current one is scored; the queue bounds memory.
+        # Always ends the queue with None, or with the error that stopped the upload.
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except ValueError as e:
+            # malformed stream (bad header, oversized line): the status is already sent
+            logger.warning(f"Stream scoring aborted after {parser.rows} rows: {e}")
+            await queue.put(e)
+        except BaseException as e:
+            # ClientDisconnect, or the task was cancelled: nothing more will be sent
+            gone.set()
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(e)
+            if not isinstance(e, Exception):
+                raise
+            logger.info(f"Stream scoring client went away after {parser.rows} rows")
+            return
+        await queue.put(None)
+        # the upload is complete: keep listening, so a client that leaves while
+        # the last chunks are scored stops the scoring
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        gone.set()
+        logger.info(f"Stream scoring client went away after {parser.rows} rows")
+
+    async def body():
+        with metrics.track_request("stream"):
+            yield stream_scoring.format_header(out_fmt)
+            queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+            reader = asyncio.ensure_future(read_ahead(queue))
+            try:
+                while (chunk := await queue.get()) is not None and not gone.is_set():
+                    if isinstance(chunk, ValueError):
+                        yield stream_scoring.format_rows(out_fmt, [{"row": parser.rows + 1, "error": str(chunk)}])
+                        continue
+                    if isinstance(chunk, BaseException):
+                        break
+                    rows = await _score_chunk(bundle, chunk)
+                    if gone.is_set():
+                        break
+                    yield stream_scoring.format_rows(out_fmt, rows)
+            finally:
+                reader.cancel()
+
+    media_type = "text/csv" if out_fmt == "csv" else "application/x-ndjson"
+    return stream_scoring.UploadStreamingResponse(body(), media_type=media_type)
+
+
+@router.get("/cache", summary="Prediction cache statistics")
+def get_cache_stats():
+    """
+    Returns hit/miss counters, occupancy and limits of the prediction cache.
+    """
+    return prediction_cache.stats()
+
+
+@router.delete("/cache", summary="Empty the prediction cache")
+def clear_cache():
+    """
+    Drops every cached prediction; counters are kept.
+    """
+    prediction_cache.clear()
+    return prediction_cache.stats()
+
+
+@router.post("/locations/refresh", summary="Reload the location → district index")
+def refresh_locations():
+    """
+    Reloads the in-memory location index from the database right away.
+
+    Returns:
+        dict: Index statistics; `refreshed` is False if the database query failed
+        and the previous map is still being served.
+    """
+    refreshed = location_index.refresh()
+    return {"refreshed": refreshed, **location_index.stats()}
+
+
+@router.get("/model", summary="Active model version")
+def get_model_version():
+    """
+    Returns the version (content hash) of the model artifacts being served,
+    their feature lists, and the state of the directory watcher.
+    """
+    return registry.status()
+
+
+@router.post("/model/reload", summary="Reload model artifacts now")
+def reload_models():
+    """
+    Loads and validates the artifacts currently on disk and swaps them in
+    without waiting for the next directory poll.
+
+    Returns:
+        dict: Registry status; `reloaded` is False if the artifacts are unchanged
+        or failed validation (see `last_error`).
+    """
+    reloaded = registry.reload()
+    return {"reloaded": reloaded, **registry.status()}
+
+
+@router.get("/fallback", summary="Deadline fallback statistics")
+def get_fallback_stats():
+    """
+    Returns the cost model behind deadline decisions (expected queue wait and
+    full-model time per batch size) and the fallback forests' size.
+    """
+    return {
+        "enabled": FALLBACK_ENABLED,
+        "trees": scoring.FALLBACK_TREES,
+        "max_depth": scoring.FALLBACK_MAX_DEPTH,
+        **cost_model.stats(),
+    }
+
+
+@router.get("/batcher", summary="Micro-batching statistics")
+def get_batcher_stats():
+    """
+    Returns batch-size distribution and queueing delay of the micro-batcher
+    (all zero when `MICRO_BATCH_ENABLED` is off).
+    """
+    return micro_batcher.stats()
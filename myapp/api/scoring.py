@@ -0,0 +1,268 @@
+# backend/scoring.py
+
+"""
+Model scoring shared by the API process and the inference worker processes.
+
+Importing this module has no side effects beyond reading the engine settings
+from the environment: no models are loaded and no database is touched, so it
+is safe to import from a freshly spawned worker.
+"""
+
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from metrics import StageTimings
+from model_registry import ModelBundle
+
+# Features that need one-hot encoding before passing to Cox model
+CATEGORICAL_FEATURES = ["district", "renovation_status"]
+
+# Horizon (in days) of the sale probability returned by every endpoint
+SALE_HORIZON_DAYS = 150
+
+# Raw columns the Cox model is built from (before one-hot encoding)
+COX_INPUT_COLUMNS = ["size_sqm", "rooms", "floor", "year_built", "district", "renovation_status"]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Cox engine: "lifelines" calls `predict_survival_function` per request,
+# "numpy" uses the closed-form scorer compiled once per model version.
+# ────────────────────────────────────────────────────────────────────────────────
+COX_ENGINE = os.getenv("COX_ENGINE", "lifelines").lower()
+if COX_ENGINE not in ("lifelines", "numpy"):
+    raise ValueError(f"Unknown COX_ENGINE {COX_ENGINE!r}; expected 'lifelines' or 'numpy'.")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Price engine: "pipeline" calls the sklearn Pipelines on a DataFrame,
+# "flat" walks forests flattened into NumPy node arrays once per model version.
+# ────────────────────────────────────────────────────────────────────────────────
+PRICE_ENGINE = os.getenv("PRICE_ENGINE", "pipeline").lower()
+if PRICE_ENGINE not in ("pipeline", "flat"):
+    raise ValueError(f"Unknown PRICE_ENGINE {PRICE_ENGINE!r}; expected 'pipeline' or 'flat'.")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Fallback used when a request's deadline cannot be met by the full models: the
+# first FALLBACK_TREES trees of each forest, cut off at FALLBACK_MAX_DEPTH.
+# ────────────────────────────────────────────────────────────────────────────────
+FALLBACK_TREES = int(os.getenv("FALLBACK_TREES", "10"))
+FALLBACK_MAX_DEPTH = int(os.getenv("FALLBACK_MAX_DEPTH", "8"))
+
+
+def _predict_prices(bundle: ModelBundle, records: List[dict], t: StageTimings):
+    """
+    Rent and sale predictions with the configured price engine.
+    """
+    if PRICE_ENGINE == "flat":
+        with t.stage("rent_model"):
+            rent_prices = bundle.rent_flat.predict(records)
+        with t.stage("sale_model"):
+            sale_prices = bundle.sales_flat.predict(records)
+    else:
+        with t.stage("build_frame"):
+            X = pd.DataFrame(records)
+        with t.stage("rent_model"):
+            rent_prices = bundle.rent_model.predict(X)
+        with t.stage("sale_model"):
+            sale_prices = bundle.sales_model.predict(X)
+    return np.asarray(rent_prices), np.asarray(sale_prices)
+
+
+def _cox_input(bundle: ModelBundle, records: List[dict], rent_prices, sale_prices, t: StageTimings):
+    """
+    Encoded Cox covariates: a matrix for the NumPy Cox engine, a DataFrame for lifelines.
+    """
+    with t.stage("cox_encode"):
+        # — build the Cox input columns —
+        cox_columns = {col: [r[col] for r in records] for col in COX_INPUT_COLUMNS}
+        cox_columns["predicted_sell_price"] = sale_prices
+        cox_columns["predicted_rent_price"] = rent_prices
+
+        if COX_ENGINE == "numpy":
+            return bundle.cox_scorer.design_matrix(cox_columns)
+        # — one-hot encode and align to model covariates —
+        # (the reference category dropped at training time is simply absent from the covariates)
+        df_encoded = pd.get_dummies(pd.DataFrame(cox_columns), columns=CATEGORICAL_FEATURES)
+        return df_encoded.reindex(columns=bundle.cox_features, fill_value=0)
+
+
+def _prob_sold(bundle: ModelBundle, cox_input, t: StageTimings) -> np.ndarray:
+    """
+    Probability of sale within `SALE_HORIZON_DAYS`.
+    """
+    with t.stage("cox_model"):
+        if COX_ENGINE == "numpy":
+            # — closed form: 1 - S0(t)^exp(x·β) —
+            return bundle.cox_scorer.prob_sold(cox_input)[:, 0]
+        # — predict survival → probability sold by the horizon —
+        surv = bundle.cox_model.predict_survival_function(cox_input, times=[SALE_HORIZON_DAYS])
+        return 1 - surv.loc[SALE_HORIZON_DAYS].values
+
+
+def run_models(bundle: ModelBundle, records: List[dict], timings: Optional[StageTimings] = None):
+    """
+    Run the rent, sale and Cox models once over a whole batch of records.
+
+    Args:
+        bundle (ModelBundle): Model version to score with.
+        records (List[dict]): One dict per property, as built by `_to_record`.
+        timings (StageTimings, optional): Receives the seconds spent in each stage.
+
+    Returns:
+        tuple: (rent_prices, sale_prices, prob_sold) as NumPy arrays aligned with records.
+    """
+    t = timings if timings is not None else StageTimings()
+    rent_prices, sale_prices = _predict_prices(bundle, records, t)
+    cox_input = _cox_input(bundle, records, rent_prices, sale_prices, t)
+    return rent_prices, sale_prices, np.asarray(_prob_sold(bundle, cox_input, t))
+
+
+def run_survival(bundle: ModelBundle, records: List[dict], horizons: Sequence[float],
+                 timings: Optional[StageTimings] = None):
+    """
+    Prices, sale probability at every horizon and median time to sale, with the
+    forests and the Cox partial hazard evaluated once per record.
+
+    Args:
+        bundle (ModelBundle): Model version to score with.
+        records (List[dict]): One dict per property, as built by `_to_record`.
+        horizons (Sequence[float]): Horizons in days.
+        timings (StageTimings, optional): Receives the seconds spent in each stage.
+
+    Returns:
+        tuple: (rent_prices, sale_prices, prob_sold, median_days) where `prob_sold`
+        has shape (n_records, n_horizons) and `median_days` is +inf when the
+        survival curve never drops to 0.5.
+    """
+    t = timings if timings is not None else StageTimings()
+    rent_prices, sale_prices = _predict_prices(bundle, records, t)
+    cox_input = _cox_input(bundle, records, rent_prices, sale_prices, t)
+
+    with t.stage("cox_model"):
+        if COX_ENGINE == "numpy":
+            scorer = bundle.cox_scorer
+            partial_hazard = scorer.partial_hazard(cox_input)
+            prob_sold = scorer.prob_sold_at(partial_hazard, horizons)
+            median_days = scorer.median_time(partial_hazard)
+        else:
+            surv = bundle.cox_model.predict_survival_function(cox_input, times=list(horizons))
+            prob_sold = 1 - surv.values.T
+            median_days = np.asarray(bundle.cox_model.predict_median(cox_input), dtype=float).reshape(-1)
+
+    return rent_prices, sale_prices, np.asarray(prob_sold), median_days
+
+
+def run_intervals(bundle: ModelBundle, records: List[dict], quantiles: Sequence[float],
+                  timings: Optional[StageTimings] = None):
+    """
+    `run_models` plus quantiles of the per-tree rent and sale predictions.
+
+    The per-tree outputs always come from the flattened forests, which walk every
+    tree in one vectorized pass whatever `PRICE_ENGINE` is; their mean is the
+    forest prediction, so the point estimates equal `run_models`.
+
+    Args:
+        bundle (ModelBundle): Model version to score with.
+        records (List[dict]): One dict per property, as built by `_to_record`.
+        quantiles (Sequence[float]): Quantiles in [0, 1].
+        timings (StageTimings, optional): Receives the seconds spent in each stage.
+
+    Returns:
+        tuple: (rent_prices, sale_prices, prob_sold, rent_quantiles, sale_quantiles);
+        the quantile arrays have shape (n_records, n_quantiles).
+    """
+    t = timings if timings is not None else StageTimings()
+    with t.stage("rent_model"):
+        rent_prices, rent_quantiles = bundle.rent_flat.predict_quantiles(records, quantiles)
+    with t.stage("sale_model"):
+        sale_prices, sale_quantiles = bundle.sales_flat.predict_quantiles(records, quantiles)
+    cox_input = _cox_input(bundle, records, rent_prices, sale_prices, t)
+    prob_sold = np.asarray(_prob_sold(bundle, cox_input, t))
+    return rent_prices, sale_prices, prob_sold, rent_quantiles, sale_quantiles
+
+
+def run_explain(bundle: ModelBundle, records: List[dict], timings: Optional[StageTimings] = None):
+    """
+    Predictions plus per-feature contributions for every record.
+
+    Forest contributions are path-based (see `FlatForest.contributions`) and come
+    from the flattened forests whatever `PRICE_ENGINE` is; their bias plus sum is
+    the forest prediction. Cox contributions are x_i·β_i on the log partial hazard.
+
+    Args:
+        bundle (ModelBundle): Model version to score with.
+        records (List[dict]): One dict per property, as built by `_to_record`.
+        timings (StageTimings, optional): Receives the seconds spent in each stage.
+
+    Returns:
+        dict: `rent`, `sale` and `cox`, each `(base, contributions)` with
+        contributions of shape (n_records, n_raw_features), plus `rent_prices`,
+        `sale_prices` and `prob_sold`.
+    """
+    t = timings if timings is not None else StageTimings()
+    with t.stage("rent_explain"):
+        rent_bias, rent_contributions, rent_prices = bundle.rent_flat.explain(records)
+    with t.stage("sale_explain"):
+        sale_bias, sale_contributions, sale_prices = bundle.sales_flat.explain(records)
+
+    cox_input = _cox_input(bundle, records, rent_prices, sale_prices, t)
+    prob_sold = np.asarray(_prob_sold(bundle, cox_input, t))
+    with t.stage("cox_explain"):
+        if COX_ENGINE != "numpy":
+            cox_input = cox_input.values
+        cox = bundle.cox_scorer.contributions(np.asarray(cox_input, dtype=float))
+
+    return {
+        "rent": (rent_bias, rent_contributions),
+        "sale": (sale_bias, sale_contributions),
+        "cox": cox,
+        "rent_prices": rent_prices,
+        "sale_prices": sale_prices,
+        "prob_sold": prob_sold,
+    }
+
+
+def run_fallback(bundle: ModelBundle, records: List[dict], quantiles: Optional[Sequence[float]] = None,
+                 timings: Optional[StageTimings] = None):
+    """
+    Cheap stand-in for `run_models` / `run_intervals` when a deadline is at risk.
+
+    Prices come from shallow views of the flattened forests (see
+    `FlatForest.shallow`), whatever `PRICE_ENGINE` is; the sale probability
+    comes from the closed-form Cox scorer, whatever `COX_ENGINE` is, and is
+    exact given those prices.
+
+    Args:
+        bundle (ModelBundle): Model version to score with.
+        records (List[dict]): One dict per property, as built by `_to_record`.
+        quantiles (Sequence[float], optional): Quantiles of the shallow trees' outputs.
+        timings (StageTimings, optional): Receives the seconds spent in each stage.
+
+    Returns:
+        tuple: (rent_prices, sale_prices, prob_sold, rent_quantiles, sale_quantiles);
+        the quantile arrays are None without `quantiles`.
+    """
+    t = timings if timings is not None else StageTimings()
+    rent_q = sale_q = None
+    rent_flat = bundle.rent_flat.shallow(FALLBACK_TREES, FALLBACK_MAX_DEPTH)
+    sales_flat = bundle.sales_flat.shallow(FALLBACK_TREES, FALLBACK_MAX_DEPTH)
+    with t.stage("rent_fallback"):
+        if quantiles is None:
+            rent_prices = rent_flat.predict(records)
+        else:
+            rent_prices, rent_q = rent_flat.predict_quantiles(records, quantiles)
+    with t.stage("sale_fallback"):
+        if quantiles is None:
+            sale_prices = sales_flat.predict(records)
+        else:
+            sale_prices, sale_q = sales_flat.predict_quantiles(records, quantiles)
+
+    with t.stage("cox_encode"):
+        cox_columns = {col: [r[col] for r in records] for col in COX_INPUT_COLUMNS}
+        cox_columns["predicted_sell_price"] = sale_prices
+        cox_columns["predicted_rent_price"] = rent_prices
+        X = bundle.cox_scorer.design_matrix(cox_columns)
+    with t.stage("cox_model"):
+        prob_sold = bundle.cox_scorer.prob_sold(X)[:, 0]
+    return rent_prices, sale_prices, prob_sold, rent_q, sale_q
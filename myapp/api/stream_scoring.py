@@ -0,0 +1,202 @@
+# backend/stream_scoring.py
+
+"""
+Parsing and formatting for streamed bulk scoring (`POST /predict/stream`).
+
+The upload is consumed as an async stream of byte blocks and cut into lines,
+lines into chunks of parsed rows; only one chunk is held at a time, so memory
+does not depend on the size of the upload. Every input line is expected to
+hold one record (CSV fields with embedded newlines are not supported).
+"""
+
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+
+FORMATS = ("csv", "ndjson")
+
+# Columns a row needs for scoring, and how to read them
+REQUIRED_COLUMNS = {
+    "location_id": int,
+    "size_sqm": float,
+    "rooms": int,
+    "floor": int,
+    "year_built": int,
+    "renovation_status": str,
+}
+OPTIONAL_COLUMNS = {"property_id": int}
+
+OUTPUT_COLUMNS = [
+    "row", "property_id", "predicted_rent_price", "predicted_sale_price", "prob_sold_within_5_months", "error",
+]
+
+# (1-based data row number, parsed record or None, error message or None)
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+    `StreamingResponse` whose body may still be reading the request body.
+
+    Under ASGI < 2.4 the stock class listens for a client disconnect by calling
+    `receive()` while it streams, which would swallow the upload chunks the body
+    generator is waiting for. The body generator watches for the disconnect
+    itself instead: its reader sees `ClientDisconnect` while reading the upload,
+    or the `http.disconnect` message once the upload is complete, and the body
+    stops scoring (see `predict_stream`).
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def format_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """
+    "csv" or "ndjson" for a request Content-Type, None if it is neither.
+    """
+    media = (content_type or "").split(";")[0].strip().lower()
+    if media in ("text/csv", "application/csv"):
+        return "csv"
+    if media in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"):
+        return "ndjson"
+    return None
+
+
+async def iter_lines(blocks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[str]:
+    """
+    Decode a UTF-8 byte stream into lines without their terminators; blank lines are skipped.
+
+    Raises:
+        ValueError: If a line grows beyond `max_line_bytes`.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for block in blocks:
+        pending += decoder.decode(block)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line = line.rstrip("\r")
+            if line.strip():
+                yield line
+        if len(pending) > max_line_bytes:
+            raise ValueError(f"Line longer than {max_line_bytes} bytes")
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+
+def parse_record(raw: Dict[str, object]) -> dict:
+    """
+    Typed record from raw CSV strings or JSON values.
+
+    Raises:
+        ValueError: If a required column is missing or a value has the wrong type.
+    """
+    record = {}
+    for col, cast in REQUIRED_COLUMNS.items():
+        value = raw.get(col)
+        if value is None or value == "":
+            raise ValueError(f"missing {col}")
+        try:
+            # "3.0" in a CSV is a valid int column
+            record[col] = cast(float(value)) if cast is int else cast(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid {col} {value!r}")
+    for col, cast in OPTIONAL_COLUMNS.items():
+        value = raw.get(col)
+        try:
+            record[col] = None if value is None or value == "" else cast(float(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid {col} {value!r}")
+    return record
+
+
+class RowParser:
+    """
+    Turns input lines into records; the first CSV line is the header.
+    """
+
+    def __init__(self, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
+        self.fmt = fmt
+        self.header: Optional[List[str]] = None
+        self.rows = 0
+
+    def parse(self, line: str) -> Optional[ParsedRow]:
+        """
+        Returns:
+            ParsedRow, or None for the CSV header line.
+
+        Raises:
+            ValueError: If the CSV header lacks a required column.
+        """
+        if self.fmt == "csv":
+            fields = next(csv.reader([line]))
+            if self.header is None:
+                self.header = [f.strip() for f in fields]
+                missing = sorted(set(REQUIRED_COLUMNS) - set(self.header))
+                if missing:
+                    raise ValueError(f"CSV header lacks columns {missing}")
+                return None
+            self.rows += 1
+            if len(fields) != len(self.header):
+                return self.rows, None, f"expected {len(self.header)} fields, got {len(fields)}"
+            raw = dict(zip(self.header, fields))
+        else:
+            self.rows += 1
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                return self.rows, None, f"invalid JSON: {e.msg}"
+            if not isinstance(raw, dict):
+                return self.rows, None, "expected a JSON object"
+        try:
+            return self.rows, parse_record(raw), None
+        except ValueError as e:
+            return self.rows, None, str(e)
+
+
+async def iter_chunks(lines: AsyncIterator[str], parser: RowParser, first_chunk_rows: int,
+                      chunk_rows: int) -> AsyncIterator[List[ParsedRow]]:
+    """
+    Group parsed rows into chunks: a small first one (for a quick first result),
+    then `chunk_rows` each.
+    """
+    chunk: List[ParsedRow] = []
+    limit = first_chunk_rows
+    async for line in lines:
+        parsed = parser.parse(line)
+        if parsed is None:
+            continue
+        chunk.append(parsed)
+        if len(chunk) >= limit:
+            yield chunk
+            chunk, limit = [], chunk_rows
+    if chunk:
+        yield chunk
+
+
+def format_header(fmt: str) -> str:
+    if fmt == "csv":
+        return format_rows(fmt, [dict(zip(OUTPUT_COLUMNS, OUTPUT_COLUMNS))])
+    return ""
+
+
+def format_rows(fmt: str, rows: Iterable[dict]) -> str:
+    """
+    Serialize output rows (keys from `OUTPUT_COLUMNS`) as CSV or NDJSON lines.
+    """
+    if fmt == "ndjson":
+        return "".join(json.dumps({k: v for k, v in row.items() if v is not None}) + "\n" for row in rows)
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for row in rows:
+        writer.writerow(["" if row.get(col) is None else row[col] for col in OUTPUT_COLUMNS])
+    return out.getvalue()
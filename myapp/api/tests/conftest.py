@@ -0,0 +1,50 @@
+"""
+Shared fixtures: small models trained like `model/main_model.py` (see
+`benchmarks.fixtures`), built once per test session.
+
+Run from the `api/` directory:
+    $ python -m pytest tests
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import joblib
+import pytest
+
+API_DIR = Path(__file__).resolve().parents[1]
+if str(API_DIR) not in sys.path:
+    sys.path.insert(0, str(API_DIR))
+
+# The DB layer reads DATABASE_URL at import; the model tests never touch it.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: starts server processes (deselect with -m 'not slow')")
+
+
+@pytest.fixture(scope="session")
+def fixture_env(tmp_path_factory):
+    """
+    `database_url` and `model_dir` of a seeded SQLite database and its trained models.
+    """
+    from benchmarks.fixtures import build
+
+    return build(tmp_path_factory.mktemp("fixtures"), n_properties=400, n_estimators=10)
+
+
+@pytest.fixture(scope="session")
+def models(fixture_env):
+    """
+    The three fitted artifacts, unpickled: `rent`, `sale` (Pipelines) and `cox` (CoxPHFitter).
+    """
+    from model_registry import COX_FILE, RENT_FILE, SALE_FILE
+
+    model_dir = Path(fixture_env["model_dir"])
+    return {
+        "rent": joblib.load(model_dir / RENT_FILE),
+        "sale": joblib.load(model_dir / SALE_FILE),
+        "cox": joblib.load(model_dir / COX_FILE),
+    }
@@ -0,0 +1,57 @@
+"""
+Resident memory per worker of the memory-mapped (`npy`) model artifacts, next
+to pickled ones (see `benchmarks.memory`): workers loading the same `.npy`
+files share one page-cache copy, so each one's share of it shrinks as workers
+are added.
+"""
+
+import os
+
+import joblib
+import pytest
+
+import flat_artifacts
+from benchmarks.memory import measure
+from model_registry import COX_FILE, RENT_FILE, SALE_FILE, _content_version
+from scoring import CATEGORICAL_FEATURES
+
+WORKERS = 3
+ROWS = 64
+
+pytestmark = [
+    pytest.mark.slow,
+    pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux /proc smaps_rollup"),
+]
+
+
+@pytest.fixture(scope="module")
+def artifacts(tmp_path_factory):
+    """
+    Pickled models large enough for the shared pages to stand out, and their `npy` conversion.
+    """
+    from benchmarks.fixtures import build
+
+    workdir = tmp_path_factory.mktemp("memory")
+    model_dir = workdir / "models"
+    build(workdir, n_properties=3000, n_estimators=40)
+    npy_dir = workdir / "npy"
+    flat_artifacts.write(
+        npy_dir,
+        version=_content_version(model_dir),
+        rent_model=joblib.load(model_dir / RENT_FILE),
+        sales_model=joblib.load(model_dir / SALE_FILE),
+        cox_model=joblib.load(model_dir / COX_FILE),
+        categorical=CATEGORICAL_FEATURES,
+    )
+    return model_dir, npy_dir
+
+
+def test_npy_workers_share_the_model_pages(artifacts):
+    model_dir, npy_dir = artifacts
+    alone = measure(npy_dir, "npy", 1, ROWS)
+    shared = measure(npy_dir, "npy", WORKERS, ROWS)
+    pickled = measure(model_dir, "pickle", WORKERS, ROWS)
+
+    # the mapped files are split between the workers; a pickle load is private to each
+    assert shared["mean_model_pss_mb"] < 0.6 * alone["mean_model_pss_mb"], (alone, shared)
+    assert shared["mean_model_pss_mb"] < 0.5 * pickled["mean_model_pss_mb"], (shared, pickled)
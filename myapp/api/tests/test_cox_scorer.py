@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cox_scorer import CoxScorer
+from scoring import CATEGORICAL_FEATURES, COX_INPUT_COLUMNS, SALE_HORIZON_DAYS
+
+TOLERANCE = 1e-9
+HORIZONS = [1, 30, 90, SALE_HORIZON_DAYS, 365, 1000]
+
+
+@pytest.fixture(scope="module")
+def cox_input(models):
+    """
+    Cox input columns for properties across every fitted category, plus one
+    unseen district, with predicted prices from the fixture's forests.
+    """
+    from benchmarks.fixtures import synthetic_records
+    from forest_engine import RecordEncoder
+
+    records = synthetic_records(RecordEncoder.from_pipeline(models["rent"]), 200)
+    records.append({**records[0], "district": "Nowhere"})
+    frame = pd.DataFrame(records)
+    columns = {col: frame[col].tolist() for col in COX_INPUT_COLUMNS}
+    columns["predicted_sell_price"] = models["sale"].predict(frame)
+    columns["predicted_rent_price"] = models["rent"].predict(frame)
+    return columns
+
+
+@pytest.fixture(scope="module")
+def lifelines_frame(models, cox_input):
+    # as the lifelines path of `scoring._cox_input`
+    encoded = pd.get_dummies(pd.DataFrame(cox_input), columns=CATEGORICAL_FEATURES)
+    return encoded.reindex(columns=list(models["cox"].params_.index), fill_value=0).astype(float)
+
+
+@pytest.fixture(scope="module")
+def scorer(models):
+    return CoxScorer(models["cox"], CATEGORICAL_FEATURES, horizons=HORIZONS)
+
+
+def test_design_matrix_matches_get_dummies(scorer, cox_input, lifelines_frame):
+    np.testing.assert_array_equal(scorer.design_matrix(cox_input), lifelines_frame.to_numpy())
+
+
+def test_prob_sold_matches_lifelines(models, scorer, cox_input, lifelines_frame):
+    expected = 1 - models["cox"].predict_survival_function(lifelines_frame, times=HORIZONS).values.T
+    actual = scorer.prob_sold(scorer.design_matrix(cox_input))
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+
+
+def test_survival_curve_matches_lifelines(models, scorer, cox_input, lifelines_frame):
+    # off the baseline timeline too, so interpolation is covered
+    horizons = np.linspace(0.5, 2000.5, 97)
+    expected = 1 - models["cox"].predict_survival_function(lifelines_frame, times=horizons).values.T
+    actual = scorer.prob_sold_at(scorer.partial_hazard(scorer.design_matrix(cox_input)), horizons)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+
+
+def test_median_matches_lifelines(models, scorer, cox_input, lifelines_frame):
+    expected = np.asarray(models["cox"].predict_median(lifelines_frame), dtype=float).reshape(-1)
+    actual = scorer.median_time(scorer.partial_hazard(scorer.design_matrix(cox_input)))
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_from_arrays_round_trip(scorer, cox_input):
+    rebuilt = CoxScorer.from_arrays(scorer.features, scorer.arrays(), CATEGORICAL_FEATURES, HORIZONS)
+    X = scorer.design_matrix(cox_input)
+    np.testing.assert_array_equal(rebuilt.prob_sold(X), scorer.prob_sold(X))
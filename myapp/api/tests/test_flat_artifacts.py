@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import flat_artifacts
+from benchmarks.fixtures import synthetic_records
+from cox_scorer import CoxScorer
+from model_registry import ModelBundle
+from scoring import CATEGORICAL_FEATURES, SALE_HORIZON_DAYS
+
+HORIZONS = [SALE_HORIZON_DAYS]
+
+
+@pytest.fixture()
+def published(tmp_path, models):
+    target = flat_artifacts.write(tmp_path, "v1", models["rent"], models["sale"], models["cox"], CATEGORICAL_FEATURES)
+    return tmp_path, target
+
+
+def test_write_publishes_the_version(published):
+    artifact_dir, target = published
+    assert target == artifact_dir / "v1"
+    assert flat_artifacts.read_current(artifact_dir) == "v1"
+    manifest = json.loads((target / flat_artifacts.MANIFEST_FILE).read_text())
+    assert manifest["format"] == flat_artifacts.FORMAT_VERSION
+    assert manifest["categorical"] == CATEGORICAL_FEATURES
+    assert not list(artifact_dir.glob(".*.tmp"))
+
+
+def test_load_memory_maps_and_reproduces_the_models(published, models):
+    _, target = published
+    loaded = flat_artifacts.load(target, CATEGORICAL_FEATURES, HORIZONS)
+    for name, flat in (("rent", loaded["rent_flat"]), ("sale", loaded["sales_flat"])):
+        assert isinstance(flat.forest.value, np.memmap)
+        assert not flat.forest.value.flags.writeable
+        records = synthetic_records(flat.encoder, 300)
+        records.append({**records[0], "district": "Unseen"})
+        expected = models[name].predict(pd.DataFrame(records))
+        np.testing.assert_allclose(flat.predict(records), expected, rtol=1e-12, atol=0)
+        np.testing.assert_allclose(flat.predict(records[:1]), expected[:1], rtol=1e-12, atol=0)
+
+    scorer = loaded["cox_scorer"]
+    reference = CoxScorer(models["cox"], CATEGORICAL_FEATURES, HORIZONS)
+    assert scorer.features == reference.features
+    X = np.random.default_rng(0).normal(size=(50, len(scorer.features)))
+    np.testing.assert_array_equal(scorer.prob_sold(X), reference.prob_sold(X))
+
+
+def test_bundle_from_flat(published):
+    artifact_dir, target = published
+    bundle = ModelBundle.from_flat(artifact_dir, CATEGORICAL_FEATURES, HORIZONS)
+    assert bundle.version == "v1"
+    assert Path(bundle.path) == target
+    assert bundle.artifact_format == "npy"
+
+
+def test_rewrite_is_idempotent_and_old_versions_are_pruned(published, models):
+    artifact_dir, target = published
+    created = json.loads((target / flat_artifacts.MANIFEST_FILE).read_text())["created_at"]
+    flat_artifacts.write(artifact_dir, "v1", models["rent"], models["sale"], models["cox"], CATEGORICAL_FEATURES)
+    assert json.loads((target / flat_artifacts.MANIFEST_FILE).read_text())["created_at"] == created
+
+    flat_artifacts.write(artifact_dir, "v2", models["rent"], models["sale"], models["cox"], CATEGORICAL_FEATURES, keep=1)
+    assert flat_artifacts.read_current(artifact_dir) == "v2"
+    assert not target.exists()
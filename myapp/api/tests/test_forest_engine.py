@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_records
+from forest_engine import FlatPipeline
+
+PRICE_MODELS = ("rent", "sale")
+
+
+@pytest.fixture(scope="module")
+def flats(models):
+    return {name: FlatPipeline.from_pipeline(models[name]) for name in PRICE_MODELS}
+
+
+@pytest.fixture(scope="module")
+def records(flats):
+    return synthetic_records(flats["rent"].encoder, 500)
+
+
+def assert_same_predictions(pipeline, flat, records):
+    expected = pipeline.predict(pd.DataFrame(records))
+    np.testing.assert_allclose(flat.predict(records), expected, rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize("name", PRICE_MODELS)
+def test_batch_matches_pipeline(models, flats, records, name):
+    assert_same_predictions(models[name], flats[name], records)
+
+
+@pytest.mark.parametrize("name", PRICE_MODELS)
+def test_single_rows_match_pipeline(models, flats, records, name):
+    for record in records[:25]:
+        assert_same_predictions(models[name], flats[name], [record])
+
+
+@pytest.mark.parametrize("name", PRICE_MODELS)
+@pytest.mark.parametrize("column", ["district", "renovation_status"])
+def test_unseen_category_matches_pipeline(models, flats, records, name, column):
+    # OneHotEncoder(handle_unknown="ignore"): every one-hot column of the row is 0
+    unseen = [{**record, column: "Unseen"} for record in records[:20]]
+    assert_same_predictions(models[name], flats[name], unseen)
+    assert_same_predictions(models[name], flats[name], unseen[:1])
+
+
+@pytest.mark.parametrize("name", PRICE_MODELS)
+def test_column_order_and_extra_keys_do_not_matter(models, flats, records, name):
+    # records are dicts built from request bodies: any key order, extra fields
+    shuffled = [{"property_id": 1, **dict(reversed(list(record.items())))} for record in records[:20]]
+    np.testing.assert_array_equal(flats[name].predict(shuffled), flats[name].predict(records[:20]))
+    assert_same_predictions(models[name], flats[name], records[:20])
+
+
+@pytest.mark.parametrize("name", PRICE_MODELS)
+def test_per_tree_mean_is_the_prediction(flats, records, name):
+    flat = flats[name]
+    X = flat.encoder.encode(records)
+    np.testing.assert_allclose(flat.forest.predict_per_tree(X).mean(axis=1), flat.forest.predict(X), rtol=1e-12)
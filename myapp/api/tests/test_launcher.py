@@ -0,0 +1,93 @@
+"""
+The pre-fork launcher: once it reports ready, its forked workers still share
+the modules and models preloaded in the master copy-on-write (the memory-mapped
+artifacts are covered by `test_artifact_memory`).
+"""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from benchmarks.endpoints import _free_port
+
+API_DIR = Path(__file__).resolve().parents[1]
+WORKERS = 2
+# Each worker's private memory, as a share of what the master holds: the
+# preloaded modules and models must stay shared copy-on-write.
+MAX_WORKER_USS_SHARE = 0.25
+
+pytestmark = [
+    pytest.mark.slow,
+    pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux /proc smaps_rollup"),
+]
+
+
+def _memory_mb(pid: int) -> dict:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.endswith("kB\n")}
+    return {
+        "rss": fields["Rss"] / 1024,
+        "pss": fields["Pss"] / 1024,
+        "uss": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024,
+    }
+
+
+def _children(pid: int) -> list:
+    children = []
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                stat = (entry / "stat").read_text()
+            except OSError:
+                continue
+            # the command name may contain spaces; the parent pid follows its closing parenthesis
+            if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+                children.append(int(entry.name))
+    return children
+
+
+@pytest.fixture()
+def launcher(fixture_env):
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": fixture_env["database_url"],
+        "MODEL_DIR": fixture_env["model_dir"],
+        "WEB_CONCURRENCY": str(WORKERS),
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "MODEL_POLL_SECONDS": "0",
+    }
+    proc = subprocess.Popen([sys.executable, "launcher.py"], cwd=API_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 180
+        ready = 0
+        # several ready answers in a row, so every worker has finished its warm-up
+        while ready < 4 * WORKERS:
+            assert time.monotonic() < deadline, "launcher did not become ready"
+            assert proc.poll() is None, "launcher exited"
+            try:
+                ready = ready + 1 if httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=5).status_code == 200 else 0
+            except httpx.TransportError:
+                ready = 0
+            time.sleep(0.25)
+        yield proc
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+def test_workers_share_the_preloaded_memory(launcher):
+    workers = _children(launcher.pid)
+    assert len(workers) == WORKERS
+    master = _memory_mb(launcher.pid)
+    for pid in workers:
+        worker = _memory_mb(pid)
+        assert worker["uss"] < MAX_WORKER_USS_SHARE * master["rss"], (pid, worker, master)
+        assert worker["pss"] < master["rss"], (pid, worker, master)